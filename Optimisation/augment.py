@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import random
+
+from optimisation import NeuralNetwork, Sensor, EVALUATION_STEPS
+
+class AugmentConfig:
+    def __init__(self, noise=0.0, dropout=0.0, latency=0):
+        self.noise = noise
+        self.dropout = dropout
+        self.latency = latency
+
+    def enabled(self):
+        return self.noise > 0 or self.dropout > 0 or self.latency > 0
+
+    def toDict(self):
+        return {'noise': self.noise, 'dropout': self.dropout, 'latency': self.latency}
+
+    # Distributed workers receive the config as plain data alongside each job
+    @staticmethod
+    def fromDict(data):
+        return AugmentConfig(data['noise'], data['dropout'], data['latency'])
+
+    # Appended to fitness cache keys, so clean and degraded fitness are never mixed
+    def key(self):
+        return "augment:%r,%r,%d" % (self.noise, self.dropout, self.latency)
+
+    @staticmethod
+    def addArguments(parser):
+        parser.add_argument('--noise', type=float, default=0.0)
+        parser.add_argument('--dropout', type=float, default=0.0)
+        parser.add_argument('--latency', type=int, default=0)
+
+    @staticmethod
+    def fromArgs(args):
+        return AugmentConfig(args.noise, args.dropout, args.latency)
+
+# Wraps a car's sensor so the brain sees degraded readings: Gaussian noise on each hit offset, rays that
+# drop out and read nothing, and readings delivered `latency` steps late from a ring buffer. Each car
+# draws from its own RNG stream, so results do not depend on the order cars are updated in.
+class AugmentedSensor:
+    def __init__(self, sensor, config, rng):
+        self.inner = sensor
+        self.augment = config
+        self.rng = rng
+        self.buffer = [None] * (config.latency + 1)
+        self.head = 0
+        self.readings = []
+
+    # Everything else (rays, rayCount, config, ...) is the wrapped sensor's
+    def __getattr__(self, name):
+        if name in ('inner', 'augment'):
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def update(self, roadBorders, traffic):
+        self.inner.update(roadBorders, traffic)
+        readings = self.degrade(self.inner.readings)
+        if self.buffer[0] is None:
+            # Until the buffer fills, the oldest reading there is stands in for the delayed one
+            self.buffer = [readings] * len(self.buffer)
+        self.buffer[self.head] = readings
+        self.head = (self.head + 1) % len(self.buffer)
+        self.readings = self.buffer[self.head]
+
+    def degrade(self, readings):
+        noise = self.augment.noise
+        dropout = self.augment.dropout
+        if not noise and not dropout:
+            return readings
+        rng = self.rng
+        degraded = []
+        for (start, end), reading in zip(self.inner.rays, readings):
+            if reading is None or dropout and rng.random() < dropout:
+                degraded.append(None)
+                continue
+            if noise:
+                offset = min(max(reading['offset'] + rng.gauss(0, noise), 0.0), 1.0)
+                reading = {
+                    'x': start['x'] + (end['x'] - start['x']) * offset,
+                    'y': start['y'] + (end['y'] - start['y']) * offset,
+                    'offset': offset
+                }
+            degraded.append(reading)
+        return degraded
+
+    # Draws what the brain is given rather than what the rays hit
+    def draw(self, screen, offsetY=0):
+        Sensor.draw(self, screen, offsetY)
+
+# Switches a world's cars to augmented sensing, car i drawing from stream (seed, i). With `perBrain` the
+# stream is (seed, brain weights) instead, so during evaluation a brain's fitness does not depend on its
+# place in the population or in a distributed chunk, and cached fitness stays valid.
+def useAugmentation(world, config, seed=1, perBrain=False):
+    if not config.enabled():
+        return
+    for i, car in enumerate(world.cars):
+        if hasattr(car, 'sensor'):
+            if perBrain:
+                stream = "%d|%s" % (seed, hashlib.sha1(NeuralNetwork.toBytes(car.brain)).hexdigest())
+            else:
+                stream = seed * 1000003 + i
+            car.sensor = AugmentedSensor(car.sensor, config, random.Random(stream))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('brain')
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--dropout', type=float, default=0.05)
+    parser.add_argument('--latency', type=int, default=2)
+    parser.add_argument('--population', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=EVALUATION_STEPS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # training imports this module for its own flags
+    from training import createWorld
+
+    # Distance reached by copies of one brain, on clean readings and then on degraded ones
+    for config in (AugmentConfig(), AugmentConfig(args.noise, args.dropout, args.latency)):
+        world = createWorld(args.population, args.seed, args.brain, mutationAmount=0)
+        useAugmentation(world, config, args.seed)
+        world.run(args.steps)
+        distances = sorted(-car.y for car in world.cars)
+        print("noise %.3f, dropout %.3f, latency %d: median distance %.1f, worst %.1f, %d/%d alive" %
+              (config.noise, config.dropout, config.latency, distances[len(distances) // 2], distances[0],
+               world.alive(), len(world.cars)))
+
+if __name__ == "__main__":
+    main()
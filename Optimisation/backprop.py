@@ -0,0 +1,174 @@
+import argparse
+import math
+import random
+
+from demonstrations import DemonstrationReader, isDemonstrations
+from optimisation import NeuralNetwork
+from recorder import RecordingReader
+
+# Differentiable stand-in for NeuralNetwork: each level computes sigmoid(sharpness * (sum - bias)), which
+# tends to the step activation `sum > bias` as sharpness grows, so the trained weights export unchanged
+class DifferentiableLevel:
+    def __init__(self, inputCount, outputCount, rng):
+        limit = 1 / math.sqrt(inputCount)
+        self.weights = [[rng.uniform(-limit, limit) for _ in range(outputCount)] for _ in range(inputCount)]
+        self.biases = [0.0] * outputCount
+        self.weightVelocity = [[0.0] * outputCount for _ in range(inputCount)]
+        self.biasVelocity = [0.0] * outputCount
+
+    def forward(self, batch, sharpness):
+        columns = list(zip(*self.weights))
+        return [[sigmoid(sharpness * (sum(x * w for x, w in zip(row, column)) - bias)) for column, bias in zip(columns, self.biases)]
+                for row in batch]
+
+def sigmoid(value):
+    if value < -60:
+        return 0.0
+    return 1 / (1 + math.exp(-value))
+
+class DifferentiableNetwork:
+    def __init__(self, neuronCounts, seed=None):
+        rng = random.Random(seed)
+        self.neuronCounts = list(neuronCounts)
+        self.levels = [DifferentiableLevel(neuronCounts[i], neuronCounts[i + 1], rng) for i in range(len(neuronCounts) - 1)]
+        self.sharpness = 1.0
+
+    def forward(self, batch):
+        activations = [batch]
+        for level in self.levels:
+            activations.append(level.forward(activations[-1], self.sharpness))
+        return activations
+
+    # Binary cross-entropy over the control bits; with sigmoid outputs the output error is simply y - t
+    def trainBatch(self, inputs, targets, learningRate, momentum=0.9):
+        activations = self.forward(inputs)
+        outputs = activations[-1]
+        size = len(inputs)
+        loss = 0.0
+        for row, target in zip(outputs, targets):
+            for y, t in zip(row, target):
+                y = min(max(y, 1e-7), 1 - 1e-7)
+                loss -= t * math.log(y) + (1 - t) * math.log(1 - y)
+        deltas = [[(y - t) * self.sharpness for y, t in zip(row, target)] for row, target in zip(outputs, targets)]
+
+        for k in range(len(self.levels) - 1, -1, -1):
+            level = self.levels[k]
+            below = activations[k]
+            weightGradient = [[sum(row[i] * delta[j] for row, delta in zip(below, deltas)) / size
+                               for j in range(len(level.biases))] for i in range(len(level.weights))]
+            biasGradient = [-sum(delta[j] for delta in deltas) / size for j in range(len(level.biases))]
+            if k > 0:
+                deltas = [[sum(w * d for w, d in zip(weightRow, delta)) * a * (1 - a) * self.sharpness
+                           for weightRow, a in zip(level.weights, row)] for row, delta in zip(below, deltas)]
+            for i, row in enumerate(level.weights):
+                velocity = level.weightVelocity[i]
+                for j in range(len(row)):
+                    velocity[j] = momentum * velocity[j] - learningRate * weightGradient[i][j]
+                    row[j] += velocity[j]
+            for j in range(len(level.biases)):
+                level.biasVelocity[j] = momentum * level.biasVelocity[j] - learningRate * biasGradient[j]
+                level.biases[j] += level.biasVelocity[j]
+        return loss / size
+
+    # Step networks only care about the sign of sum - bias, so each neuron is rescaled into the [-1, 1] range mutate() uses
+    def export(self):
+        network = NeuralNetwork(self.neuronCounts)
+        for level, target in zip(self.levels, network.levels):
+            for j in range(len(level.biases)):
+                scale = max([abs(level.biases[j])] + [abs(row[j]) for row in level.weights]) or 1
+                target.biases[j] = level.biases[j] / scale
+                for i in range(len(level.weights)):
+                    target.weights[i][j] = level.weights[i][j] / scale
+        return network
+
+def controlBits(value, count=4):
+    return [value >> i & 1 for i in range(count)]
+
+# (sensor inputs, control bits) pairs from a recording, in the same input form Car.think feeds the brain
+def loadRecording(path, cars=None):
+    reader = RecordingReader(path)
+    rayCount = reader.metadata['rayCount']
+    selected = cars if cars is not None else range(reader.metadata['carCount'])
+    inputs, targets = [], []
+    for frame in reader.frames(names=['readings', 'controls', 'damaged']):
+        for i in selected:
+            if frame['damaged'][i]:
+                continue
+            offsets = frame['readings'][i * rayCount:(i + 1) * rayCount]
+            inputs.append([0 if math.isnan(offset) else 1 - offset for offset in offsets])
+            targets.append(controlBits(frame['controls'][i]))
+    reader.close()
+    return inputs, targets
+
+def agreement(network, inputs, targets):
+    if not inputs:
+        return 0.0
+    matches = sum(1 for x, t in zip(inputs, targets) if list(NeuralNetwork.feedForward(x, network)) == t)
+    return matches / len(inputs)
+
+# Sharpness is annealed upwards so the hidden sigmoids end close to the steps they are exported as.
+# Returns the exported step network that best matched the held-out controls.
+def train(inputs, targets, hidden=(6,), epochs=50, batchSize=64, learningRate=0.5, finalSharpness=20.0, holdout=0.1, seed=1, log=print):
+    rng = random.Random(seed)
+    order = list(range(len(inputs)))
+    rng.shuffle(order)
+    split = int(len(order) * (1 - holdout))
+    trainSet, testSet = order[:split], order[split:]
+    network = DifferentiableNetwork([len(inputs[0])] + list(hidden) + [len(targets[0])], seed)
+    best, bestAccuracy = None, -1
+    for epoch in range(epochs):
+        network.sharpness = finalSharpness ** (epoch / max(epochs - 1, 1))
+        rng.shuffle(trainSet)
+        loss = 0.0
+        batches = 0
+        for start in range(0, len(trainSet), batchSize):
+            batch = trainSet[start:start + batchSize]
+            loss += network.trainBatch([inputs[i] for i in batch], [targets[i] for i in batch], learningRate / network.sharpness)
+            batches += 1
+        exported = network.export()
+        accuracy = agreement(exported, [inputs[i] for i in testSet], [targets[i] for i in testSet])
+        log("Epoch %d: loss %.4f, sharpness %.1f, exported step network matches %.1f%% of held-out controls" %
+            (epoch, loss / max(batches, 1), network.sharpness, accuracy * 100))
+        if accuracy >= bestAccuracy:
+            best, bestAccuracy = exported, accuracy
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recordings', nargs='+')
+    parser.add_argument('--cars', default=None)
+    parser.add_argument('--hidden', default='6')
+    parser.add_argument('--epochs', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=64)
+    parser.add_argument('--learning-rate', type=float, default=0.5)
+    parser.add_argument('--sharpness', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', default='bestBrain.bin')
+    args = parser.parse_args()
+
+    cars = [int(i) for i in args.cars.split(',')] if args.cars else None
+    datasets = [path for path in args.recordings if isDemonstrations(path)]
+    recordings = [path for path in args.recordings if path not in datasets]
+    if datasets and not recordings:
+        # Demonstration datasets stay memory-mapped, samples are read as batches need them
+        reader = DemonstrationReader(datasets)
+        inputs, targets = reader.inputs, reader.targets
+    else:
+        inputs, targets = [], []
+        if datasets:
+            reader = DemonstrationReader(datasets)
+            inputs.extend(reader.inputs)
+            targets.extend(reader.targets)
+        for path in recordings:
+            x, t = loadRecording(path, cars)
+            inputs.extend(x)
+            targets.extend(t)
+    print("%d samples" % len(inputs))
+
+    hidden = [int(count) for count in args.hidden.split(',')]
+    network = train(inputs, targets, hidden, args.epochs, args.batch, args.learning_rate, args.sharpness, seed=args.seed)
+    with open(args.save, 'wb') as f:
+        f.write(NeuralNetwork.toBytes(network))
+
+if __name__ == "__main__":
+    main()
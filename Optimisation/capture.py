@@ -0,0 +1,101 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import queue
+import subprocess
+import threading
+import pygame
+
+from optimisation import Visualizer, ROAD_X, EVALUATION_STEPS
+from training import createWorld, drawWorld, focusCar, SCREEN_HEIGHT, NETWORK_WIDTH
+
+# Frame sinks run on the capture thread
+class ImageSequenceSink:
+    def __init__(self, directory, size, pattern='frame%06d.png'):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.size = size
+        self.pattern = pattern
+
+    def write(self, index, data):
+        surface = pygame.image.frombuffer(data, self.size, 'RGB')
+        pygame.image.save(surface, os.path.join(self.directory, self.pattern % index))
+
+    def close(self):
+        pass
+
+class PipeSink:
+    def __init__(self, path, size, fps=60, encoder='ffmpeg'):
+        self.process = subprocess.Popen([
+            encoder, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '%dx%d' % size, '-r', str(fps), '-i', '-',
+            '-pix_fmt', 'yuv420p', path
+        ], stdin=subprocess.PIPE)
+
+    def write(self, index, data):
+        self.process.stdin.write(data)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+class FrameCapture:
+    def __init__(self, sink, maxPending=32):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=maxPending)
+        self.frames = 0
+        self.thread = threading.Thread(target=self.writeFrames, daemon=True)
+        self.thread.start()
+
+    def capture(self, surface):
+        self.queue.put((self.frames, pygame.image.tobytes(surface, 'RGB')))
+        self.frames += 1
+
+    def writeFrames(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self.sink.write(*item)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.sink.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output')
+    parser.add_argument('--brain', default=None)
+    parser.add_argument('--population', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--steps', type=int, default=EVALUATION_STEPS)
+    parser.add_argument('--every', type=int, default=2)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--ffmpeg', action='store_true')
+    args = parser.parse_args()
+
+    pygame.init()
+    size = (int(ROAD_X * 2) + NETWORK_WIDTH, SCREEN_HEIGHT)
+    surface = pygame.Surface(size)
+    if args.ffmpeg:
+        sink = PipeSink(args.output, size, args.fps)
+    else:
+        sink = ImageSequenceSink(args.output, size)
+    capture = FrameCapture(sink)
+
+    world = createWorld(args.population, args.seed, args.brain)
+    visualizer = Visualizer(NETWORK_WIDTH, SCREEN_HEIGHT)
+    while world.steps < args.steps and world.alive() > 0:
+        world.step()
+        if world.steps % args.every == 0:
+            drawWorld(surface, world, focusCar(world), visualizer)
+            capture.capture(surface)
+
+    capture.close()
+    print("Captured %d frames of %d steps" % (capture.frames, world.steps))
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import pygame
+
+from optimisation import Car, Road, World, generateTraffic, ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y, TRAFFIC_COUNT
+from recorder import toLittleEndian, fromLittleEndian
+from traffic import LaneIndex
+
+MAGIC = b'SDCDEMO1'
+CHUNK_MAGIC = b'CHNK'
+SCREEN_HEIGHT = 700
+
+def controlBits(controls):
+    return bool(controls.forward) | bool(controls.left) << 1 | bool(controls.right) << 2 | bool(controls.reverse) << 3
+
+# Append-only dataset of (brain inputs, control bits) samples. The file is a header followed by
+# self-contained chunks, each written in one piece, so every session simply appends to the end
+class DemonstrationWriter:
+    def __init__(self, path, inputCount, chunkSize=1024):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, 'rb') as f:
+                header = f.read(len(MAGIC) + 2)
+            if header[:len(MAGIC)] != MAGIC or struct.unpack('<H', header[len(MAGIC):])[0] != inputCount:
+                raise ValueError("%s holds a different kind of dataset" % path)
+            # A chunk cut short by a crash would hide everything appended after it, so drop it first
+            with open(path, 'r+b') as f:
+                f.truncate(DemonstrationWriter.completeLength(f, inputCount))
+        self.file = open(path, 'ab')
+        if not exists:
+            self.file.write(MAGIC + struct.pack('<H', inputCount))
+        self.inputCount = inputCount
+        self.chunkSize = chunkSize
+        self.inputs = array('f')
+        self.controls = array('B')
+        self.count = 0
+
+    # Length of the header plus every complete chunk, walking the chunk headers the way the reader does
+    @staticmethod
+    def completeLength(f, inputCount):
+        f.seek(0, 2)
+        size = f.tell()
+        offset = len(MAGIC) + 2
+        while offset + 8 <= size:
+            f.seek(offset)
+            header = f.read(8)
+            if header[:4] != CHUNK_MAGIC:
+                break
+            count = struct.unpack('<I', header[4:])[0]
+            end = offset + 8 + 4 * count * inputCount + count
+            if end > size:
+                break
+            offset = end
+        return offset
+
+    def add(self, inputs, controls):
+        self.inputs.extend(inputs)
+        self.controls.append(controls)
+        self.count += 1
+        if len(self.controls) == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if not self.controls:
+            return
+        self.file.write(CHUNK_MAGIC + struct.pack('<I', len(self.controls)) + toLittleEndian(self.inputs) + self.controls.tobytes())
+        self.file.flush()
+        self.inputs = array('f')
+        self.controls = array('B')
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# Memory-mapped reader over one or more dataset files. Only the chunk offsets are kept in memory; samples
+# are read straight from the mapping. A chunk cut short by a crash is ignored.
+class DemonstrationReader:
+    def __init__(self, paths):
+        if isinstance(paths, str):
+            paths = [paths]
+        self.files = []
+        self.maps = []
+        self.chunks = []
+        self.starts = []
+        self.count = 0
+        self.inputCount = None
+        for path in paths:
+            f = open(path, 'rb')
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError("%s is not a demonstration dataset" % path)
+            inputCount = struct.unpack_from('<H', data, len(MAGIC))[0]
+            if self.inputCount is not None and inputCount != self.inputCount:
+                raise ValueError("%s has %d inputs, expected %d" % (path, inputCount, self.inputCount))
+            self.inputCount = inputCount
+            self.files.append(f)
+            self.maps.append(data)
+            self.scan(data, len(self.maps) - 1)
+        self.inputs = SampleColumn(self, self.inputsAt)
+        self.targets = SampleColumn(self, self.targetsAt)
+
+    def scan(self, data, mapIndex):
+        offset = len(MAGIC) + 2
+        while offset + 8 <= len(data) and data[offset:offset + 4] == CHUNK_MAGIC:
+            count = struct.unpack_from('<I', data, offset + 4)[0]
+            inputsOffset = offset + 8
+            controlsOffset = inputsOffset + 4 * count * self.inputCount
+            end = controlsOffset + count
+            if end > len(data):
+                break
+            self.starts.append(self.count)
+            self.chunks.append((mapIndex, inputsOffset, controlsOffset))
+            self.count += count
+            offset = end
+
+    def __len__(self):
+        return self.count
+
+    def locate(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        chunk = bisect.bisect_right(self.starts, index) - 1
+        return self.chunks[chunk], index - self.starts[chunk]
+
+    def inputsAt(self, index):
+        (mapIndex, inputsOffset, _), row = self.locate(index)
+        start = inputsOffset + 4 * row * self.inputCount
+        data = self.maps[mapIndex][start:start + 4 * self.inputCount]
+        if sys.byteorder == 'little':
+            return memoryview(data).cast('f').tolist()
+        return fromLittleEndian('f', data).tolist()
+
+    def controlsAt(self, index):
+        (mapIndex, _, controlsOffset), row = self.locate(index)
+        return self.maps[mapIndex][controlsOffset + row]
+
+    def targetsAt(self, index):
+        value = self.controlsAt(index)
+        return [value >> i & 1 for i in range(4)]
+
+    def close(self):
+        for data in self.maps:
+            data.close()
+        for f in self.files:
+            f.close()
+
+# Lazy sequence over the samples, so training code can index a dataset like a list
+class SampleColumn:
+    def __init__(self, reader, get):
+        self.reader = reader
+        self.get = get
+
+    def __len__(self):
+        return len(self.reader)
+
+    def __getitem__(self, index):
+        return self.get(index)
+
+def isDemonstrations(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def createSession(seed):
+    road = Road(ROAD_X, ROAD_WIDTH)
+    car = Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "KEYS")
+    traffic = generateTraffic(road, seed, TRAFFIC_COUNT * 3)
+    return World(road, traffic, [car], trafficIndex=LaneIndex(road, traffic))
+
+def record(path, seed):
+    pygame.init()
+    screen = pygame.display.set_mode((int(ROAD_X * 2), SCREEN_HEIGHT))
+    clock = pygame.time.Clock()
+    world = createSession(seed)
+    writer = DemonstrationWriter(path, world.cars[0].sensor.rayCount)
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                seed += 1
+                world = createSession(seed)
+
+        car = world.cars[0]
+        # The sample pairs what the driver saw on screen with the keys pressed in response
+        if car.sensor.readings and not car.damaged:
+            car.controls.addKeyboardListeners()
+            writer.add([0 if s is None else 1 - s['offset'] for s in car.sensor.readings], controlBits(car.controls))
+        world.step()
+        if car.damaged:
+            seed += 1
+            world = createSession(seed)
+            car = world.cars[0]
+
+        offsetY = -car.y + SCREEN_HEIGHT * 0.7
+        screen.fill((211, 211, 211))
+        world.road.draw(screen, offsetY)
+        for other in world.traffic:
+            other.draw(screen, (255, 0, 0), offsetY)
+        car.draw(screen, (0, 0, 255), offsetY)
+        pygame.display.set_caption("Recording demonstrations - %d samples (R: restart, Esc: quit)" % writer.count)
+        pygame.display.flip()
+        clock.tick(60)
+
+    writer.close()
+    pygame.quit()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['record', 'info'])
+    parser.add_argument('path')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        record(args.path, args.seed)
+        return
+    reader = DemonstrationReader(args.path)
+    print("%d samples of %d inputs in %d chunks" % (len(reader), reader.inputCount, len(reader.chunks)))
+    counts = [0] * 4
+    for i in range(len(reader)):
+        value = reader.controlsAt(i)
+        for bit in range(4):
+            counts[bit] += value >> bit & 1
+    for name, count in zip(['forward', 'left', 'right', 'reverse'], counts):
+        print("  %-8s %d" % (name, count))
+    reader.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import itertools
+import multiprocessing
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+from augment import AugmentConfig
+from optimisation import NeuralNetwork, FitnessCache, evaluatePopulation, runGenetic, scenarioKey, EVALUATION_STEPS
+
+AUTHKEY = b'self-driving-car'
+
+# Coordinator: hands out chunks of serialized brains and collects fitness. A job that has lost
+# `maxRetries` + 1 workers is taken to be what kills them, and fails the evaluation instead of being requeued.
+# An evaluation also fails once no worker has been connected for `timeout` seconds while its jobs are pending.
+class Coordinator:
+    def __init__(self, address=('localhost', 6000), authkey=AUTHKEY, timeout=30.0, chunkSize=10, maxRetries=2):
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.timeout = timeout
+        self.chunkSize = chunkSize
+        self.maxRetries = maxRetries
+
+        self.jobIds = itertools.count()
+        self.queue = deque()
+        self.jobs = {}
+        self.dispatched = {}
+        self.results = {}
+        self.crashes = {}
+        self.failed = {}
+        self.workers = 0
+        self.idleSince = time.monotonic()
+        self.closed = False
+        self.condition = threading.Condition()
+
+        threading.Thread(target=self.acceptWorkers, daemon=True).start()
+
+    def acceptWorkers(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            threading.Thread(target=self.serveWorker, args=(conn,), daemon=True).start()
+
+    def serveWorker(self, conn):
+        jobId = None
+        with self.condition:
+            self.workers += 1
+        try:
+            while True:
+                conn.recv()
+                jobId = self.nextJob()
+                if jobId is None:
+                    conn.send(('stop',))
+                    break
+                seed, steps, augment, blobs = self.jobs[jobId]
+                conn.send(('job', jobId, seed, steps, augment, blobs))
+                _, doneId, fitnesses = conn.recv()
+                self.complete(doneId, fitnesses)
+                jobId = None
+        except (EOFError, OSError):
+            # Worker went away: put its job back at the front of the queue, unless it keeps doing that
+            with self.condition:
+                if jobId is not None and jobId in self.jobs:
+                    self.crashes[jobId] = self.crashes.get(jobId, 0) + 1
+                    if self.crashes[jobId] > self.maxRetries:
+                        self.fail(jobId)
+                    else:
+                        self.queue.appendleft(jobId)
+                    self.condition.notify_all()
+        finally:
+            conn.close()
+            with self.condition:
+                self.workers -= 1
+                if not self.workers:
+                    self.idleSince = time.monotonic()
+                self.condition.notify_all()
+
+    def nextJob(self):
+        with self.condition:
+            while not self.closed:
+                if self.queue:
+                    jobId = self.queue.popleft()
+                    if jobId in self.jobs:
+                        self.dispatched[jobId] = time.monotonic()
+                        return jobId
+                    continue
+                # Nothing queued: duplicate the oldest straggler so a slow node cannot stall the generation
+                now = time.monotonic()
+                overdue = [jobId for jobId, sent in self.dispatched.items() if now - sent > self.timeout]
+                if overdue:
+                    jobId = min(overdue, key=self.dispatched.get)
+                    self.dispatched[jobId] = now
+                    return jobId
+                self.condition.wait(self.timeout / 4)
+            return None
+
+    def complete(self, jobId, fitnesses):
+        with self.condition:
+            if jobId not in self.jobs:
+                return
+            del self.jobs[jobId]
+            self.dispatched.pop(jobId, None)
+            self.crashes.pop(jobId, None)
+            self.results[jobId] = fitnesses
+            self.condition.notify_all()
+
+    # Called with the condition held
+    def fail(self, jobId):
+        seed, steps, _, blobs = self.jobs.pop(jobId)
+        self.dispatched.pop(jobId, None)
+        self.failed[jobId] = "job %d (%d brains, seed %s, %d steps) lost %d workers" % (jobId, len(blobs), seed, steps, self.crashes.pop(jobId))
+
+    # The augment config travels with each job as plain data
+    def evaluate(self, brains, seed, steps=EVALUATION_STEPS, augment=None):
+        blobs = [NeuralNetwork.toBytes(brain) for brain in brains]
+        augment = augment.toDict() if augment is not None else None
+        chunkIds = []
+        with self.condition:
+            for start in range(0, len(blobs), self.chunkSize):
+                jobId = next(self.jobIds)
+                self.jobs[jobId] = (seed, steps, augment, blobs[start:start + self.chunkSize])
+                self.queue.append(jobId)
+                chunkIds.append(jobId)
+            self.condition.notify_all()
+            start = time.monotonic()
+            while any(jobId not in self.results and jobId not in self.failed for jobId in chunkIds):
+                if not self.workers and time.monotonic() - max(self.idleSince, start) > self.timeout:
+                    pending = sum(1 for jobId in chunkIds if jobId in self.jobs)
+                    self.drop(chunkIds)
+                    raise RuntimeError("no worker connected for %.0f s with %d jobs pending" % (self.timeout, pending))
+                self.condition.wait(self.timeout / 4)
+            failures = [self.failed.pop(jobId) for jobId in chunkIds if jobId in self.failed]
+            if failures:
+                self.drop(chunkIds)
+                raise RuntimeError("; ".join(failures))
+            fitnesses = []
+            for jobId in chunkIds:
+                fitnesses.extend(self.results.pop(jobId))
+        return fitnesses
+
+    # Called with the condition held: forgets every trace of a failed evaluation's jobs
+    def drop(self, chunkIds):
+        for jobId in chunkIds:
+            self.jobs.pop(jobId, None)
+            self.dispatched.pop(jobId, None)
+            self.crashes.pop(jobId, None)
+            self.results.pop(jobId, None)
+            self.failed.pop(jobId, None)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.listener.close()
+
+# Worker: runs a headless world for every chunk it is given
+def runWorker(address, authkey=AUTHKEY):
+    conn = Client(address, authkey=authkey)
+    try:
+        while True:
+            conn.send(('ready',))
+            message = conn.recv()
+            if message[0] == 'stop':
+                break
+            _, jobId, seed, steps, augment, blobs = message
+            brains = [NeuralNetwork.fromBytes(blob) for blob in blobs]
+            augment = AugmentConfig.fromDict(augment) if augment else None
+            conn.send(('result', jobId, evaluatePopulation(brains, seed, steps, augment)))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['coordinator', 'worker'])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6000)
+    parser.add_argument('--local-workers', type=int, default=0)
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--population', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--cache', default=None)
+    AugmentConfig.addArguments(parser)
+    args = parser.parse_args()
+    augment = AugmentConfig.fromArgs(args)
+
+    address = (args.host, args.port)
+    if args.mode == 'worker':
+        runWorker(address)
+        return
+
+    coordinator = Coordinator(address, timeout=args.timeout)
+    workers = []
+    for _ in range(args.local_workers):
+        worker = multiprocessing.Process(target=runWorker, args=(coordinator.address,))
+        worker.start()
+        workers.append(worker)
+
+    cache = FitnessCache(path=args.cache)
+    scenario = scenarioKey(args.seed, augment=augment)
+    best = runGenetic(lambda brains: cache.evaluate(brains, scenario, lambda misses: coordinator.evaluate(misses, args.seed, augment=augment)),
+                      args.generations, args.population)
+    cache.close()
+    coordinator.close()
+    for worker in workers:
+        worker.join()
+    with open('bestBrain.bin', 'wb') as f:
+        f.write(NeuralNetwork.toBytes(best))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import os
+import struct
+from array import array
+from collections import deque
+from datetime import datetime
+
+from optimisation import Car, CAR_WIDTH, CAR_HEIGHT, LANE_COUNT, START_Y
+from recorder import toLittleEndian, fromLittleEndian
+
+try:
+    import pyarrow.parquet as parquet
+except ImportError:
+    parquet = None
+
+MAGIC = b'SDCSPW1\n'
+CACHE_DIR = 'scheduleCache'
+# Part of every cache key; bump it when convert maps a log differently
+CACHE_FORMAT = 1
+
+# Spawn schedule: one traffic car per entry, sorted by step, stored as three parallel arrays
+class SpawnSchedule:
+    def __init__(self, steps=None, lanes=None, speeds=None):
+        self.steps = steps if steps is not None else array('i')
+        self.lanes = lanes if lanes is not None else array('B')
+        self.speeds = speeds if speeds is not None else array('f')
+
+    def __len__(self):
+        return len(self.steps)
+
+    def duration(self):
+        return self.steps[-1] + 1 if len(self.steps) else 0
+
+    def toBytes(self):
+        return (MAGIC + struct.pack('<I', len(self)) +
+                toLittleEndian(self.steps) + toLittleEndian(self.lanes) + toLittleEndian(self.speeds))
+
+    @staticmethod
+    def fromBytes(data):
+        if not data.startswith(MAGIC):
+            raise ValueError("not a spawn schedule")
+        count = struct.unpack_from('<I', data, len(MAGIC))[0]
+        offset = len(MAGIC) + 4
+        columns = []
+        for typecode in ('i', 'B', 'f'):
+            size = array(typecode).itemsize * count
+            columns.append(fromLittleEndian(typecode, data[offset:offset + size]))
+            offset += size
+        return SpawnSchedule(*columns)
+
+# Reads the three mapped columns in chunks of rows, so a log never has to fit in memory
+def readChunks(path, columns, chunkSize=65536):
+    if path.endswith('.parquet'):
+        if parquet is None:
+            raise RuntimeError("reading Parquet needs pyarrow")
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunkSize, columns=columns):
+            yield list(zip(*[batch.column(name).to_pylist() for name in columns]))
+        return
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        missing = [name for name in columns if name not in header]
+        if missing:
+            raise ValueError("missing columns: %s" % ", ".join(missing))
+        positions = [header.index(name) for name in columns]
+        chunk = []
+        for row in reader:
+            chunk.append([row[i] for i in positions])
+            if len(chunk) == chunkSize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def parseTime(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(value).timestamp()
+
+# Maps a log to a schedule: times to steps from the first vehicle on, lane labels onto road lanes, speeds to pixels per step.
+# Each chunk is sorted by time on its own and kept as compact arrays; the sorted runs are then merged, so
+# no Python object per row outlives its chunk. Rows with equal times keep their order in the log.
+def convert(path, timeColumn='time', laneColumn='lane', speedColumn='speed', stepsPerSecond=60, speedScale=1.0,
+            laneCount=LANE_COUNT, limit=None, chunkSize=65536):
+    runs = []
+    count = 0
+    labels = {}
+    for chunk in readChunks(path, [timeColumn, laneColumn, speedColumn], chunkSize):
+        rows = []
+        for time, lane, speed in chunk:
+            if limit is not None and count + len(rows) >= limit:
+                break
+            if time in (None, '') or speed in (None, ''):
+                continue
+            try:
+                lane = int(lane) % laneCount
+            except (TypeError, ValueError):
+                lane = labels.setdefault(lane, len(labels) % laneCount)
+            rows.append((parseTime(time), lane, max(float(speed) * speedScale, 0)))
+        rows.sort(key=lambda row: row[0])
+        runs.append((array('d', [row[0] for row in rows]), array('B', [row[1] for row in rows]), array('f', [row[2] for row in rows])))
+        count += len(rows)
+        if limit is not None and count >= limit:
+            break
+
+    schedule = SpawnSchedule()
+    origin = None
+    for time, lane, speed in heapq.merge(*[zip(*run) for run in runs], key=lambda row: row[0]):
+        if origin is None:
+            origin = time
+        schedule.steps.append(int((time - origin) * stepsPerSecond))
+        schedule.lanes.append(lane)
+        schedule.speeds.append(speed)
+    return schedule
+
+# Converted schedules are cached by source file identity and mapping, so repeated runs skip the log entirely
+def scheduleKey(path, **mapping):
+    stat = os.stat(path)
+    identity = [CACHE_FORMAT, os.path.abspath(path), stat.st_mtime_ns, stat.st_size, sorted(mapping.items())]
+    return hashlib.sha1(json.dumps(identity).encode()).hexdigest()
+
+def loadSchedule(path, cacheDir=CACHE_DIR, **mapping):
+    cachePath = os.path.join(cacheDir, scheduleKey(path, **mapping) + '.bin')
+    if os.path.exists(cachePath):
+        with open(cachePath, 'rb') as f:
+            return SpawnSchedule.fromBytes(f.read())
+    schedule = convert(path, **mapping)
+    os.makedirs(cacheDir, exist_ok=True)
+    with open(cachePath + '.tmp', 'wb') as f:
+        f.write(schedule.toBytes())
+    os.replace(cachePath + '.tmp', cachePath)
+    return schedule
+
+# Feeds a schedule into a world: cars enter at a fixed y, waiting while their lane is still occupied there.
+# Cars more than `retireDistance` behind the rearmost live AI car, or that far ahead of the frontmost one and
+# too fast to be caught, are removed again, so a looping schedule keeps the traffic bounded. A loop only starts
+# its next pass once the last one has been fully spawned, so the queues never hold more than one schedule.
+class TrafficSpawner:
+    def __init__(self, road, schedule, spawnY=START_Y - 400, loop=False, retireDistance=1000):
+        self.road = road
+        self.schedule = schedule
+        self.spawnY = spawnY
+        self.loop = loop
+        self.retireDistance = retireDistance
+        self.next = 0
+        self.passStart = 0
+        self.waiting = [deque() for _ in range(road.laneCount)]
+
+    def retire(self, world):
+        live = [car for car in world.cars if not car.damaged]
+        if not live:
+            return
+        back = max(car.y for car in live) + self.retireDistance
+        front = min(car.y for car in live) - self.retireDistance
+        fastest = max(car.maxSpeed for car in live)
+        retired = [car for car in world.traffic if car.y > back or car.y < front and car.speed >= fastest]
+        if retired:
+            if world.trafficIndex is not None:
+                world.trafficIndex.discard(retired)
+            retired = set(map(id, retired))
+            world.traffic[:] = [car for car in world.traffic if id(car) not in retired]
+
+    def spawn(self, world):
+        self.retire(world)
+        schedule = self.schedule
+        step = world.steps - self.passStart
+        if self.loop and len(schedule) and self.next == len(schedule) and step >= schedule.duration() and not any(self.waiting):
+            self.passStart = world.steps
+            self.next = 0
+            step = 0
+        while self.next < len(schedule) and schedule.steps[self.next] <= step:
+            self.waiting[schedule.lanes[self.next]].append(self.next)
+            self.next += 1
+
+        # At most one car per lane and step: the one that enters blocks the spawn point for the rest of its queue
+        for lane, queue in enumerate(self.waiting):
+            if not queue or self.blocked(world, lane):
+                continue
+            speed = schedule.speeds[queue.popleft()]
+            car = Car(self.road.getLaneCenter(lane), self.spawnY, CAR_WIDTH, CAR_HEIGHT, "DUMMY", speed)
+            car.speed = speed
+            car.lane = lane
+            world.traffic.append(car)
+            if world.trafficIndex is not None:
+                world.trafficIndex.add(car)
+
+    def blocked(self, world, lane):
+        if world.trafficIndex is not None:
+            return len(world.trafficIndex.range(lane, self.spawnY - CAR_HEIGHT * 1.5, self.spawnY + CAR_HEIGHT * 1.5)) > 0
+        return any(getattr(car, 'lane', None) == lane and abs(car.y - self.spawnY) < CAR_HEIGHT * 1.5 for car in world.traffic)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--time-column', default='time')
+    parser.add_argument('--lane-column', default='lane')
+    parser.add_argument('--speed-column', default='speed')
+    parser.add_argument('--steps-per-second', type=float, default=60)
+    parser.add_argument('--speed-scale', type=float, default=1.0)
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    schedule = loadSchedule(args.path, args.cache_dir, timeColumn=args.time_column, laneColumn=args.lane_column,
+                            speedColumn=args.speed_column, stepsPerSecond=args.steps_per_second,
+                            speedScale=args.speed_scale, limit=args.limit)
+    print("%d vehicles over %d steps" % (len(schedule), schedule.duration()))
+    for lane in range(LANE_COUNT):
+        print("lane %d: %d vehicles" % (lane, schedule.lanes.count(lane)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import multiprocessing
+import queue
+import random
+import threading
+import time
+
+from augment import AugmentConfig
+from optimisation import NeuralNetwork, nextGeneration
+from scenario import Scenario, ScenarioCache, curriculum, evaluateScenario, evaluateBatch
+
+# One island: its own population and RNG stream, evolved with the usual mutate-the-best step. Every
+# `interval` generations the top `migrants` brains go to the next island on the ring and the same
+# number arrive from the previous one, replacing the worst. All islands score on the same scenarios,
+# so an immigrant's fitness travels with it and is comparable.
+def runIsland(index, scenarios, generations, populationSize, mutationAmount, interval, migrants, seed, augment, outbox, inbox, reports):
+    random.seed(seed + index)
+    cache = ScenarioCache()
+    compiled = [cache.compile(Scenario.fromDict(data)) for data in scenarios]
+    augment = AugmentConfig.fromDict(augment) if augment else None
+    if len(compiled) == 1:
+        evaluate = lambda brains: evaluateScenario(brains, compiled[0], augment=augment)
+    else:
+        evaluate = lambda brains: evaluateBatch(brains, compiled, augment=augment)
+
+    brains = [NeuralNetwork([5, 6, 4]) for _ in range(populationSize)]
+    best, bestFitness = None, None
+    for generation in range(generations):
+        fitnesses = evaluate(brains)
+        if interval and (generation + 1) % interval == 0 and generation + 1 < generations:
+            ranked = sorted(range(len(brains)), key=lambda i: fitnesses[i], reverse=True)
+            # Every island sends before it receives, so a batch larger than the pipe buffer would block the
+            # whole ring; sending from a thread lets each island drain its inbox meanwhile
+            sender = threading.Thread(target=outbox.send, args=([(NeuralNetwork.toBytes(brains[i]), fitnesses[i]) for i in ranked[:migrants]],))
+            sender.start()
+            for i, (blob, fitness) in zip(reversed(ranked), inbox.recv()):
+                brains[i] = NeuralNetwork.fromBytes(blob)
+                fitnesses[i] = fitness
+            sender.join()
+
+        i = max(range(len(brains)), key=lambda k: fitnesses[k])
+        if bestFitness is None or fitnesses[i] > bestFitness:
+            best, bestFitness = NeuralNetwork.toBytes(brains[i]), fitnesses[i]
+        reports.put((index, generation, fitnesses[i]))
+        brains = nextGeneration(brains, fitnesses, mutationAmount)
+    reports.put((index, None, (best, bestFitness)))
+
+# An island that dies would leave its neighbours waiting for migrants forever, so the reports are polled
+# and the run fails as soon as any island has exited without its result
+def runIslands(scenarios, islandCount, generations, populationSize, mutationAmount=0.1, interval=5, migrants=2, seed=1, augment=None, log=print,
+               pollInterval=1.0):
+    # Compile once up front so the islands only read the on-disk cache
+    cache = ScenarioCache()
+    for scenario in scenarios:
+        cache.compile(scenario)
+    data = [scenario.toDict() for scenario in scenarios]
+    augment = augment.toDict() if augment is not None else None
+
+    links = [multiprocessing.Pipe(duplex=False) for _ in range(islandCount)]
+    reports = multiprocessing.Queue()
+    processes = []
+    for i in range(islandCount):
+        inbox = links[i][0]
+        outbox = links[(i + 1) % islandCount][1]
+        process = multiprocessing.Process(target=runIsland, args=(i, data, generations, populationSize, mutationAmount,
+                                                                  interval, migrants, seed, augment, outbox, inbox, reports), daemon=True)
+        process.start()
+        processes.append(process)
+
+    results = {}
+    bests = {}
+    while len(results) < islandCount:
+        try:
+            index, generation, value = reports.get(timeout=pollInterval)
+        except queue.Empty:
+            lost = [i for i, process in enumerate(processes) if i not in results and not process.is_alive()]
+            # An island flushes its reports before it exits, so they are only missing if the queue is still empty
+            if lost and reports.empty():
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError("island %d exited with code %s before finishing" % (lost[0], processes[lost[0]].exitcode))
+            continue
+        if generation is None:
+            results[index] = value
+            continue
+        bests.setdefault(generation, {})[index] = value
+        if len(bests[generation]) == islandCount:
+            row = bests.pop(generation)
+            log("Generation %d: best %.1f (islands %s)" % (generation, max(row.values()), " ".join("%.0f" % row[k] for k in sorted(row))))
+    for process in processes:
+        process.join()
+
+    blob, fitness = max(results.values(), key=lambda result: result[1])
+    return NeuralNetwork.fromBytes(blob), fitness
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--islands', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--mutation', type=float, default=0.1)
+    parser.add_argument('--interval', type=int, default=5)
+    parser.add_argument('--migrants', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--curriculum', action='store_true')
+    parser.add_argument('--save', default='bestBrain.bin')
+    AugmentConfig.addArguments(parser)
+    args = parser.parse_args()
+
+    scenarios = curriculum(args.seed) if args.curriculum else [Scenario.fromSeed(args.seed)]
+    start = time.time()
+    best, fitness = runIslands(scenarios, args.islands, args.generations, args.population, args.mutation,
+                               args.interval, args.migrants, args.seed, AugmentConfig.fromArgs(args))
+    print("Best %.1f from %d islands in %.1f s" % (fitness, args.islands, time.time() - start))
+    with open(args.save, 'wb') as f:
+        f.write(NeuralNetwork.toBytes(best))
+
+if __name__ == "__main__":
+    main()
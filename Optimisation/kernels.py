@@ -0,0 +1,245 @@
+import argparse
+import math
+import random
+import sys
+import time
+from array import array
+
+from optimisation import Car, Sensor, NeuralNetwork, polysIntersect
+from training import createWorld
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Compiled with numba when it is installed; otherwise the kernels run as the plain Python they are written in
+def kernel(function):
+    if njit is None:
+        return function
+    return njit(cache=True)(function)
+
+# Car.move without the object: the same clamping and friction sequence, on plain numbers
+@kernel
+def moveKernel(speed, angle, x, y, forward, reverse, left, right, acceleration, maxSpeed, friction):
+    if forward:
+        speed += acceleration
+    if reverse:
+        speed -= acceleration
+
+    if speed > maxSpeed:
+        speed = maxSpeed
+    if speed < -maxSpeed / 2:
+        speed = -maxSpeed / 2
+
+    if speed > 0:
+        speed -= friction
+    if speed < 0:
+        speed += friction
+    if abs(speed) < friction:
+        speed = 0
+
+    if speed != 0:
+        flip = 1 if speed > 0 else -1
+        if left:
+            angle += 0.03 * flip
+        if right:
+            angle -= 0.03 * flip
+
+    return speed, angle, x - math.sin(angle) * speed, y - math.cos(angle) * speed
+
+# Car.createPolygon on plain numbers: the corner offsets Car.updateRotation caches, moved to the car's
+# position, as x0, y0, ..., x3, y3
+@kernel
+def polygonKernel(x, y, corners):
+    return (x + corners[0], y + corners[1], x + corners[2], y + corners[3],
+            x + corners[4], y + corners[5], x + corners[6], y + corners[7])
+
+# polysIntersect over flat x, y coordinate arrays: whether any edge of one closed polygon crosses an edge
+# of the other, with Sensor.getIntersection's arithmetic
+@kernel
+def touchKernel(first, second):
+    n = len(first) // 2
+    m = len(second) // 2
+    for i in range(n):
+        ax = first[2 * i]
+        ay = first[2 * i + 1]
+        bx = first[2 * ((i + 1) % n)]
+        by = first[2 * ((i + 1) % n) + 1]
+        for j in range(m):
+            cx = second[2 * j]
+            cy = second[2 * j + 1]
+            dx = second[2 * ((j + 1) % m)]
+            dy = second[2 * ((j + 1) % m) + 1]
+            tTop = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+            uTop = (cy - ay) * (ax - bx) - (cx - ax) * (ay - by)
+            bottom = (dy - cy) * (bx - ax) - (dx - cx) * (by - ay)
+            if bottom != 0:
+                t = tTop / bottom
+                u = uTop / bottom
+                if 0 <= t <= 1 and 0 <= u <= 1:
+                    return True
+    return False
+
+# Sensor.castReadings' loop: rays from (ax, ay) as (abx, aby, bx, by) quadruples, segments as
+# (cx, cy, dx, dy) quadruples. Writes the nearest hit offset of every ray into best, above 1 for a miss.
+@kernel
+def rayKernel(ax, ay, ends, segments, best):
+    for k in range(len(segments) // 4):
+        cx = segments[4 * k]
+        cy = segments[4 * k + 1]
+        ex = segments[4 * k + 2] - cx
+        ey = segments[4 * k + 3] - cy
+        tTop = ex * (ay - cy) - ey * (ax - cx)
+        for i in range(len(best)):
+            abx = ends[4 * i]
+            aby = ends[4 * i + 1]
+            bx = ends[4 * i + 2]
+            by = ends[4 * i + 3]
+            bottom = ey * bx - ex * by
+            if bottom != 0:
+                t = tTop / bottom
+                if 0 <= t <= 1 and t < best[i]:
+                    u = ((cy - ay) * abx - (cx - ax) * aby) / bottom
+                    if 0 <= u <= 1:
+                        best[i] = t
+
+def flatPolygon(polygon):
+    coordinates = array('d')
+    for point in polygon:
+        coordinates.append(point['x'])
+        coordinates.append(point['y'])
+    return coordinates
+
+# Car whose physics, polygon and damage checks run through the kernels
+class KernelCar(Car):
+    def __init__(self, x, y, width, height, controlType, maxSpeed=3, sensorConfig=None):
+        super().__init__(x, y, width, height, controlType, maxSpeed, sensorConfig)
+        if hasattr(self, 'sensor'):
+            self.sensor = KernelSensor(self, sensorConfig)
+
+    def move(self):
+        if self.controls.keyboard:
+            self.controls.addKeyboardListeners()
+        controls = self.controls
+        self.speed, self.angle, self.x, self.y = moveKernel(self.speed, self.angle, self.x, self.y,
+                                                           bool(controls.forward), bool(controls.reverse), bool(controls.left), bool(controls.right),
+                                                           self.acceleration, self.maxSpeed, self.friction)
+
+    def createPolygon(self):
+        self.updateRotation()
+        corners = polygonKernel(self.x, self.y, self.corners)
+        for k, point in enumerate(self.polygon):
+            point['x'] = corners[2 * k]
+            point['y'] = corners[2 * k + 1]
+        return self.polygon
+
+    # Car.assessDamage keeps its early reject; only the exact test moves into the kernel
+    def touches(self, shape):
+        return touchKernel(flatPolygon(self.polygon), flatPolygon(shape))
+
+class KernelSensor(Sensor):
+    def castReadings(self, roadBorders, traffic):
+        ax = self.car.x
+        ay = self.car.y
+        ends = array('d')
+        for ray in self.rays:
+            ends.extend((ax - ray[1]['x'], ay - ray[1]['y'], ray[1]['x'] - ax, ray[1]['y'] - ay))
+        segments = array('d')
+        for C, D in roadBorders:
+            segments.extend((C['x'], C['y'], D['x'], D['y']))
+        for otherCar in traffic:
+            poly = otherCar.polygon
+            for j in range(len(poly)):
+                C = poly[j]
+                D = poly[(j + 1) % len(poly)]
+                segments.extend((C['x'], C['y'], D['x'], D['y']))
+        best = array('d', [2.0] * len(self.rays))
+        rayKernel(ax, ay, ends, segments, best)
+
+        readings = []
+        for i, t in enumerate(best):
+            if t > 1:
+                readings.append(None)
+            else:
+                readings.append({'x': ax + ends[4 * i + 2] * t, 'y': ay + ends[4 * i + 3] * t, 'offset': t})
+        return readings
+
+# Kernels against the methods they replace, on random states, then whole worlds stepped both ways.
+# Returns the number of mismatches.
+def crossCheck(samples=20000, population=30, steps=300, seed=1, tolerance=1e-9, log=print):
+    rng = random.Random(seed)
+    mismatches = 0
+    car = Car(0, 0, 30, 50, "DUMMY")
+    for _ in range(samples):
+        car.x = rng.uniform(-500, 500)
+        car.y = rng.uniform(-5000, 500)
+        car.speed = rng.uniform(-2, 4)
+        car.angle = rng.uniform(-math.pi, math.pi)
+        flags = [rng.random() < 0.5 for _ in range(4)]
+        car.controls.forward, car.controls.reverse, car.controls.left, car.controls.right = flags
+        state = moveKernel(car.speed, car.angle, car.x, car.y, *flags, car.acceleration, car.maxSpeed, car.friction)
+        car.move()
+        if any(abs(a - b) > tolerance for a, b in zip(state, (car.speed, car.angle, car.x, car.y))):
+            mismatches += 1
+        car.updateRotation()
+        corners = polygonKernel(car.x, car.y, car.corners)
+        polygon = car.createPolygon()
+        if any(abs(a - b) > tolerance for a, b in zip(corners, flatPolygon(polygon))):
+            mismatches += 1
+    log("move and polygon: %d samples, %d mismatches" % (samples, mismatches))
+
+    touches = 0
+    other = Car(0, 0, 30, 50, "DUMMY")
+    for _ in range(samples):
+        for target in (car, other):
+            target.x = rng.uniform(-40, 40)
+            target.y = rng.uniform(-60, 60)
+            target.angle = rng.uniform(-math.pi, math.pi)
+            target.polygon = target.createPolygon()
+        border = [{'x': rng.uniform(-60, 60), 'y': rng.uniform(-80, 80)} for _ in range(2)]
+        for shape in (other.polygon, border):
+            expected = polysIntersect(car.polygon, shape)
+            touches += expected
+            if touchKernel(flatPolygon(car.polygon), flatPolygon(shape)) != expected:
+                mismatches += 1
+    log("polygon intersection: %d pairs, %d touching, %d mismatches so far" % (2 * samples, touches, mismatches))
+
+    # Whole worlds: same brains, stepped with the methods and with the kernels
+    random.seed(seed)
+    brains = [NeuralNetwork([5, 6, 4]) for _ in range(population)]
+    results = []
+    for carClass in (Car, KernelCar):
+        world = createWorld(population, seed, carClass=carClass)
+        for car, brain in zip(world.cars, brains):
+            car.brain = brain
+        start = time.time()
+        world.run(steps)
+        results.append([[car.x, car.y, car.damaged] + [2.0 if reading is None else reading['offset'] for reading in car.sensor.readings]
+                        for car in world.cars])
+        log("%-9s %6.2f s for %d steps" % (carClass.__name__, time.time() - start, world.steps))
+    diverged = sum(1 for a, b in zip(*results) if any(abs(p - q) > tolerance for p, q in zip(a, b)))
+    if diverged:
+        mismatches += 1
+        log("%d of %d cars diverged" % (diverged, population))
+    log("%s, %d mismatches" % ("numba" if njit is not None else "pure Python fallback", mismatches))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cross-check', action='store_true')
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--population', type=int, default=30)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.cross_check:
+        sys.exit(1 if crossCheck(args.samples, args.population, args.steps, args.seed) else 0)
+    world = createWorld(args.population, args.seed, carClass=KernelCar)
+    start = time.time()
+    world.run(args.steps)
+    print("%d steps in %.2f s with %s kernels" % (world.steps, time.time() - start, "numba" if njit is not None else "Python"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import math
+import random
+import time
+
+from optimisation import Sensor, SensorConfig
+from training import createWorld
+
+CHUNK_ROWS = 64
+
+# Grid traversal over the cells a segment passes through, in order, with the segment parameter at which
+# each cell is entered (Amanatides & Woo)
+def traverse(x0, y0, x1, y1, cellSize):
+    dx = x1 - x0
+    dy = y1 - y0
+    ix = math.floor(x0 / cellSize)
+    iy = math.floor(y0 / cellSize)
+    endX = math.floor(x1 / cellSize)
+    endY = math.floor(y1 / cellSize)
+    stepX = 1 if dx > 0 else -1
+    stepY = 1 if dy > 0 else -1
+    tMaxX = ((ix + (dx > 0)) * cellSize - x0) / dx if dx else math.inf
+    tMaxY = ((iy + (dy > 0)) * cellSize - y0) / dy if dy else math.inf
+    tDeltaX = cellSize / abs(dx) if dx else math.inf
+    tDeltaY = cellSize / abs(dy) if dy else math.inf
+    t = 0.0
+    for _ in range(abs(endX - ix) + abs(endY - iy) + 1):
+        yield ix, iy, t
+        if tMaxX < tMaxY:
+            ix += stepX
+            t = tMaxX
+            tMaxX += tDeltaX
+        else:
+            iy += stepY
+            t = tMaxY
+            tMaxY += tDeltaY
+
+# Shared sparse occupancy grid of one world. Road borders are rasterized lazily, one band of CHUNK_ROWS
+# cell rows at a time, the first time a ray reaches that band. Traffic cells are reference counted and
+# re-rasterized only for cars that moved since the last sync.
+class OccupancyGrid:
+    def __init__(self, roadBorders, cellSize=5):
+        self.roadBorders = roadBorders
+        self.cellSize = cellSize
+        self.static = set()
+        self.chunks = set()
+        self.cells = {}
+        self.carCells = {}
+        self.carPoses = {}
+
+    def rasterizeChunk(self, chunk):
+        self.chunks.add(chunk)
+        top = chunk * CHUNK_ROWS * self.cellSize
+        bottom = top + CHUNK_ROWS * self.cellSize
+        for A, B in self.roadBorders:
+            ay, by = A['y'], B['y']
+            if max(ay, by) < top or min(ay, by) >= bottom:
+                continue
+            if ay == by:
+                t0, t1 = 0.0, 1.0
+            else:
+                t0 = min(max((top - ay) / (by - ay), 0.0), 1.0)
+                t1 = min(max((bottom - ay) / (by - ay), 0.0), 1.0)
+            x0 = A['x'] + (B['x'] - A['x']) * t0
+            y0 = ay + (by - ay) * t0
+            x1 = A['x'] + (B['x'] - A['x']) * t1
+            y1 = ay + (by - ay) * t1
+            for ix, iy, _ in traverse(x0, y0, x1, y1, self.cellSize):
+                if chunk * CHUNK_ROWS <= iy < (chunk + 1) * CHUNK_ROWS:
+                    self.static.add((ix, iy))
+
+    # Every cell a convex polygon overlaps: per cell row, the x extent of the polygon within that row
+    def polygonCells(self, polygon):
+        size = self.cellSize
+        points = [(point['x'], point['y']) for point in polygon]
+        cells = []
+        top = math.floor(min(y for _, y in points) / size)
+        bottom = math.floor(max(y for _, y in points) / size)
+        for row in range(top, bottom + 1):
+            y0 = row * size
+            y1 = y0 + size
+            xs = [x for x, y in points if y0 <= y <= y1]
+            for k in range(len(points)):
+                ax, ay = points[k]
+                bx, by = points[(k + 1) % len(points)]
+                if ay == by:
+                    continue
+                for edge in (y0, y1):
+                    if min(ay, by) <= edge <= max(ay, by):
+                        xs.append(ax + (bx - ax) * (edge - ay) / (by - ay))
+            if xs:
+                for column in range(math.floor(min(xs) / size), math.floor(max(xs) / size) + 1):
+                    cells.append((column, row))
+        return cells
+
+    # Only traffic inside the y window the live sensors can reach is kept in the grid; cars leaving the
+    # window drop their cells, so nothing stale is left behind where a ray could find it later
+    def sync(self, traffic, cars):
+        live = [car for car in cars if not car.damaged and hasattr(car, 'sensor')]
+        if live:
+            reach = max(car.sensor.rayLength + math.hypot(car.width, car.height) / 2 for car in live) + self.cellSize
+            top = min(car.y for car in live) - reach
+            bottom = max(car.y for car in live) + reach
+        else:
+            top, bottom = math.inf, -math.inf
+        present = set()
+        for car in traffic:
+            key = id(car)
+            present.add(key)
+            if top - car.height <= car.y <= bottom + car.height:
+                pose = (car.x, car.y, car.angle)
+                if self.carPoses.get(key) != pose:
+                    self.carPoses[key] = pose
+                    self.place(key, self.polygonCells(car.polygon))
+            elif key in self.carCells:
+                del self.carPoses[key]
+                self.place(key, [])
+        # Cars a spawner removed from the world
+        for key in [key for key in self.carPoses if key not in present]:
+            del self.carPoses[key]
+            self.place(key, [])
+
+    def place(self, key, new):
+        for cell in self.carCells.pop(key, ()):
+            count = self.cells[cell] - 1
+            if count:
+                self.cells[cell] = count
+            else:
+                del self.cells[cell]
+        for cell in new:
+            self.cells[cell] = self.cells.get(cell, 0) + 1
+        if new:
+            self.carCells[key] = new
+
+    # Offset along the ray at which it enters the first occupied cell, or None
+    def cast(self, x0, y0, x1, y1):
+        size = self.cellSize
+        for chunk in range(math.floor(min(y0, y1) / size) // CHUNK_ROWS, math.floor(max(y0, y1) / size) // CHUNK_ROWS + 1):
+            if chunk not in self.chunks:
+                self.rasterizeChunk(chunk)
+        cells = self.cells
+        static = self.static
+        for ix, iy, t in traverse(x0, y0, x1, y1, size):
+            if (ix, iy) in cells or (ix, iy) in static:
+                return t
+        return None
+
+# Drop-in Sensor whose rays are sampled from the shared grid: cost per ray depends on its length in cells,
+# not on how many cars or segments are around. A cell counts as occupied when any part of an obstacle is in
+# it, so readings are conservative: a ray never misses an obstacle the exact sensor sees and never reports it
+# later. The reported point is within one cell diagonal of an obstacle, but along the ray it can come much
+# earlier than the exact hit, and a ray grazing an obstacle by less than a cell reports a hit the exact sensor
+# does not.
+class OccupancySensor(Sensor):
+    def __init__(self, car, grid, config=None):
+        super().__init__(car, config)
+        self.grid = grid
+
+    def update(self, roadBorders, traffic):
+        self.castRays()
+        self.readings = []
+        for start, end in self.rays:
+            t = self.grid.cast(start['x'], start['y'], end['x'], end['y'])
+            if t is None:
+                self.readings.append(None)
+            else:
+                self.readings.append({
+                    'x': Sensor.lerp(start['x'], end['x'], t),
+                    'y': Sensor.lerp(start['y'], end['y'], t),
+                    'offset': t
+                })
+
+# Switches a world's cars to grid sensing; the world keeps the grid in sync with its traffic every step
+def useOccupancy(world, cellSize=5):
+    grid = OccupancyGrid(world.road.borders, cellSize)
+    world.occupancy = grid
+    for car in world.cars:
+        if hasattr(car, 'sensor'):
+            car.sensor = OccupancySensor(car, grid, car.sensor.config)
+    grid.sync(world.traffic, world.cars)
+    return grid
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--traffic', type=int, default=100)
+    parser.add_argument('--rays', type=int, default=5)
+    parser.add_argument('--cell-size', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Both runs start from the same brains and traffic, so only the sensing differs
+    for occupancy in (False, True):
+        random.seed(args.seed)
+        world = createWorld(args.population, args.seed, trafficCount=args.traffic, sensorConfig=SensorConfig(args.rays))
+        if occupancy:
+            useOccupancy(world, args.cell_size)
+        start = time.time()
+        world.run(args.steps)
+        best = max(world.cars, key=lambda car: -car.y)
+        print("%-10s %6.2f s, %d steps, best distance %.1f" % ("grid" if occupancy else "rays", time.time() - start, world.steps, best.y * -1))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,31 @@
+import hashlib
 import math
+import random
+import shelve
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict
 import pygame
 
+from traffic import LaneIndex
+
+# Scenario constants
+ROAD_X = 100
+ROAD_WIDTH = 180
+LANE_COUNT = 3
+CAR_WIDTH = 30
+CAR_HEIGHT = 50
+START_Y = 100
+TRAFFIC_COUNT = 7
+EVALUATION_STEPS = 1000
+# Part of every cached fitness key: bump it whenever car physics, sensing or the fitness measure change,
+# so fitnesses stored by older code are never returned
+FITNESS_VERSION = 4
+
 class Car:
-    def __init__(self, x, y, width, height, controlType, maxSpeed=3):
+    def __init__(self, x, y, width, height, controlType, maxSpeed=3, sensorConfig=None):
         self.x = x
         self.y = y
         self.width = width
@@ -15,10 +38,20 @@ class Car:
         self.angle = 0
         self.damaged = False
 
+        self.useBrain = controlType == "AI"
         if controlType != "DUMMY":
-            self.sensor = Sensor(self)
+            self.sensor = Sensor(self, sensorConfig)
+            self.brain = NeuralNetwork([self.sensor.rayCount, 6, 4])
         self.controls = Controls(controlType)
 
+        self.rad = math.hypot(width, height) / 2
+        alpha = math.atan2(width, height)
+        self.sinAlpha = math.sin(alpha)
+        self.cosAlpha = math.cos(alpha)
+        self.rotationAngle = None
+        self.polygon = [{'x': 0, 'y': 0} for _ in range(4)]
+        self.polygon = self.createPolygon()
+
     def update(self, roadBorders, traffic):
         if not self.damaged:
             self.move()
@@ -26,39 +59,92 @@ class Car:
             self.damaged = self.assessDamage(roadBorders, traffic)
         if hasattr(self, 'sensor'):
             self.sensor.update(roadBorders, traffic)
-
+            if self.useBrain:
+                self.think()
+
+    # Brains are checked against the sensor when they are assigned, so a brain saved for another ray count
+    # fails loudly instead of reading the wrong rays. think() uses the stored network directly.
+    @property
+    def brain(self):
+        return self.network
+
+    @brain.setter
+    def brain(self, network):
+        inputCount = type(network).inputCount(network)
+        if hasattr(self, 'sensor') and inputCount != self.sensor.rayCount:
+            raise ValueError("brain takes %d inputs but the sensor casts %d rays" % (inputCount, self.sensor.rayCount))
+        self.network = network
+
+    def think(self):
+        offsets = [0 if s is None else 1 - s['offset'] for s in self.sensor.readings]
+        outputs = type(self.network).feedForward(offsets, self.network)
+        self.controls.forward = outputs[0]
+        self.controls.left = outputs[1]
+        self.controls.right = outputs[2]
+        self.controls.reverse = outputs[3]
+
+    # The polygon lies within `rad` of the centre, so a border whose bounding box or a car whose bounding
+    # circle is out of that reach cannot touch it and the exact segment tests are skipped
     def assessDamage(self, roadBorders, traffic):
+        x = self.x
+        y = self.y
+        reach = self.rad + 1
         for roadBorder in roadBorders:
-            if self.polysIntersect(self.polygon, roadBorder):
+            if len(roadBorder) == 2:
+                A, B = roadBorder
+                if (x + reach < A['x'] and x + reach < B['x'] or x - reach > A['x'] and x - reach > B['x'] or
+                        y + reach < A['y'] and y + reach < B['y'] or y - reach > A['y'] and y - reach > B['y']):
+                    continue
+            if self.touches(roadBorder):
                 return True
         for otherCar in traffic:
-            if self.polysIntersect(self.polygon, otherCar.polygon):
+            dx = otherCar.x - x
+            dy = otherCar.y - y
+            limit = reach + otherCar.rad
+            if dx * dx + dy * dy > limit * limit:
+                continue
+            if self.touches(otherCar.polygon):
                 return True
         return False
 
+    # The exact test behind assessDamage's early reject
+    def touches(self, shape):
+        return polysIntersect(self.polygon, shape)
+
+    # Corner offsets from the centre only change when the car turns; otherwise the polygon is just translated.
+    # The offsets are an immutable tuple, so shallow copies of a car (ghosts, scenario clones) can share them
+    def updateRotation(self):
+        if self.angle == self.rotationAngle:
+            return
+        self.rotationAngle = self.angle
+        self.sinAngle = math.sin(self.angle)
+        self.cosAngle = math.cos(self.angle)
+        sinMinus = (self.sinAngle * self.cosAlpha - self.cosAngle * self.sinAlpha) * self.rad
+        cosMinus = (self.cosAngle * self.cosAlpha + self.sinAngle * self.sinAlpha) * self.rad
+        sinPlus = (self.sinAngle * self.cosAlpha + self.cosAngle * self.sinAlpha) * self.rad
+        cosPlus = (self.cosAngle * self.cosAlpha - self.sinAngle * self.sinAlpha) * self.rad
+        self.corners = (-sinMinus, -cosMinus, -sinPlus, -cosPlus, sinMinus, cosMinus, sinPlus, cosPlus)
+
+    # Updates the four point dicts in place and returns them
     def createPolygon(self):
-        points = []
-        rad = math.hypot(self.width, self.height) / 2
-        alpha = math.atan2(self.width, self.height)
-        points.append({
-            'x': self.x - math.sin(self.angle - alpha) * rad,
-            'y': self.y - math.cos(self.angle - alpha) * rad
-        })
-        points.append({
-            'x': self.x - math.sin(self.angle + alpha) * rad,
-            'y': self.y - math.cos(self.angle + alpha) * rad
-        })
-        points.append({
-            'x': self.x - math.sin(math.pi + self.angle - alpha) * rad,
-            'y': self.y - math.cos(math.pi + self.angle - alpha) * rad
-        })
-        points.append({
-            'x': self.x - math.sin(math.pi + self.angle + alpha) * rad,
-            'y': self.y - math.cos(math.pi + self.angle + alpha) * rad
-        })
-        return points
+        self.updateRotation()
+        corners = self.corners
+        x = self.x
+        y = self.y
+        a, b, c, d = self.polygon
+        a['x'] = x + corners[0]
+        a['y'] = y + corners[1]
+        b['x'] = x + corners[2]
+        b['y'] = y + corners[3]
+        c['x'] = x + corners[4]
+        c['y'] = y + corners[5]
+        d['x'] = x + corners[6]
+        d['y'] = y + corners[7]
+        return self.polygon
 
     def move(self):
+        if self.controls.keyboard:
+            self.controls.addKeyboardListeners()
         if self.controls.forward:
             self.speed += self.acceleration
         if self.controls.reverse:
@@ -83,18 +169,19 @@ class Car:
             if self.controls.right:
                 self.angle -= 0.03 * flip
 
-        self.x -= math.sin(self.angle) * self.speed
-        self.y -= math.cos(self.angle) * self.speed
+        self.updateRotation()
+        self.x -= self.sinAngle * self.speed
+        self.y -= self.cosAngle * self.speed
 
-    def draw(self, screen, color):
+    def draw(self, screen, color, offsetY=0, drawSensor=True):
+        points = [(point['x'], point['y'] + offsetY) for point in self.polygon]
         if self.damaged:
-            pygame.draw.polygon(screen, (169, 169, 169), self.polygon)
+            pygame.draw.polygon(screen, (169, 169, 169), points)
         else:
-            pygame.draw.polygon(screen, color, self.polygon)
+            pygame.draw.polygon(screen, color, points)
 
-        if hasattr(self, 'sensor'):
-            self.sensor.draw(screen)
-import random
+        if drawSensor and hasattr(self, 'sensor'):
+            self.sensor.draw(screen, offsetY)
 
 class NeuralNetwork:
     def __init__(self, neuronCounts):
@@ -102,13 +189,75 @@ class NeuralNetwork:
         for i in range(len(neuronCounts) - 1):
             self.levels.append(Level(neuronCounts[i], neuronCounts[i + 1]))
 
-    #staticmethod
+    @staticmethod
     def feedForward(givenInputs, network):
         outputs = Level.feedForward(givenInputs, network.levels[0])
         for i in range(1, len(network.levels)):
             outputs = Level.feedForward(outputs, network.levels[i])
         return outputs
 
+    @staticmethod
+    def mutate(network, amount=1):
+        for level in network.levels:
+            for i in range(len(level.biases)):
+                level.biases[i] = Sensor.lerp(level.biases[i], random.uniform(-1, 1), amount)
+            for row in level.weights:
+                for j in range(len(row)):
+                    row[j] = Sensor.lerp(row[j], random.uniform(-1, 1), amount)
+
+    @staticmethod
+    def inputCount(network):
+        return len(network.levels[0].inputs)
+
+    @staticmethod
+    def neuronCounts(network):
+        return [len(network.levels[0].inputs)] + [len(level.outputs) for level in network.levels]
+
+    @staticmethod
+    def flatten(network):
+        params = array('d')
+        for level in network.levels:
+            params.extend(level.biases)
+            for row in level.weights:
+                params.extend(row)
+        return params
+
+    @staticmethod
+    def unflatten(neuronCounts, params):
+        network = NeuralNetwork(neuronCounts)
+        k = 0
+        for level in network.levels:
+            outputCount = len(level.outputs)
+            level.biases = list(params[k:k + outputCount])
+            k += outputCount
+            for i in range(len(level.weights)):
+                level.weights[i] = list(params[k:k + outputCount])
+                k += outputCount
+        return network
+
+    # Compact binary blob: layer count, neuron counts, little-endian float64 parameters
+    @staticmethod
+    def toBytes(network):
+        counts = NeuralNetwork.neuronCounts(network)
+        params = NeuralNetwork.flatten(network)
+        if sys.byteorder == 'big':
+            params.byteswap()
+        return struct.pack('<%dH' % (len(counts) + 1), len(counts), *counts) + params.tobytes()
+
+    @staticmethod
+    def fromBytes(blob):
+        layerCount = struct.unpack_from('<H', blob)[0]
+        counts = list(struct.unpack_from('<%dH' % layerCount, blob, 2))
+        params = array('d')
+        params.frombytes(blob[2 + 2 * layerCount:])
+        if sys.byteorder == 'big':
+            params.byteswap()
+        return NeuralNetwork.unflatten(counts, params)
+
+    @staticmethod
+    def copy(network):
+        return NeuralNetwork.fromBytes(NeuralNetwork.toBytes(network))
+
 class Level:
     def __init__(self, inputCount, outputCount):
         self.inputs = [0] * inputCount
@@ -117,7 +266,7 @@ class Level:
         
         self.weights = [[random.uniform(-1, 1) for _ in range(outputCount)] for _ in range(inputCount)]
 
-    #staticmethod
+    @staticmethod
     def feedForward(givenInputs, level):
         for i in range(len(level.inputs)):
             level.inputs[i] = givenInputs[i]
@@ -140,8 +289,9 @@ class Controls:
         self.left = False
         self.right = False
         self.reverse = False
+        self.keyboard = controlType == "KEYS"
 
-        if controlType == "KEYS":
+        if self.keyboard:
             self.addKeyboardListeners()
         elif controlType == "DUMMY":
             self.forward = True
@@ -153,168 +303,112 @@ class Controls:
         self.right = keys[pygame.K_RIGHT]
         self.reverse = keys[pygame.K_DOWN]
 
+# Ray layout of a sensor. Directions relative to the car are tabulated once, scaled by each ray's length,
+# so casting only has to rotate the table by the car's heading
+class SensorConfig:
+    def __init__(self, rayCount=5, rayLength=150, raySpread=math.pi / 2, rayLengths=None):
+        self.rayCount = rayCount
+        self.raySpread = raySpread
+        self.rayLengths = list(rayLengths) if rayLengths is not None else [rayLength] * rayCount
+        if len(self.rayLengths) != rayCount:
+            raise ValueError("rayLengths needs one length per ray")
+        self.rayLength = max(self.rayLengths) if rayCount else 0
+
+        self.directions = []
+        for i in range(rayCount):
+            angle = Sensor.lerp(raySpread / 2, -raySpread / 2, 0.5 if rayCount == 1 else i / (rayCount - 1))
+            length = self.rayLengths[i]
+            self.directions.append((math.sin(angle) * length, math.cos(angle) * length))
+
+    def toDict(self):
+        return {'rayCount': self.rayCount, 'raySpread': self.raySpread, 'rayLengths': self.rayLengths}
+
+    @staticmethod
+    def fromDict(data):
+        return SensorConfig(data['rayCount'], raySpread=data['raySpread'], rayLengths=data['rayLengths'])
+
 class Sensor:
-    def __init__(self, car):
+    def __init__(self, car, config=None):
         self.car = car
-        self.rayCount = 5
-        self.rayLength = 150
-        self.raySpread = math.pi / 2
+        config = config or DEFAULT_SENSOR
+        self.config = config
+        self.rayCount = config.rayCount
+        self.rayLength = config.rayLength
+        self.raySpread = config.raySpread
 
         self.rays = []
         self.readings = []
 
     def update(self, roadBorders, traffic):
         self.castRays()
-        self.readings = []
-        for ray in self.rays:
-            self.readings.append(self.getReading(ray, roadBorders, traffic))
+        self.readings = self.castReadings(roadBorders, traffic)
 
-    def getReading(self, ray, roadBorders, traffic):
-        touches = []
-
-        for roadBorder in roadBorders:
-            touch = self.getIntersection(ray[0], ray[1], roadBorder[0], roadBorder[1])
-            if touch:
-                touches.append(touch)
+    # Nearest touch of every ray, found segment by segment: all rays start at the car, so the segment's
+    # t numerator is shared by every ray and only the per-ray terms are computed in the inner loop
+    def castReadings(self, roadBorders, traffic):
+        ax = self.car.x
+        ay = self.car.y
+        ends = [(ax - ray[1]['x'], ay - ray[1]['y'], ray[1]['x'] - ax, ray[1]['y'] - ay) for ray in self.rays]
+        best = [2.0] * len(ends)
 
+        segments = [(border[0], border[1]) for border in roadBorders]
         for otherCar in traffic:
             poly = otherCar.polygon
             for j in range(len(poly)):
-                value = self.getIntersection(ray[0], ray[1], poly[j], poly[(j + 1) % len(poly)])
-                if value:
-                    touches.append(value)
-
-        if not touches:
-            return None
-        else:
-            offsets = [touch['offset'] for touch in touches]
-            minOffset = min(offsets)
-            return [touch for touch in touches if touch['offset'] == minOffset][0]
+                segments.append((poly[j], poly[(j + 1) % len(poly)]))
+
+        for C, D in segments:
+            cx = C['x']
+            cy = C['y']
+            ex = D['x'] - cx
+            ey = D['y'] - cy
+            tTop = ex * (ay - cy) - ey * (ax - cx)
+            for i, (abx, aby, bx, by) in enumerate(ends):
+                bottom = ey * bx - ex * by
+                if bottom != 0:
+                    t = tTop / bottom
+                    if 0 <= t <= 1 and t < best[i]:
+                        u = ((cy - ay) * abx - (cx - ax) * aby) / bottom
+                        if 0 <= u <= 1:
+                            best[i] = t
+
+        readings = []
+        for (abx, aby, bx, by), t in zip(ends, best):
+            if t > 1:
+                readings.append(None)
+            else:
+                readings.append({'x': ax + bx * t, 'y': ay + by * t, 'offset': t})
+        return readings
 
+    # The relative direction table rotated by the car's heading, using the sin/cos the car already caches
     def castRays(self):
+        car = self.car
+        car.updateRotation()
+        sinAngle = car.sinAngle
+        cosAngle = car.cosAngle
         self.rays = []
-        for i in range(self.rayCount):
-            rayAngle = self.lerp(self.raySpread / 2, -self.raySpread / 2, 0.5 if self.rayCount == 1 else i / (self.rayCount - 1)) + self.car.angle
-
-            start = {'x': self.car.x, 'y': self.car.y}
+        for sinLength, cosLength in self.config.directions:
+            start = {'x': car.x, 'y': car.y}
             end = {
-                'x': self.car.x - math.sin(rayAngle) * self.rayLength,
-                'y': self.car.y - math.cos(rayAngle) * self.rayLength
+                'x': car.x - (sinLength * cosAngle + cosLength * sinAngle),
+                'y': car.y - (cosLength * cosAngle - sinLength * sinAngle)
             }
             self.rays.append([start, end])
 
-    def draw(self, screen):
-        for i in range(self.rayCount):
+    def draw(self, screen, offsetY=0):
+        for i in range(len(self.readings)):
             end = self.rays[i][1]
             if self.readings[i]:
                 end = self.readings[i]
 
-            pygame.draw.line(screen, (255, 255, 0), (self.rays[i][0]['x'], self.rays[i][0]['y']), (end['x'], end['y']), 2)
-            pygame.draw.line(screen, (0, 0, 0), (self.rays[i][1]['x'], self.rays[i][1]['y']), (end['x'], end['y']), 2)
-class Visualizer:
-    #staticmethod
-    def draw_network(ctx, network):
-        margin = 50
-        left = margin
-        top = margin
-        width = ctx.canvas.width - margin * 2
-        height = ctx.canvas.height - margin * 2
-
-        level_height = height / len(network.levels)
-
-        for i in range(len(network.levels) - 1, -1, -1):
-            level_top = top + Visualizer.lerp(
-                height - level_height,
-                0,
-                0.5 if network.levels.length == 1 else i / (len(network.levels) - 1)
-            )
-
-            ctx.set_line_dash([7, 3])
-            Visualizer.draw_level(
-                ctx, network.levels[i], left, level_top, width, level_height,
-                ['🠉', '🠈', '🠊', '🠋'] if i == len(network.levels) - 1 else []
-            )
-
-    #staticmethod
-    def draw_level(ctx, level, left, top, width, height, output_labels):
-        right = left + width
-        bottom = top + height
-
-        inputs, outputs, weights, biases = level.inputs, level.outputs, level.weights, level.biases
-
-        for i in range(len(inputs)):
-            for j in range(len(outputs)):
-                ctx.beginPath()
-                ctx.move_to(
-                    Visualizer.get_node_x(inputs, i, left, right),
-                    bottom
-                )
-                ctx.line_to(
-                    Visualizer.get_node_x(outputs, j, left, right),
-                    top
-                )
-                ctx.line_width = 2
-                ctx.stroke_style = Visualizer.get_rgba(weights[i][j])
-                ctx.stroke()
-
-        node_radius = 18
-        for i in range(len(inputs)):
-            x = Visualizer.get_node_x(inputs, i, left, right)
-            ctx.beginPath()
-            ctx.arc(x, bottom, node_radius, 0, math.pi * 2)
-            ctx.fill_style = "black"
-            ctx.fill()
-            ctx.beginPath()
-            ctx.arc(x, bottom, node_radius * 0.6, 0, math.pi * 2)
-            ctx.fill_style = Visualizer.get_rgba(inputs[i])
-            ctx.fill()
-
-        for i in range(len(outputs)):
-            x = Visualizer.get_node_x(outputs, i, left, right)
-            ctx.beginPath()
-            ctx.arc(x, top, node_radius, 0, math.pi * 2)
-            ctx.fill_style = "black"
-            ctx.fill()
-            ctx.beginPath()
-            ctx.arc(x, top, node_radius * 0.6, 0, math.pi * 2)
-            ctx.fill_style = Visualizer.get_rgba(outputs[i])
-            ctx.fill()
-
-            ctx.beginPath()
-            ctx.line_width = 2
-            ctx.arc(x, top, node_radius * 0.8, 0, math.pi * 2)
-            ctx.stroke_style = Visualizer.get_rgba(biases[i])
-            ctx.set_line_dash([3, 3])
-            ctx.stroke()
-            ctx.set_line_dash([])
-
-            if output_labels[i]:
-                ctx.beginPath()
-                ctx.text_align = "center"
-                ctx.text_baseline = "middle"
-                ctx.fill_style = "black"
-                ctx.stroke_style = "white"
-                ctx.font = str(node_radius * 1.5) + "px Arial"
-                ctx.text((node_radius * 1.5) + "px Arial", x, top + node_radius * 0.1)
-                ctx.line_width = 0.5
-                ctx.stroke_text(output_labels[i], x, top + node_radius * 0.1)
-
-    #staticmethod
-    def get_node_x(nodes, index, left, right):
-        return Visualizer.lerp(
-            left,
-            right,
-            0.5 if len(nodes) == 1 else index / (len(nodes) - 1)
-        )
+            pygame.draw.line(screen, (255, 255, 0), (self.rays[i][0]['x'], self.rays[i][0]['y'] + offsetY), (end['x'], end['y'] + offsetY), 2)
+            pygame.draw.line(screen, (0, 0, 0), (self.rays[i][1]['x'], self.rays[i][1]['y'] + offsetY), (end['x'], end['y'] + offsetY), 2)
 
-    #staticmethod
-    def lerp(a, b, t):
-        return a + (b - a) * t
-    #staticmethod
+    @staticmethod
     def lerp(A, B, t):
         return A + (B - A) * t
 
-    #staticmethod
+    @staticmethod
     def getIntersection(A, B, C, D):
         tTop = (D['x'] - C['x']) * (A['y'] - C['y']) - (D['y'] - C['y']) * (A['x'] - C['x'])
         uTop = (C['y'] - A['y']) * (A['x'] - B['x']) - (C['x'] - A['x']) * (A['y'] - B['y'])
@@ -332,6 +426,498 @@ class Visualizer:
 
         return None
 
+DEFAULT_SENSOR = SensorConfig()
+
+class Road:
+    def __init__(self, x, width, laneCount=LANE_COUNT):
+        self.x = x
+        self.width = width
+        self.laneCount = laneCount
+
+        self.left = x - width / 2
+        self.right = x + width / 2
+
+        infinity = 1000000
+        self.top = -infinity
+        self.bottom = infinity
+
+        topLeft = {'x': self.left, 'y': self.top}
+        topRight = {'x': self.right, 'y': self.top}
+        bottomLeft = {'x': self.left, 'y': self.bottom}
+        bottomRight = {'x': self.right, 'y': self.bottom}
+        self.borders = [
+            [topLeft, bottomLeft],
+            [topRight, bottomRight]
+        ]
+
+    def getLaneCenter(self, laneIndex):
+        laneWidth = self.width / self.laneCount
+        return self.left + laneWidth / 2 + min(laneIndex, self.laneCount - 1) * laneWidth
+
+    def draw(self, screen, offsetY=0):
+        height = screen.get_height()
+        dashStart = int(offsetY) % 40 - 40
+        for i in range(1, self.laneCount):
+            x = Sensor.lerp(self.left, self.right, i / self.laneCount)
+            for y in range(dashStart, height, 40):
+                pygame.draw.line(screen, (255, 255, 255), (x, y), (x, y + 20), 5)
+
+        for border in self.borders:
+            pygame.draw.line(screen, (255, 255, 255), (border[0]['x'], 0), (border[1]['x'], height), 5)
+
+# Bounding volume hierarchy over road border segments, for roads built from many short segments (curves).
+# Each node is (minX, minY, maxX, maxY, children) where children is either two nodes or a list of borders.
+class BorderTree:
+    def __init__(self, borders, leafSize=4):
+        self.root = self.build([(BorderTree.bounds(border), border) for border in borders], leafSize)
+
+    @staticmethod
+    def bounds(border):
+        xs = [point['x'] for point in border]
+        ys = [point['y'] for point in border]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def build(self, items, leafSize):
+        minX = min(box[0] for box, _ in items)
+        minY = min(box[1] for box, _ in items)
+        maxX = max(box[2] for box, _ in items)
+        maxY = max(box[3] for box, _ in items)
+        if len(items) <= leafSize:
+            return (minX, minY, maxX, maxY, [border for _, border in items])
+        # Split at the median centre along the longer side
+        axis = 0 if maxX - minX >= maxY - minY else 1
+        items.sort(key=lambda item: item[0][axis] + item[0][axis + 2])
+        half = len(items) // 2
+        return (minX, minY, maxX, maxY, (self.build(items[:half], leafSize), self.build(items[half:], leafSize)))
+
+    # Every border whose bounding box comes within `reach` of (x, y) on both axes
+    def near(self, x, y, reach):
+        found = []
+        stack = [self.root]
+        while stack:
+            minX, minY, maxX, maxY, children = stack.pop()
+            if x + reach < minX or x - reach > maxX or y + reach < minY or y - reach > maxY:
+                continue
+            if isinstance(children, list):
+                found.extend(children)
+            else:
+                stack.extend(children)
+        return found
+
+# Roads with more borders than this are searched through a BorderTree
+BORDER_TREE_MIN = 16
+
+# Headless world: traffic and a population of cars stepped together
+class World:
+    def __init__(self, road, traffic, cars, profiler=None, trafficModel=None, trafficIndex=None, spawner=None, occupancy=None):
+        self.road = road
+        self.traffic = traffic
+        self.cars = cars
+        self.profiler = profiler
+        self.trafficModel = trafficModel
+        self.trafficIndex = trafficIndex
+        self.spawner = spawner
+        self.occupancy = occupancy
+        self.borderTree = BorderTree(road.borders) if len(road.borders) > BORDER_TREE_MIN else None
+        self.steps = 0
+
+    def updateTraffic(self):
+        if self.spawner is not None:
+            self.spawner.spawn(self)
+        if self.trafficModel is not None:
+            self.trafficModel.step(self.traffic, self.trafficIndex)
+        else:
+            # Traffic is not held to the road borders, so cross traffic can drive through intersections
+            for car in self.traffic:
+                car.update([], [])
+        if self.trafficIndex is not None:
+            self.trafficIndex.update()
+        if self.occupancy is not None:
+            self.occupancy.sync(self.traffic, self.cars)
+
+    # Distance from the car's centre within which it or its sensor can touch anything this step
+    @staticmethod
+    def reach(car):
+        reach = math.hypot(car.width, car.height) / 2 + car.maxSpeed
+        if hasattr(car, 'sensor'):
+            reach += car.sensor.rayLength
+        return reach
+
+    # Traffic that can touch the car or its sensor this step
+    def nearbyTraffic(self, car):
+        if self.trafficIndex is None:
+            return self.traffic
+        return self.trafficIndex.near(car.y, World.reach(car))
+
+    def nearbyBorders(self, car):
+        if self.borderTree is None:
+            return self.road.borders
+        return self.borderTree.near(car.x, car.y, World.reach(car))
+
+    def step(self):
+        if self.profiler is not None:
+            self.profiledStep(self.profiler)
+            return
+        self.updateTraffic()
+        for car in self.cars:
+            car.update(self.nearbyBorders(car), self.nearbyTraffic(car))
+        self.steps += 1
+
+    # Same work as Car.update, split phase by phase so each phase can be timed across the population
+    def profiledStep(self, profiler):
+        stepStart = profiler.clock()
+
+        start = profiler.clock()
+        self.updateTraffic()
+        profiler.record('traffic', start)
+
+        start = profiler.clock()
+        nearby = {id(car): self.nearbyTraffic(car) for car in self.cars}
+        borders = {id(car): self.nearbyBorders(car) for car in self.cars}
+        profiler.record('index', start)
+
+        live = [car for car in self.cars if not car.damaged]
+        start = profiler.clock()
+        for car in live:
+            car.move()
+        profiler.record('move', start)
+
+        start = profiler.clock()
+        for car in live:
+            car.polygon = car.createPolygon()
+        profiler.record('polygon', start)
+
+        start = profiler.clock()
+        for car in live:
+            car.damaged = car.assessDamage(borders[id(car)], nearby[id(car)])
+        profiler.record('damage', start)
+
+        sensing = [car for car in self.cars if hasattr(car, 'sensor')]
+        start = profiler.clock()
+        for car in sensing:
+            car.sensor.update(borders[id(car)], nearby[id(car)])
+        profiler.record('sensor', start)
+
+        start = profiler.clock()
+        for car in sensing:
+            if car.useBrain:
+                car.think()
+        profiler.record('network', start)
+
+        profiler.record('step', stepStart)
+        self.steps += 1
+
+    def alive(self):
+        return sum(1 for car in self.cars if not car.damaged)
+
+    def run(self, steps):
+        while self.steps < steps and self.alive() > 0:
+            self.step()
+
+def generateTraffic(road, seed, count=TRAFFIC_COUNT, spacing=200, speedRange=None):
+    rng = random.Random(seed)
+    traffic = []
+    for i in range(count):
+        lane = rng.randrange(road.laneCount)
+        y = START_Y - spacing * (i + 1) - rng.uniform(0, spacing / 2)
+        maxSpeed = rng.uniform(*speedRange) if speedRange else 2
+        car = Car(road.getLaneCenter(lane), y, CAR_WIDTH, CAR_HEIGHT, "DUMMY", maxSpeed)
+        car.lane = lane
+        traffic.append(car)
+    return traffic
+
+# Cars run through the compiled kernels when numba is installed. kernels imports this module, so it is
+# only loaded once the first population is built
+def defaultCarClass():
+    from kernels import KernelCar, njit
+    return KernelCar if njit is not None else Car
+
+# `augment`, when given, is an AugmentConfig the brains are scored under
+def evaluatePopulation(brains, seed, steps=EVALUATION_STEPS, augment=None):
+    road = Road(ROAD_X, ROAD_WIDTH)
+    carClass = defaultCarClass()
+    cars = []
+    for brain in brains:
+        car = carClass(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI")
+        car.brain = brain
+        cars.append(car)
+    traffic = generateTraffic(road, seed)
+    world = World(road, traffic, cars, trafficIndex=LaneIndex(road, traffic))
+    if augment is not None:
+        # augment imports this module, so it is only loaded once degraded sensing is asked for
+        from augment import useAugmentation
+        useAugmentation(world, augment, seed, perBrain=True)
+    world.run(steps)
+    return [START_Y - car.y for car in cars]
+
+def scenarioKey(seed, steps=EVALUATION_STEPS, sensorConfig=None, augment=None):
+    sensor = (sensorConfig or DEFAULT_SENSOR).toDict()
+    key = "road:%s,%s,%s|traffic:%s,%s|steps:%s|sensor:%s,%r,%s" % (ROAD_X, ROAD_WIDTH, LANE_COUNT, seed, TRAFFIC_COUNT, steps,
+                                                                 sensor['rayCount'], sensor['raySpread'], sensor['rayLengths'])
+    if augment is not None and augment.enabled():
+        key += "|" + augment.key()
+    return key
+
+# Fitness cache keyed on brain weights + scenario, LRU in memory with an optional shelve tier on disk
+class FitnessCache:
+    def __init__(self, capacity=10000, path=None):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.disk = shelve.open(path) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(blob, scenario):
+        return "v%d|%s|%s" % (FITNESS_VERSION, hashlib.sha1(blob).hexdigest(), scenario)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.disk is not None and key in self.disk:
+            fitness = self.disk[key]
+            self.remember(key, fitness)
+            self.hits += 1
+            return fitness
+        self.misses += 1
+        return None
+
+    def put(self, key, fitness):
+        self.remember(key, fitness)
+        if self.disk is not None:
+            self.disk[key] = fitness
+
+    def remember(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def evaluate(self, brains, scenario, evaluate):
+        keys = [FitnessCache.key(NeuralNetwork.toBytes(brain), scenario) for brain in brains]
+        fitnesses = [self.get(key) for key in keys]
+        missing = [i for i in range(len(brains)) if fitnesses[i] is None]
+        if missing:
+            results = evaluate([brains[i] for i in missing])
+            for i, fitness in zip(missing, results):
+                fitnesses[i] = fitness
+                self.put(keys[i], fitness)
+        return fitnesses
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
+
+def nextGeneration(brains, fitnesses, mutationAmount=0.1, eliteCount=1):
+    ranked = sorted(range(len(brains)), key=lambda i: fitnesses[i], reverse=True)
+    children = [brains[i] for i in ranked[:eliteCount]]
+    best = brains[ranked[0]]
+    while len(children) < len(brains):
+        child = NeuralNetwork.copy(best)
+        NeuralNetwork.mutate(child, mutationAmount)
+        children.append(child)
+    return children
+
+def runGenetic(evaluate, generations, populationSize, mutationAmount=0.1, neuronCounts=(5, 6, 4)):
+    brains = [NeuralNetwork(list(neuronCounts)) for _ in range(populationSize)]
+    best = None
+    for generation in range(generations):
+        fitnesses = evaluate(brains)
+        bestIndex = max(range(len(brains)), key=lambda i: fitnesses[i])
+        best = brains[bestIndex]
+        print("Generation %d: best %.1f" % (generation, fitnesses[bestIndex]))
+        brains = nextGeneration(brains, fitnesses, mutationAmount)
+    return best
+
+class Visualizer:
+    NODE_RADIUS = 18
+
+    def __init__(self, width, height, margin=50, cache_size=8):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.cache_size = cache_size
+        self.diagrams = {}
+
+    # Per frame: blit the cached diagram of this brain, then fill in only the activation discs. Activations
+    # default to the brain's own, or are given per level as (inputs, outputs) copied from another thread.
+    def draw_network(self, screen, network, left=0, top=0, activations=None):
+        diagram = self.diagrams.get(network)
+        if diagram is None:
+            diagram = self.build_diagram(network)
+            if len(self.diagrams) >= self.cache_size:
+                self.diagrams.pop(next(iter(self.diagrams)))
+            self.diagrams[network] = diagram
+        layer, nodes = diagram
+        screen.blit(layer, (left, top))
+
+        if activations is None:
+            activations = [(level.inputs, level.outputs) for level in network.levels]
+        inner_radius = Visualizer.NODE_RADIUS * 0.6
+        for index, side, positions, labels in nodes:
+            values = activations[index][side]
+            for i in range(len(positions)):
+                x, y = positions[i]
+                pygame.draw.circle(screen, Visualizer.get_rgb(values[i]), (left + x, top + y), inner_radius)
+                if labels and i < len(labels):
+                    Visualizer.draw_arrow(screen, labels[i], (left + x, top + y), Visualizer.NODE_RADIUS * 0.5)
+
+    def level_boxes(self, network):
+        height = self.height - self.margin * 2
+        level_height = height / len(network.levels)
+        for i in range(len(network.levels) - 1, -1, -1):
+            level_top = self.margin + Visualizer.lerp(
+                height - level_height,
+                0,
+                0.5 if len(network.levels) == 1 else i / (len(network.levels) - 1)
+            )
+            yield i, level_top, level_height
+
+    # Weights and biases only change between generations, so edges, node discs and bias rings
+    # are drawn once per brain into an off-screen layer
+    def build_diagram(self, network):
+        layer = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        left = self.margin
+        right = self.width - self.margin
+        nodes = []
+        for i, level_top, level_height in self.level_boxes(network):
+            level = network.levels[i]
+            bottom = level_top + level_height
+            input_positions = [(Visualizer.get_node_x(level.inputs, j, left, right), bottom) for j in range(len(level.inputs))]
+            output_positions = [(Visualizer.get_node_x(level.outputs, k, left, right), level_top) for k in range(len(level.outputs))]
+            self.draw_level(layer, level, input_positions, output_positions)
+
+            labels = ['up', 'left', 'right', 'down'] if i == len(network.levels) - 1 else None
+            nodes.append((i, 1, output_positions, labels))
+            if i == 0:
+                nodes.append((0, 0, input_positions, None))
+        return layer, nodes
+
+    def draw_level(self, layer, level, input_positions, output_positions):
+        for j in range(len(input_positions)):
+            for k in range(len(output_positions)):
+                Visualizer.draw_dashed_line(
+                    layer, Visualizer.get_rgba(level.weights[j][k]),
+                    input_positions[j], output_positions[k], [7, 3], 2
+                )
+
+        node_radius = Visualizer.NODE_RADIUS
+        for position in input_positions:
+            pygame.draw.circle(layer, (0, 0, 0), position, node_radius)
+
+        for k in range(len(output_positions)):
+            pygame.draw.circle(layer, (0, 0, 0), output_positions[k], node_radius)
+            Visualizer.draw_dashed_circle(layer, Visualizer.get_rgb(level.biases[k]), output_positions[k], node_radius * 0.8, [3, 3], 2)
+
+    @staticmethod
+    def get_node_x(nodes, index, left, right):
+        return Visualizer.lerp(
+            left,
+            right,
+            0.5 if len(nodes) == 1 else index / (len(nodes) - 1)
+        )
+
+    @staticmethod
+    def get_rgba(value):
+        alpha = min(abs(value), 1)
+        R = 0 if value < 0 else 255
+        G = R
+        B = 0 if value > 0 else 255
+        return (R, G, B, int(alpha * 255))
+
+    # The same colour already blended over the black node discs
+    @staticmethod
+    def get_rgb(value):
+        R, G, B, A = Visualizer.get_rgba(value)
+        return (R * A // 255, G * A // 255, B * A // 255)
+
+    @staticmethod
+    def draw_dashed_line(surface, color, start, end, dash, width):
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        if length == 0:
+            return
+        position = 0
+        while position < length:
+            t1 = position / length
+            t2 = min(position + dash[0], length) / length
+            pygame.draw.line(
+                surface, color,
+                (Visualizer.lerp(start[0], end[0], t1), Visualizer.lerp(start[1], end[1], t1)),
+                (Visualizer.lerp(start[0], end[0], t2), Visualizer.lerp(start[1], end[1], t2)),
+                width
+            )
+            position += dash[0] + dash[1]
+
+    # pygame's default font has no arrow glyphs, so the output labels are drawn as polygons
+    @staticmethod
+    def draw_arrow(surface, direction, center, size):
+        angle = {'up': 0, 'left': math.pi / 2, 'down': math.pi, 'right': -math.pi / 2}[direction]
+        shape = [(0, -1), (0.8, 0), (0.3, 0), (0.3, 1), (-0.3, 1), (-0.3, 0), (-0.8, 0)]
+        cos, sin = math.cos(angle), math.sin(angle)
+        points = [(center[0] + (px * cos + py * sin) * size, center[1] + (-px * sin + py * cos) * size) for px, py in shape]
+        pygame.draw.polygon(surface, (255, 255, 255), points)
+        pygame.draw.polygon(surface, (0, 0, 0), points, 1)
+
+    @staticmethod
+    def draw_dashed_circle(surface, color, center, radius, dash, width):
+        rect = pygame.Rect(0, 0, radius * 2, radius * 2)
+        rect.center = center
+        step = (dash[0] + dash[1]) / radius
+        angle = 0
+        while angle < math.pi * 2:
+            pygame.draw.arc(surface, color, rect, angle, angle + dash[0] / radius, width)
+            angle += step
+
+    @staticmethod
+    def lerp(a, b, t):
+        return a + (b - a) * t
+
+# Performance HUD: FPS, simulation rate, alive cars and per-phase profiler timings
+class Hud:
+    def __init__(self, refresh=0.5):
+        self.refresh = refresh
+        self.font = None
+        self.surface = None
+        self.last_time = 0
+        self.last_steps = 0
+        self.steps_per_second = 0
+
+    def draw(self, screen, clock, steps, alive, profiler=None, left=10, top=10):
+        now = time.perf_counter()
+        if self.surface is None or now - self.last_time >= self.refresh:
+            if self.last_time:
+                self.steps_per_second = (steps - self.last_steps) / (now - self.last_time)
+            self.last_time = now
+            self.last_steps = steps
+            self.surface = self.render(clock, alive, profiler)
+        screen.blit(self.surface, (left, top))
+
+    def render(self, clock, alive, profiler):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        lines = [
+            "FPS %.1f" % clock.get_fps(),
+            "steps/s %.0f" % self.steps_per_second,
+            "alive %d" % alive
+        ]
+        if profiler is not None:
+            for name, row in profiler.summary().items():
+                lines.append("%s %.2f / %.2f ms" % (name, row['percentiles'][50] * 1000, row['percentiles'][90] * 1000))
+
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(text.get_width() for text in rendered) + 8
+        height = sum(text.get_height() for text in rendered) + 8
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        y = 4
+        for text in rendered:
+            surface.blit(text, (4, y))
+            y += text.get_height()
+        return surface
+
 def polysIntersect(poly1, poly2):
     for i in range(len(poly1)):
         for j in range(len(poly2)):
@@ -339,3 +925,14 @@ def polysIntersect(poly1, poly2):
             if touch:
                 return True
     return False
+
+def main():
+    seed = 1
+    cache = FitnessCache()
+    scenario = scenarioKey(seed)
+    best = runGenetic(lambda brains: cache.evaluate(brains, scenario, lambda misses: evaluatePopulation(misses, seed)), 20, 50)
+    with open('bestBrain.bin', 'wb') as f:
+        f.write(NeuralNetwork.toBytes(best))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import time
+from array import array
+from contextlib import contextmanager
+
+from optimisation import Car, Road, World, generateTraffic, ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y
+from traffic import LaneIndex
+
+# Per-phase timings: the last `capacity` samples of each phase live in a ring buffer
+class PhaseTimings:
+    def __init__(self, capacity):
+        self.starts = array('d', [0.0] * capacity)
+        self.durations = array('d', [0.0] * capacity)
+        self.index = 0
+        self.calls = 0
+        self.total = 0.0
+
+    def add(self, start, duration):
+        self.starts[self.index] = start
+        self.durations[self.index] = duration
+        self.index = (self.index + 1) % len(self.durations)
+        self.calls += 1
+        self.total += duration
+
+    def samples(self):
+        count = min(self.calls, len(self.durations))
+        if count < len(self.durations):
+            return list(self.durations[:count])
+        return list(self.durations[self.index:]) + list(self.durations[:self.index])
+
+class Profiler:
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.phases = {}
+        self.clock = time.perf_counter
+        self.origin = self.clock()
+
+    def record(self, name, start):
+        duration = self.clock() - start
+        timings = self.phases.get(name)
+        if timings is None:
+            timings = self.phases[name] = PhaseTimings(self.capacity)
+        timings.add(start, duration)
+
+    @contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def percentiles(self, name, points=(50, 90, 99)):
+        samples = sorted(self.phases[name].samples())
+        if not samples:
+            return [0.0 for _ in points]
+        return [samples[min(len(samples) - 1, int(len(samples) * point / 100))] for point in points]
+
+    def summary(self, points=(50, 90, 99)):
+        rows = {}
+        for name, timings in list(self.phases.items()):
+            rows[name] = {
+                'calls': timings.calls,
+                'mean': timings.total / timings.calls,
+                'percentiles': dict(zip(points, self.percentiles(name, points)))
+            }
+        return rows
+
+    def reset(self):
+        self.phases = {}
+        self.origin = self.clock()
+
+    def dumpChromeTrace(self, path):
+        events = []
+        for name, timings in list(self.phases.items()):
+            count = min(timings.calls, self.capacity)
+            for k in range(count):
+                i = (timings.index - count + k) % self.capacity
+                events.append({
+                    'name': name,
+                    'ph': 'X',
+                    'ts': (timings.starts[i] - self.origin) * 1e6,
+                    'dur': timings.durations[i] * 1e6,
+                    'pid': 0,
+                    'tid': 0
+                })
+        events.sort(key=lambda event: event['ts'])
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def dumpJson(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+def printSummary(profiler):
+    print("%-10s %8s %10s %10s %10s %10s" % ("phase", "calls", "mean ms", "p50 ms", "p90 ms", "p99 ms"))
+    for name, row in profiler.summary().items():
+        p = row['percentiles']
+        print("%-10s %8d %10.3f %10.3f %10.3f %10.3f" % (name, row['calls'], row['mean'] * 1000, p[50] * 1000, p[90] * 1000, p[99] * 1000))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trace', default=None)
+    parser.add_argument('--json', default=None)
+    args = parser.parse_args()
+
+    profiler = Profiler()
+    road = Road(ROAD_X, ROAD_WIDTH)
+    cars = [Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI") for _ in range(args.population)]
+    traffic = generateTraffic(road, args.seed)
+    world = World(road, traffic, cars, profiler, trafficIndex=LaneIndex(road, traffic))
+    world.run(args.steps)
+
+    printSummary(profiler)
+    if args.trace:
+        profiler.dumpChromeTrace(args.trace)
+    if args.json:
+        profiler.dumpJson(args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import math
+import time
+from array import array
+from operator import mul
+
+from optimisation import (Car, NeuralNetwork, Road, World, generateTraffic, evaluatePopulation,
+                          ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y, EVALUATION_STEPS)
+from traffic import LaneIndex
+
+INPUT_SCALE = 255
+CHUNK_LIMIT = 127 * 8
+
+# First level: sensor offsets quantized to 0..255, weights to int8, one integer dot product per output.
+# The float test `sum > bias` becomes `intSum > threshold` with the bias moved into the integer domain.
+class QuantizedInputLevel:
+    def __init__(self, level):
+        outputCount = len(level.biases)
+        weightScale = max([abs(w) for row in level.weights for w in row] + [1e-12]) / 127
+        self.rows = [array('b', [round(row[i] / weightScale) for row in level.weights]) for i in range(outputCount)]
+        self.thresholds = [math.floor(bias * INPUT_SCALE / weightScale) for bias in level.biases]
+
+    def forward(self, inputs):
+        quantized = [int(value * INPUT_SCALE + 0.5) for value in inputs]
+        bits = 0
+        for i, row in enumerate(self.rows):
+            if sum(map(mul, quantized, row)) > self.thresholds[i]:
+                bits |= 1 << i
+        return bits
+
+# Later levels see bits. Each byte of input bits indexes a 256-entry table holding the int8 weight sums of
+# all outputs at once, packed side by side in one integer (each field offset to stay non-negative), so a
+# whole level costs one lookup and one add per input byte plus a shift and compare per output.
+class QuantizedBitLevel:
+    def __init__(self, level):
+        inputCount = len(level.weights)
+        outputCount = len(level.biases)
+        weightScale = max([abs(w) for row in level.weights for w in row] + [1e-12]) / 127
+        weights = [[round(w / weightScale) for w in row] for row in level.weights]
+        self.chunks = (inputCount + 7) // 8
+        self.fieldWidth = (2 * CHUNK_LIMIT * self.chunks).bit_length() + 1
+        self.mask = (1 << self.fieldWidth) - 1
+        self.outputCount = outputCount
+
+        self.tables = []
+        for chunk in range(self.chunks):
+            inputs = range(chunk * 8, min(chunk * 8 + 8, inputCount))
+            table = []
+            for byte in range(256):
+                packed = 0
+                for i in range(outputCount):
+                    total = sum(weights[j][i] for j in inputs if byte >> (j - chunk * 8) & 1)
+                    packed |= (total + CHUNK_LIMIT) << (self.fieldWidth * i)
+                table.append(packed)
+            self.tables.append(table)
+        offset = CHUNK_LIMIT * self.chunks
+        self.thresholds = [math.floor(bias / weightScale) + offset for bias in level.biases]
+
+    def forward(self, bits):
+        packed = 0
+        for table in self.tables:
+            packed += table[bits & 255]
+            bits >>= 8
+        out = 0
+        for i in range(self.outputCount):
+            if (packed >> (self.fieldWidth * i)) & self.mask > self.thresholds[i]:
+                out |= 1 << i
+        return out
+
+class QuantizedNetwork:
+    def __init__(self, network):
+        self.levels = [QuantizedInputLevel(network.levels[0])] + [QuantizedBitLevel(level) for level in network.levels[1:]]
+        self.outputCount = len(network.levels[-1].biases)
+
+    @staticmethod
+    def inputCount(network):
+        return len(network.levels[0].rows[0])
+
+    # Same call shape as NeuralNetwork.feedForward, so Car.think can drive either
+    @staticmethod
+    def feedForward(givenInputs, network):
+        bits = network.levels[0].forward(givenInputs)
+        for level in network.levels[1:]:
+            bits = level.forward(bits)
+        return [bits >> i & 1 for i in range(network.outputCount)]
+
+def evaluateQuantized(brains, seed, steps=EVALUATION_STEPS):
+    return evaluatePopulation([QuantizedNetwork(brain) for brain in brains], seed, steps)
+
+# Sensor inputs seen by the float brains while driving, for replaying through both forward passes
+def collectInputs(brains, seed, steps):
+    road = Road(ROAD_X, ROAD_WIDTH)
+    cars = []
+    for brain in brains:
+        car = Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI")
+        car.brain = brain
+        cars.append(car)
+    traffic = generateTraffic(road, seed)
+    world = World(road, traffic, cars, trafficIndex=LaneIndex(road, traffic))
+    samples = [[] for _ in brains]
+    while world.steps < steps and world.alive() > 0:
+        world.step()
+        for car, inputs in zip(cars, samples):
+            if not car.damaged:
+                inputs.append([0 if s is None else 1 - s['offset'] for s in car.sensor.readings])
+    return samples
+
+def validate(brains, seed, steps):
+    quantized = [QuantizedNetwork(brain) for brain in brains]
+    samples = collectInputs(brains, seed, steps)
+    decisions = differing = 0
+    bitDifferences = [0] * len(brains[0].levels[-1].biases)
+    floatTime = quantizedTime = 0.0
+    for brain, network, inputs in zip(brains, quantized, samples):
+        start = time.perf_counter()
+        expected = [list(NeuralNetwork.feedForward(values, brain)) for values in inputs]
+        floatTime += time.perf_counter() - start
+        start = time.perf_counter()
+        actual = [QuantizedNetwork.feedForward(values, network) for values in inputs]
+        quantizedTime += time.perf_counter() - start
+        for a, b in zip(expected, actual):
+            decisions += 1
+            if a != b:
+                differing += 1
+                for i in range(len(a)):
+                    bitDifferences[i] += a[i] != b[i]
+    return decisions, differing, bitDifferences, floatTime, quantizedTime
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--brain', default=None)
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--mutation', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--steps', type=int, default=EVALUATION_STEPS)
+    parser.add_argument('--fitness', action='store_true')
+    args = parser.parse_args()
+
+    brains = []
+    for i in range(args.population):
+        if args.brain:
+            with open(args.brain, 'rb') as f:
+                brain = NeuralNetwork.fromBytes(f.read())
+            if i > 0:
+                NeuralNetwork.mutate(brain, args.mutation)
+        else:
+            brain = NeuralNetwork([5, 6, 4])
+        brains.append(brain)
+
+    decisions, differing, bitDifferences, floatTime, quantizedTime = validate(brains, args.seed, args.steps)
+    print("%d decisions, %d differ (%.3f%%)" % (decisions, differing, 100.0 * differing / max(decisions, 1)))
+    for name, count in zip(['forward', 'left', 'right', 'reverse'], bitDifferences):
+        print("  %-8s %d" % (name, count))
+    print("float %.3f s, quantized %.3f s (%.2fx)" % (floatTime, quantizedTime, floatTime / max(quantizedTime, 1e-9)))
+
+    if args.fitness:
+        expected = evaluatePopulation(brains, args.seed, args.steps)
+        actual = evaluateQuantized(brains, args.seed, args.steps)
+        changed = sum(1 for a, b in zip(expected, actual) if a != b)
+        print("%d of %d fitnesses changed, best %.1f vs %.1f" % (changed, len(brains), max(expected), max(actual)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import argparse
+import bisect
+import json
+import queue
+import struct
+import sys
+import threading
+import zlib
+from array import array
+
+from optimisation import (Car, NeuralNetwork, Road, World, generateTraffic,
+                          ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y, EVALUATION_STEPS)
+from traffic import LaneIndex
+
+MAGIC = b'SDCREC2\n'
+# Version 1 recordings have a fixed traffic count and no trafficCount column
+MAGIC_V1 = b'SDCREC1\n'
+FOOTER_MAGIC = b'SDCIDX1\n'
+NAN = float('nan')
+
+# Column name, array typecode, width group
+COLUMNS = [
+    ('carX', 'f', 'cars'),
+    ('carY', 'f', 'cars'),
+    ('carAngle', 'f', 'cars'),
+    ('carSpeed', 'f', 'cars'),
+    ('controls', 'B', 'cars'),
+    ('damaged', 'B', 'cars'),
+    ('readings', 'f', 'rays'),
+    ('trafficX', 'f', 'traffic'),
+    ('trafficY', 'f', 'traffic'),
+    ('trafficAngle', 'f', 'traffic'),
+    ('trafficDamaged', 'B', 'traffic'),
+    ('trafficCount', 'I', 'frame'),
+]
+
+def columnWidths(metadata):
+    return {
+        'cars': metadata['carCount'],
+        'rays': metadata['carCount'] * metadata['rayCount'],
+        'traffic': metadata['trafficCount'],
+        'frame': 1,
+    }
+
+def toLittleEndian(values):
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def fromLittleEndian(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+# Recorder: buffers one chunk of frames column by column, compression and IO happen on a writer thread
+class Recorder:
+    def __init__(self, path, world, chunkSize=256, level=6):
+        self.cars = list(world.cars)
+        # Traffic is read from the world every frame, since spawners add and remove cars
+        self.world = world
+        sensors = [car.sensor for car in self.cars if hasattr(car, 'sensor')]
+        self.rayCount = sensors[0].rayCount if sensors else 0
+        self.metadata = {
+            'carCount': len(self.cars),
+            'trafficCount': len(world.traffic),
+            'rayCount': self.rayCount,
+            'sensor': sensors[0].config.toDict() if sensors else None,
+            'chunkSize': chunkSize,
+            'carWidth': self.cars[0].width if self.cars else CAR_WIDTH,
+            'carHeight': self.cars[0].height if self.cars else CAR_HEIGHT,
+            'road': {'x': world.road.x, 'width': world.road.width, 'laneCount': world.road.laneCount},
+        }
+        self.chunkSize = chunkSize
+        self.level = level
+        self.frameCount = 0
+        self.newChunk()
+
+        self.file = open(path, 'wb')
+        header = json.dumps(self.metadata).encode()
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self.index = []
+        # Set by the writer thread if compression or IO fails; raised again by record() and close()
+        self.error = None
+        self.queue = queue.Queue(maxsize=8)
+        self.writer = threading.Thread(target=self.writeChunks, daemon=True)
+        self.writer.start()
+
+    def newChunk(self):
+        self.columns = {name: array(typecode) for name, typecode, _ in COLUMNS}
+        self.chunkFrames = 0
+
+    def record(self):
+        if self.error is not None:
+            raise self.error
+        columns = self.columns
+        for car in self.cars:
+            columns['carX'].append(car.x)
+            columns['carY'].append(car.y)
+            columns['carAngle'].append(car.angle)
+            columns['carSpeed'].append(car.speed)
+            controls = car.controls
+            columns['controls'].append(bool(controls.forward) | bool(controls.left) << 1 | bool(controls.right) << 2 | bool(controls.reverse) << 3)
+            columns['damaged'].append(car.damaged)
+            if self.rayCount:
+                readings = car.sensor.readings if hasattr(car, 'sensor') else []
+                if len(readings) == self.rayCount:
+                    columns['readings'].extend([NAN if reading is None else reading['offset'] for reading in readings])
+                else:
+                    columns['readings'].extend([NAN] * self.rayCount)
+        traffic = self.world.traffic
+        for car in traffic:
+            columns['trafficX'].append(car.x)
+            columns['trafficY'].append(car.y)
+            columns['trafficAngle'].append(car.angle)
+            columns['trafficDamaged'].append(car.damaged)
+        columns['trafficCount'].append(len(traffic))
+
+        self.chunkFrames += 1
+        self.frameCount += 1
+        if self.chunkFrames == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if self.chunkFrames:
+            self.queue.put((self.chunkFrames, self.columns))
+            self.newChunk()
+
+    def writeChunks(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            # After a failure the queue is still drained, so record() never blocks on a full queue
+            if self.error is not None:
+                continue
+            frameCount, columns = item
+            try:
+                blobs = [zlib.compress(toLittleEndian(columns[name]), self.level) for name, _, _ in COLUMNS]
+                payload = struct.pack('<%dI' % len(blobs), *[len(blob) for blob in blobs]) + b''.join(blobs)
+                offset = self.file.tell()
+                self.file.write(struct.pack('<II', len(payload), frameCount) + payload)
+                self.index.append((offset, frameCount))
+            except Exception as error:
+                self.error = error
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        if self.error is not None:
+            self.file.close()
+            raise self.error
+        indexOffset = self.file.tell()
+        for offset, frameCount in self.index:
+            self.file.write(struct.pack('<QI', offset, frameCount))
+        self.file.write(struct.pack('<QI', indexOffset, len(self.index)) + FOOTER_MAGIC)
+        self.file.close()
+
+# Streaming reader: loads the chunk index only, decompresses single columns of single chunks on demand
+class RecordingReader:
+    def __init__(self, path, cacheSize=4):
+        self.file = open(path, 'rb')
+        magic = self.file.read(len(MAGIC))
+        if magic == MAGIC:
+            self.columns = COLUMNS
+        elif magic == MAGIC_V1:
+            self.columns = [column for column in COLUMNS if column[0] != 'trafficCount']
+        else:
+            raise ValueError("Not a trajectory recording: %s" % path)
+        self.variableTraffic = magic == MAGIC
+        headerLength = struct.unpack('<I', self.file.read(4))[0]
+        self.metadata = json.loads(self.file.read(headerLength))
+        self.dataStart = self.file.tell()
+        self.widths = columnWidths(self.metadata)
+        self.cacheSize = cacheSize
+        self.cache = {}
+
+        self.chunks = self.readIndex()
+        self.starts = []
+        self.frameCount = 0
+        for _, frameCount in self.chunks:
+            self.starts.append(self.frameCount)
+            self.frameCount += frameCount
+
+    def readIndex(self):
+        footerSize = struct.calcsize('<QI') + len(FOOTER_MAGIC)
+        self.file.seek(0, 2)
+        end = self.file.tell()
+        if end - self.dataStart >= footerSize:
+            self.file.seek(end - footerSize)
+            footer = self.file.read(footerSize)
+            if footer.endswith(FOOTER_MAGIC):
+                indexOffset, chunkCount = struct.unpack_from('<QI', footer)
+                self.file.seek(indexOffset)
+                data = self.file.read(chunkCount * struct.calcsize('<QI'))
+                return [struct.unpack_from('<QI', data, i * 12) for i in range(chunkCount)]
+        # No footer (run still being written or interrupted): walk the chunk headers
+        chunks = []
+        offset = self.dataStart
+        while offset + 8 <= end:
+            self.file.seek(offset)
+            payloadLength, frameCount = struct.unpack('<II', self.file.read(8))
+            if offset + 8 + payloadLength > end:
+                break
+            chunks.append((offset, frameCount))
+            offset += 8 + payloadLength
+        return chunks
+
+    def chunkFor(self, frame):
+        if not 0 <= frame < self.frameCount:
+            raise IndexError(frame)
+        return bisect.bisect_right(self.starts, frame) - 1
+
+    def column(self, chunk, name):
+        key = (chunk, name)
+        if key in self.cache:
+            return self.cache[key]
+        offset, _ = self.chunks[chunk]
+        # Skip the chunk header (payload length, frame count)
+        self.file.seek(offset + 8)
+        lengths = struct.unpack('<%dI' % len(self.columns), self.file.read(4 * len(self.columns)))
+        i = [column[0] for column in self.columns].index(name)
+        self.file.seek(sum(lengths[:i]), 1)
+        values = fromLittleEndian(self.columns[i][1], zlib.decompress(self.file.read(lengths[i])))
+        if len(self.cache) >= self.cacheSize * (len(self.columns) + 1):
+            self.cache.pop(next(iter(self.cache)))
+        self.cache[key] = values
+        return values
+
+    # Where each frame's traffic values start within a chunk's traffic columns, plus the end
+    def trafficStarts(self, chunk):
+        key = (chunk, None)
+        if key not in self.cache:
+            starts = array('I', [0])
+            for count in self.column(chunk, 'trafficCount'):
+                starts.append(starts[-1] + count)
+            self.cache[key] = starts
+        return self.cache[key]
+
+    def frame(self, index, names=None):
+        chunk = self.chunkFor(index)
+        row = index - self.starts[chunk]
+        frame = {}
+        for name, _, group in self.columns:
+            if names is not None and name not in names:
+                continue
+            if group == 'traffic' and self.variableTraffic:
+                starts = self.trafficStarts(chunk)
+                frame[name] = self.column(chunk, name)[starts[row]:starts[row + 1]]
+                continue
+            width = self.widths[group]
+            frame[name] = self.column(chunk, name)[row * width:(row + 1) * width]
+        return frame
+
+    def frames(self, start=0, stop=None, names=None):
+        stop = self.frameCount if stop is None else min(stop, self.frameCount)
+        for index in range(start, stop):
+            yield self.frame(index, names)
+
+    def close(self):
+        self.file.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['record', 'info'])
+    parser.add_argument('path')
+    parser.add_argument('--brain', default=None)
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--steps', type=int, default=EVALUATION_STEPS)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.mode == 'info':
+        reader = RecordingReader(args.path)
+        print(json.dumps(reader.metadata, indent=2))
+        print("%d frames in %d chunks" % (reader.frameCount, len(reader.chunks)))
+        reader.close()
+        return
+
+    road = Road(ROAD_X, ROAD_WIDTH)
+    cars = []
+    for i in range(args.population):
+        car = Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI")
+        if args.brain:
+            with open(args.brain, 'rb') as f:
+                car.brain = NeuralNetwork.fromBytes(f.read())
+            if i > 0:
+                NeuralNetwork.mutate(car.brain, 0.1)
+        cars.append(car)
+    traffic = generateTraffic(road, args.seed)
+    world = World(road, traffic, cars, trafficIndex=LaneIndex(road, traffic))
+    recorder = Recorder(args.path, world)
+    while world.steps < args.steps and world.alive() > 0:
+        world.step()
+        recorder.record()
+    recorder.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import math
+import pygame
+
+from optimisation import Car, Road, Sensor, SensorConfig
+from recorder import RecordingReader
+
+SCREEN_HEIGHT = 700
+
+# Replay viewer: poses come from the log, drawing reuses Road.draw / Car.draw / Sensor.draw
+class ReplayViewer:
+    def __init__(self, reader, selected, drawSensors=True):
+        if not selected:
+            raise ValueError("no cars selected")
+        self.reader = reader
+        self.selected = selected
+        self.drawSensors = drawSensors and reader.metadata['rayCount'] > 0
+        metadata = reader.metadata
+        width, height = metadata['carWidth'], metadata['carHeight']
+        self.carSize = (width, height)
+        self.road = Road(metadata['road']['x'], metadata['road']['width'], metadata['road']['laneCount'])
+        if metadata.get('sensor'):
+            sensorConfig = SensorConfig.fromDict(metadata['sensor'])
+        else:
+            sensorConfig = SensorConfig(max(metadata['rayCount'], 1))
+        self.cars = [Car(0, 0, width, height, "REPLAY", sensorConfig=sensorConfig) for _ in selected]
+        self.traffic = [Car(0, 0, width, height, "DUMMY") for _ in range(metadata['trafficCount'])]
+        self.trafficShown = len(self.traffic)
+        self.rayCount = metadata['rayCount']
+
+        self.names = ['carX', 'carY', 'carAngle', 'damaged', 'trafficX', 'trafficY', 'trafficAngle', 'trafficDamaged']
+        if self.drawSensors:
+            self.names.append('readings')
+
+        self.position = 0.0
+        self.speed = 1.0
+        self.paused = False
+
+    @staticmethod
+    def setPose(car, x, y, angle, damaged):
+        car.x = x
+        car.y = y
+        car.angle = angle
+        car.damaged = bool(damaged)
+        car.polygon = car.createPolygon()
+
+    def load(self, index):
+        frame = self.reader.frame(index, self.names)
+        for car, i in zip(self.cars, self.selected):
+            ReplayViewer.setPose(car, frame['carX'][i], frame['carY'][i], frame['carAngle'][i], frame['damaged'][i])
+            if self.drawSensors:
+                car.sensor.castRays()
+                offsets = frame['readings'][i * self.rayCount:(i + 1) * self.rayCount]
+                car.sensor.readings = []
+                for ray, offset in zip(car.sensor.rays, offsets):
+                    if math.isnan(offset):
+                        car.sensor.readings.append(None)
+                    else:
+                        car.sensor.readings.append({
+                            'x': Sensor.lerp(ray[0]['x'], ray[1]['x'], offset),
+                            'y': Sensor.lerp(ray[0]['y'], ray[1]['y'], offset),
+                            'offset': offset
+                        })
+        # Spawned traffic changes the count from frame to frame
+        self.trafficShown = len(frame['trafficX'])
+        while len(self.traffic) < self.trafficShown:
+            self.traffic.append(Car(0, 0, *self.carSize, "DUMMY"))
+        for i in range(self.trafficShown):
+            ReplayViewer.setPose(self.traffic[i], frame['trafficX'][i], frame['trafficY'][i], frame['trafficAngle'][i], frame['trafficDamaged'][i])
+
+    def seek(self, frame):
+        self.position = float(min(max(frame, 0), self.reader.frameCount - 1))
+
+    def advance(self):
+        if not self.paused:
+            self.seek(self.position + self.speed)
+
+    def handleEvent(self, event):
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif event.key == pygame.K_UP:
+            self.speed *= 2
+        elif event.key == pygame.K_DOWN:
+            self.speed /= 2
+        elif event.key == pygame.K_RIGHT:
+            self.seek(self.position + 60 * max(self.speed, 1))
+        elif event.key == pygame.K_LEFT:
+            self.seek(self.position - 60 * max(self.speed, 1))
+        elif event.key == pygame.K_HOME:
+            self.seek(0)
+        elif event.key == pygame.K_END:
+            self.seek(self.reader.frameCount - 1)
+
+    def draw(self, screen):
+        self.load(int(self.position))
+        height = screen.get_height()
+        offsetY = -self.cars[0].y + height * 0.7
+
+        screen.fill((211, 211, 211))
+        self.road.draw(screen, offsetY)
+        for car in self.traffic[:self.trafficShown]:
+            if -car.height < car.y + offsetY < height + car.height:
+                car.draw(screen, (255, 0, 0), offsetY)
+        for car in self.cars[1:]:
+            car.draw(screen, (0, 0, 255), offsetY, self.drawSensors)
+        self.cars[0].draw(screen, (0, 0, 255), offsetY, self.drawSensors)
+
+def bestCars(reader, count):
+    last = reader.frame(reader.frameCount - 1, ['carY'])['carY']
+    return sorted(range(len(last)), key=lambda i: last[i])[:count]
+
+# Car indices from --cars ("3,7") or the `best` furthest cars; raises ValueError when nothing usable is left
+def selectCars(reader, cars=None, best=1):
+    if reader.frameCount == 0:
+        raise ValueError("the recording holds no frames")
+    carCount = reader.metadata['carCount']
+    if cars:
+        try:
+            selected = [int(i) for i in cars.split(',') if i.strip()]
+        except ValueError:
+            raise ValueError("--cars takes comma-separated car indices, got %r" % cars)
+        invalid = [i for i in selected if not 0 <= i < carCount]
+        if invalid:
+            raise ValueError("no car %s in a recording of %d cars" % (", ".join(map(str, invalid)), carCount))
+    else:
+        selected = bestCars(reader, best)
+    if not selected:
+        raise ValueError("no cars selected")
+    return selected
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--cars', default=None)
+    parser.add_argument('--best', type=int, default=1)
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--no-sensors', action='store_true')
+    args = parser.parse_args()
+
+    reader = RecordingReader(args.path)
+    try:
+        selected = selectCars(reader, args.cars, args.best)
+    except ValueError as error:
+        reader.close()
+        parser.error(str(error))
+    viewer = ReplayViewer(reader, selected, not args.no_sensors)
+    viewer.speed = args.speed
+    viewer.seek(args.start)
+
+    pygame.init()
+    screen = pygame.display.set_mode((int(viewer.road.x * 2), SCREEN_HEIGHT))
+    clock = pygame.time.Clock()
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            viewer.handleEvent(event)
+
+        viewer.draw(screen)
+        pygame.display.set_caption("Replay - frame %d / %d (x%g)" % (int(viewer.position), reader.frameCount, viewer.speed))
+        pygame.display.flip()
+        viewer.advance()
+        clock.tick(60)
+
+    reader.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import copy
+import hashlib
+import json
+import math
+import os
+
+from optimisation import (Car, NeuralNetwork, Road, World, FitnessCache, defaultCarClass, runGenetic, generateTraffic,
+                          ROAD_X, ROAD_WIDTH, LANE_COUNT, CAR_WIDTH, CAR_HEIGHT, START_Y, TRAFFIC_COUNT, EVALUATION_STEPS)
+from augment import AugmentConfig, useAugmentation
+from traffic import LaneIndex, TrafficModel
+
+CACHE_DIR = 'scenarioCache'
+# Part of every cache file name; bump it when the cached state changes shape
+CACHE_FORMAT = 2
+
+# Scenario: plain data describing one evaluation run. Traffic entries are [x, y, maxSpeed, angle, lane]
+class Scenario:
+    def __init__(self, name, road=(ROAD_X, ROAD_WIDTH, LANE_COUNT), traffic=(), start=None, steps=EVALUATION_STEPS, trafficModel=False):
+        self.name = name
+        self.road = list(road)
+        self.traffic = [list(entry) for entry in traffic]
+        self.start = list(start) if start else [Road(*road).getLaneCenter(1), START_Y, 0]
+        self.steps = steps
+        self.trafficModel = trafficModel
+
+    def toDict(self):
+        return {
+            'name': self.name,
+            'road': self.road,
+            'traffic': self.traffic,
+            'start': self.start,
+            'steps': self.steps,
+            'trafficModel': self.trafficModel
+        }
+
+    @staticmethod
+    def fromDict(data):
+        return Scenario(data['name'], data['road'], data['traffic'], data['start'], data['steps'], data.get('trafficModel', False))
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            return Scenario.fromDict(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.toDict(), f, indent=2)
+
+    # The name is left out, so identical fixtures share one compiled scenario and one set of cached fitnesses
+    def key(self):
+        data = self.toDict()
+        del data['name']
+        return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    # The traffic generateTraffic(road, seed, ...) builds, as fixture entries
+    @staticmethod
+    def fromSeed(seed, count=TRAFFIC_COUNT, spacing=200, speedRange=None, steps=EVALUATION_STEPS, trafficModel=False):
+        road = Road(ROAD_X, ROAD_WIDTH)
+        traffic = [[car.x, car.y, car.maxSpeed, car.angle, car.lane] for car in generateTraffic(road, seed, count, spacing, speedRange)]
+        return Scenario("seed-%d" % seed, traffic=traffic, steps=steps, trafficModel=trafficModel)
+
+# Everything a world needs that does not change between evaluations, built once per scenario.
+# `lanes`, the lane order of the traffic as positions in scenario.traffic, skips sorting when known.
+class CompiledScenario:
+    def __init__(self, scenario, lanes=None):
+        self.scenario = scenario
+        self.key = scenario.key()
+        self.road = Road(*scenario.road)
+
+        self.traffic = []
+        for x, y, maxSpeed, angle, lane in scenario.traffic:
+            car = Car(x, y, CAR_WIDTH, CAR_HEIGHT, "DUMMY", maxSpeed)
+            car.angle = angle
+            car.lane = lane
+            car.polygon = car.createPolygon()
+            self.traffic.append(car)
+        if lanes is None:
+            self.index = LaneIndex(self.road, self.traffic)
+        else:
+            self.index = LaneIndex.fromOrder(self.road, self.traffic, lanes)
+
+    # Plain data only, so a cache file never depends on how the classes are laid out
+    def state(self):
+        positions = {id(car): i for i, car in enumerate(self.traffic)}
+        return {
+            'format': CACHE_FORMAT,
+            'scenario': self.scenario.toDict(),
+            'lanes': [[positions[id(car)] for car in cars] for cars in self.index.lanes]
+        }
+
+    # Fresh traffic copies the prebuilt cars and reuses the sorted lane order instead of sorting again
+    def instantiate(self, brains, profiler=None):
+        traffic = []
+        for car in self.traffic:
+            clone = copy.copy(car)
+            clone.controls = copy.copy(car.controls)
+            clone.polygon = [dict(point) for point in car.polygon]
+            traffic.append(clone)
+        x, y, angle = self.scenario.start
+        carClass = defaultCarClass()
+        cars = []
+        for brain in brains:
+            car = carClass(x, y, CAR_WIDTH, CAR_HEIGHT, "AI")
+            car.brain = brain
+            if angle:
+                car.angle = angle
+                car.polygon = car.createPolygon()
+            cars.append(car)
+        model = TrafficModel(self.road) if self.scenario.trafficModel else None
+        return World(self.road, traffic, cars, profiler, model, self.index.copyFor(self.traffic, traffic))
+
+# Compiled scenarios are kept in memory and saved to disk as JSON by scenario hash and cache format, so files
+# written by other versions of the code are never read
+class ScenarioCache:
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.entries = {}
+
+    def compile(self, scenario):
+        key = scenario.key()
+        compiled = self.entries.get(key)
+        if compiled is not None:
+            return compiled
+        path = os.path.join(self.directory, "%s.v%d.json" % (key, CACHE_FORMAT)) if self.directory else None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            compiled = CompiledScenario(Scenario.fromDict(state['scenario']), state['lanes'])
+        else:
+            compiled = CompiledScenario(scenario)
+            if path:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(path + '.tmp', 'w') as f:
+                    json.dump(compiled.state(), f)
+                os.replace(path + '.tmp', path)
+        self.entries[key] = compiled
+        return compiled
+
+# `stats`, when given, accumulates the simulated car-steps under 'steps'; `augment` is an AugmentConfig
+# the brains are scored under
+def evaluateScenario(brains, compiled, stats=None, augment=None):
+    world = compiled.instantiate(brains)
+    if augment is not None:
+        useAugmentation(world, augment, perBrain=True)
+    world.run(compiled.scenario.steps)
+    if stats is not None:
+        stats['steps'] = stats.get('steps', 0) + world.steps * len(brains)
+    return [compiled.scenario.start[1] - car.y for car in world.cars]
+
+# The three situations of the report: dense traffic, an obstacle standing in the start lane, and cross traffic at an intersection
+def curriculum(seed=1):
+    road = Road(ROAD_X, ROAD_WIDTH)
+    dense = Scenario.fromSeed(seed, count=20, spacing=120)
+    dense.name = "dense-traffic"
+
+    obstacle = Scenario.fromSeed(seed, count=4, steps=500)
+    obstacle.name = "sudden-obstacle"
+    for entry in obstacle.traffic:
+        entry[1] -= 600
+    obstacle.traffic.append([road.getLaneCenter(1), START_Y - 450, 0, 0, 1])
+
+    crossing = START_Y - 700
+    traffic = []
+    for k in range(8):
+        traffic.append([road.left - 100 - k * 160, crossing + 30, 2, -math.pi / 2, 0])
+        traffic.append([road.right + 180 + k * 160, crossing - 30, 2, math.pi / 2, road.laneCount - 1])
+    intersection = Scenario("intersection", traffic=traffic, steps=600)
+    return [dense, obstacle, intersection]
+
+AGGREGATES = {
+    'mean': lambda values: sum(values) / len(values),
+    'min': min
+}
+
+# Each scenario is evaluated in turn over the same brains; nothing is shared between them. Distances are divided
+# by each scenario's step budget before they are combined, so a long scenario does not outweigh a short one.
+def evaluateBatch(brains, compiledScenarios, aggregate='mean', stats=None, augment=None):
+    fitnesses = []
+    for compiled in compiledScenarios:
+        steps = compiled.scenario.steps
+        fitnesses.append([distance / steps for distance in evaluateScenario(brains, compiled, stats, augment)])
+    combine = AGGREGATES[aggregate]
+    return [combine([row[i] for row in fitnesses]) for i in range(len(brains))]
+
+def batchKey(compiledScenarios, aggregate='mean'):
+    return "batch:%s:%s" % (aggregate, ",".join(compiled.key for compiled in compiledScenarios))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scenario', nargs='*')
+    parser.add_argument('--curriculum', action='store_true')
+    parser.add_argument('--aggregate', choices=sorted(AGGREGATES), default='mean')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--export', default=None)
+    parser.add_argument('--save', default='bestBrain.bin')
+    AugmentConfig.addArguments(parser)
+    args = parser.parse_args()
+    augment = AugmentConfig.fromArgs(args)
+
+    if args.curriculum:
+        scenarios = curriculum(args.seed)
+    else:
+        scenarios = [Scenario.load(path) for path in args.scenario] or [Scenario.fromSeed(args.seed)]
+    if args.export:
+        os.makedirs(args.export, exist_ok=True)
+        for scenario in scenarios:
+            scenario.save(os.path.join(args.export, scenario.name + '.json'))
+        return
+
+    scenarioCache = ScenarioCache()
+    compiled = [scenarioCache.compile(scenario) for scenario in scenarios]
+    cache = FitnessCache()
+    if len(compiled) == 1:
+        key = compiled[0].key
+        evaluate = lambda misses: evaluateScenario(misses, compiled[0], augment=augment)
+    else:
+        key = batchKey(compiled, args.aggregate)
+        evaluate = lambda misses: evaluateBatch(misses, compiled, args.aggregate, augment=augment)
+    if augment.enabled():
+        key += "|" + augment.key()
+    best = runGenetic(lambda brains: cache.evaluate(brains, key, evaluate), args.generations, args.population)
+    with open(args.save, 'wb') as f:
+        f.write(NeuralNetwork.toBytes(best))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import math
+import random
+
+from augment import AugmentConfig
+from optimisation import NeuralNetwork, nextGeneration
+from scenario import Scenario, ScenarioCache, curriculum, evaluateScenario, evaluateBatch
+
+NEURON_COUNTS = (5, 6, 4)
+
+# Centered ranks in [-0.5, 0.5]: only the order of fitnesses matters, so one lucky outlier cannot dominate a step.
+# Ties share their mean rank, so a flat fitness landscape gives no spurious direction.
+def centeredRanks(fitnesses):
+    order = sorted(range(len(fitnesses)), key=lambda i: fitnesses[i])
+    ranks = [0.0] * len(fitnesses)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and fitnesses[order[end + 1]] == fitnesses[order[start]]:
+            end += 1
+        for k in range(start, end + 1):
+            ranks[order[k]] = (start + end) / 2 / max(len(fitnesses) - 1, 1) - 0.5
+        start = end + 1
+    return ranks
+
+# OpenAI-ES: Gaussian perturbations of the flat parameter vector in antithetic pairs (+eps, -eps),
+# rank-shaped fitness, and an Adam step along the estimated gradient
+class OpenAIES:
+    def __init__(self, neuronCounts, mean, sigma=0.5, learningRate=0.03, populationSize=50, seed=None,
+                 beta1=0.9, beta2=0.999):
+        self.neuronCounts = list(neuronCounts)
+        self.mean = list(mean)
+        self.sigma = sigma
+        self.learningRate = learningRate
+        self.pairs = max(1, populationSize // 2)
+        self.rng = random.Random(seed)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.moment = [0.0] * len(self.mean)
+        self.velocity = [0.0] * len(self.mean)
+        self.updates = 0
+        self.noise = []
+
+    def ask(self):
+        self.noise = [[self.rng.gauss(0, 1) for _ in self.mean] for _ in range(self.pairs)]
+        brains = []
+        for eps in self.noise:
+            for sign in (1, -1):
+                params = [m + sign * self.sigma * e for m, e in zip(self.mean, eps)]
+                brains.append(NeuralNetwork.unflatten(self.neuronCounts, params))
+        return brains
+
+    def tell(self, fitnesses):
+        shaped = centeredRanks(fitnesses)
+        scale = 1 / (2 * self.pairs * self.sigma)
+        gradient = [0.0] * len(self.mean)
+        for k, eps in enumerate(self.noise):
+            weight = (shaped[2 * k] - shaped[2 * k + 1]) * scale
+            for j, e in enumerate(eps):
+                gradient[j] += weight * e
+
+        self.updates += 1
+        correction = math.sqrt(1 - self.beta2 ** self.updates) / (1 - self.beta1 ** self.updates)
+        for j, g in enumerate(gradient):
+            self.moment[j] = self.beta1 * self.moment[j] + (1 - self.beta1) * g
+            self.velocity[j] = self.beta2 * self.velocity[j] + (1 - self.beta2) * g * g
+            self.mean[j] += self.learningRate * correction * self.moment[j] / (math.sqrt(self.velocity[j]) + 1e-8)
+
+# sep-CMA-ES: CMA-ES restricted to a diagonal covariance, linear in the parameter count per generation
+class SepCMAES:
+    def __init__(self, neuronCounts, mean, sigma=0.3, populationSize=None, seed=None):
+        self.neuronCounts = list(neuronCounts)
+        self.mean = list(mean)
+        self.sigma = sigma
+        n = len(self.mean)
+        self.populationSize = populationSize or 4 + int(3 * math.log(n))
+        self.rng = random.Random(seed)
+
+        mu = self.populationSize // 2
+        weights = [math.log(mu + 0.5) - math.log(i + 1) for i in range(mu)]
+        total = sum(weights)
+        self.weights = [w / total for w in weights]
+        self.muEff = 1 / sum(w * w for w in self.weights)
+
+        self.cSigma = (self.muEff + 2) / (n + self.muEff + 5)
+        self.dSigma = 1 + 2 * max(0, math.sqrt((self.muEff - 1) / (n + 1)) - 1) + self.cSigma
+        self.cC = (4 + self.muEff / n) / (n + 4 + 2 * self.muEff / n)
+        c1 = 2 / ((n + 1.3) ** 2 + self.muEff)
+        cMu = min(1 - c1, 2 * (self.muEff - 2 + 1 / self.muEff) / ((n + 2) ** 2 + self.muEff))
+        self.c1 = min(1, c1 * (n + 2) / 3)
+        self.cMu = min(1 - self.c1, cMu * (n + 2) / 3)
+        self.chiN = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n * n))
+
+        self.variances = [1.0] * n
+        self.pathSigma = [0.0] * n
+        self.pathC = [0.0] * n
+        self.generation = 0
+        self.samples = []
+
+    def ask(self):
+        self.samples = []
+        brains = []
+        for _ in range(self.populationSize):
+            z = [self.rng.gauss(0, 1) for _ in self.mean]
+            y = [math.sqrt(v) * zi for v, zi in zip(self.variances, z)]
+            self.samples.append((z, y))
+            brains.append(NeuralNetwork.unflatten(self.neuronCounts, [m + self.sigma * yi for m, yi in zip(self.mean, y)]))
+        return brains
+
+    def tell(self, fitnesses):
+        n = len(self.mean)
+        ranked = sorted(range(len(fitnesses)), key=lambda i: fitnesses[i], reverse=True)[:len(self.weights)]
+        yMean = [sum(w * self.samples[i][1][j] for w, i in zip(self.weights, ranked)) for j in range(n)]
+        zMean = [sum(w * self.samples[i][0][j] for w, i in zip(self.weights, ranked)) for j in range(n)]
+        self.mean = [m + self.sigma * y for m, y in zip(self.mean, yMean)]
+
+        self.generation += 1
+        sigmaFactor = math.sqrt(self.cSigma * (2 - self.cSigma) * self.muEff)
+        self.pathSigma = [(1 - self.cSigma) * p + sigmaFactor * z for p, z in zip(self.pathSigma, zMean)]
+        pathNorm = math.sqrt(sum(p * p for p in self.pathSigma))
+        hSigma = pathNorm / math.sqrt(1 - (1 - self.cSigma) ** (2 * self.generation)) < (1.4 + 2 / (n + 1)) * self.chiN
+        cFactor = math.sqrt(self.cC * (2 - self.cC) * self.muEff) if hSigma else 0
+        self.pathC = [(1 - self.cC) * p + cFactor * y for p, y in zip(self.pathC, yMean)]
+
+        correction = 0 if hSigma else self.cC * (2 - self.cC)
+        for j in range(n):
+            rankMu = sum(w * self.samples[i][1][j] ** 2 for w, i in zip(self.weights, ranked))
+            self.variances[j] = ((1 - self.c1 - self.cMu) * self.variances[j] +
+                                 self.c1 * (self.pathC[j] ** 2 + correction * self.variances[j]) +
+                                 self.cMu * rankMu)
+        self.sigma *= math.exp(self.cSigma / self.dSigma * (pathNorm / self.chiN - 1))
+
+# The existing copy-the-best-and-mutate loop behind the same ask/tell interface, as a baseline
+class MutateBest:
+    def __init__(self, neuronCounts, mean, mutationAmount=0.1, populationSize=50):
+        self.brains = [NeuralNetwork.unflatten(list(neuronCounts), mean)]
+        for _ in range(populationSize - 1):
+            brain = NeuralNetwork.copy(self.brains[0])
+            NeuralNetwork.mutate(brain, mutationAmount)
+            self.brains.append(brain)
+        self.mutationAmount = mutationAmount
+
+    def ask(self):
+        return self.brains
+
+    def tell(self, fitnesses):
+        self.brains = nextGeneration(self.brains, fitnesses, self.mutationAmount)
+
+# Stops early once `target` fitness is reached, so methods can be compared by the car-steps they needed
+def runStrategy(strategy, evaluate, generations, stats=None, target=None, log=print):
+    best, bestFitness = None, None
+    for generation in range(generations):
+        brains = strategy.ask()
+        fitnesses = evaluate(brains)
+        strategy.tell(fitnesses)
+        i = max(range(len(brains)), key=lambda k: fitnesses[k])
+        if bestFitness is None or fitnesses[i] > bestFitness:
+            best, bestFitness = NeuralNetwork.copy(brains[i]), fitnesses[i]
+        log("Generation %d: best %.1f, overall %.1f, %d car-steps" %
+            (generation, fitnesses[i], bestFitness, stats.get('steps', 0) if stats is not None else 0))
+        if target is not None and bestFitness >= target:
+            break
+    return best
+
+STRATEGIES = {
+    'openai-es': lambda counts, mean, args: OpenAIES(counts, mean, args.sigma or 0.5, args.learning_rate, args.population, args.seed),
+    'sep-cma': lambda counts, mean, args: SepCMAES(counts, mean, args.sigma or 0.3, args.population, args.seed),
+    'mutate-best': lambda counts, mean, args: MutateBest(counts, mean, args.mutation, args.population),
+}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--method', choices=sorted(STRATEGIES), default='openai-es')
+    parser.add_argument('--brain', default=None)
+    parser.add_argument('--generations', type=int, default=30)
+    parser.add_argument('--population', type=int, default=50)
+    parser.add_argument('--sigma', type=float, default=None)
+    parser.add_argument('--learning-rate', type=float, default=0.03)
+    parser.add_argument('--mutation', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--curriculum', action='store_true')
+    parser.add_argument('--target', type=float, default=None)
+    parser.add_argument('--save', default='bestBrain.bin')
+    AugmentConfig.addArguments(parser)
+    args = parser.parse_args()
+    augment = AugmentConfig.fromArgs(args)
+
+    random.seed(args.seed)
+    if args.brain:
+        with open(args.brain, 'rb') as f:
+            start = NeuralNetwork.fromBytes(f.read())
+    else:
+        start = NeuralNetwork(list(NEURON_COUNTS))
+    counts = NeuralNetwork.neuronCounts(start)
+    strategy = STRATEGIES[args.method](counts, NeuralNetwork.flatten(start), args)
+
+    cache = ScenarioCache()
+    stats = {}
+    if args.curriculum:
+        compiled = [cache.compile(scenario) for scenario in curriculum(args.seed)]
+        evaluate = lambda brains: evaluateBatch(brains, compiled, stats=stats, augment=augment)
+    else:
+        compiled = cache.compile(Scenario.fromSeed(args.seed))
+        evaluate = lambda brains: evaluateScenario(brains, compiled, stats, augment)
+
+    best = runStrategy(strategy, evaluate, args.generations, stats, args.target)
+    with open(args.save, 'wb') as f:
+        f.write(NeuralNetwork.toBytes(best))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import copy
+import random
+
+from backprop import DifferentiableNetwork, agreement, train
+from optimisation import NeuralNetwork
+
+def lossOf(network, inputs, targets):
+    return copy.deepcopy(network).trainBatch(inputs, targets, 0)
+
+# With no momentum one step moves every parameter by -learningRate times its gradient; compare with finite differences
+def test_gradients_match_finite_differences():
+    rng = random.Random(1)
+    network = DifferentiableNetwork([3, 4, 2], seed=1)
+    network.sharpness = 2.0
+    for level in network.levels:
+        level.biases = [rng.uniform(-0.5, 0.5) for _ in level.biases]
+    inputs = [[rng.random() for _ in range(3)] for _ in range(8)]
+    targets = [[rng.randrange(2) for _ in range(2)] for _ in range(8)]
+    stepped = copy.deepcopy(network)
+    learningRate = 1e-3
+    stepped.trainBatch(inputs, targets, learningRate, momentum=0)
+    epsilon = 1e-6
+    for k, level in enumerate(network.levels):
+        for i in range(len(level.weights)):
+            for j in range(len(level.biases)):
+                probe = copy.deepcopy(network)
+                probe.levels[k].weights[i][j] += epsilon
+                numeric = (lossOf(probe, inputs, targets) - lossOf(network, inputs, targets)) / epsilon
+                analytic = (level.weights[i][j] - stepped.levels[k].weights[i][j]) / learningRate
+                assert abs(numeric - analytic) < 1e-3
+        for j in range(len(level.biases)):
+            probe = copy.deepcopy(network)
+            probe.levels[k].biases[j] += epsilon
+            numeric = (lossOf(probe, inputs, targets) - lossOf(network, inputs, targets)) / epsilon
+            analytic = (level.biases[j] - stepped.levels[k].biases[j]) / learningRate
+            assert abs(numeric - analytic) < 1e-3
+
+# Controls produced by a step network can be learned back and exported as a step network that reproduces them
+def test_exported_network_imitates_a_teacher():
+    random.seed(2)
+    teacher = NeuralNetwork([5, 4])
+    rng = random.Random(3)
+    inputs = [[rng.random() for _ in range(5)] for _ in range(600)]
+    targets = [list(NeuralNetwork.feedForward(x, teacher)) for x in inputs]
+    student = train(inputs, targets, hidden=(), epochs=30, seed=1, log=lambda line: None)
+    assert agreement(student, inputs, targets) > 0.9
+    for level in student.levels:
+        assert all(abs(bias) <= 1 for bias in level.biases)
+        assert all(abs(weight) <= 1 for row in level.weights for weight in row)
@@ -0,0 +1,44 @@
+import os
+
+import pygame
+
+from capture import FrameCapture, ImageSequenceSink
+
+# Keeps every frame handed to it, like a sink that never falls behind
+class ListSink:
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    def write(self, index, data):
+        self.frames.append((index, data))
+
+    def close(self):
+        self.closed = True
+
+# Each frame is copied when captured, so drawing the next frame cannot change a queued one
+def test_frames_are_copied_in_order():
+    sink = ListSink()
+    capture = FrameCapture(sink, maxPending=2)
+    surface = pygame.Surface((4, 3))
+    for shade in range(10):
+        surface.fill((shade, 0, 0))
+        capture.capture(surface)
+    capture.close()
+    assert sink.closed
+    assert [index for index, _ in sink.frames] == list(range(10))
+    assert [data[0] for _, data in sink.frames] == list(range(10))
+    assert all(len(data) == 4 * 3 * 3 for _, data in sink.frames)
+
+def test_image_sequence_saves_numbered_frames(tmp_path):
+    directory = os.path.join(str(tmp_path), "frames")
+    capture = FrameCapture(ImageSequenceSink(directory, (8, 6)))
+    surface = pygame.Surface((8, 6))
+    for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255)):
+        surface.fill(color)
+        capture.capture(surface)
+    capture.close()
+    assert sorted(os.listdir(directory)) == ["frame%06d.png" % i for i in range(3)]
+    image = pygame.image.load(os.path.join(directory, "frame000001.png"))
+    assert image.get_size() == (8, 6)
+    assert image.get_at((3, 2)) == pygame.Color(0, 255, 0)
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from demonstrations import DemonstrationReader, DemonstrationWriter
+
+def writeSamples(path, start, count, chunkSize=4):
+    writer = DemonstrationWriter(path, 3, chunkSize)
+    for i in range(start, start + count):
+        writer.add([i, i + 0.5, -i], i % 16)
+    writer.close()
+
+def test_sessions_append_and_read_back(tmp_path):
+    path = os.path.join(str(tmp_path), "demo.bin")
+    writeSamples(path, 0, 10)
+    writeSamples(path, 10, 5)
+    reader = DemonstrationReader(path)
+    assert len(reader) == 15 and len(reader.chunks) == 5
+    for i in (0, 3, 4, 9, 10, 14):
+        assert reader.inputs[i] == [i, i + 0.5, -i]
+        assert reader.targets[i] == [i % 16 >> bit & 1 for bit in range(4)]
+    with pytest.raises(IndexError):
+        reader.inputs[15]
+    reader.close()
+
+# A crash part way through a chunk leaves a torn tail: the reader skips it, the next session cuts it off
+def test_torn_chunk_is_dropped_before_appending(tmp_path):
+    path = os.path.join(str(tmp_path), "demo.bin")
+    writeSamples(path, 0, 8)
+    complete = os.path.getsize(path)
+    writeSamples(path, 8, 4)
+    with open(path, 'r+b') as f:
+        f.truncate(complete + 20)
+    reader = DemonstrationReader(path)
+    assert len(reader) == 8
+    reader.close()
+
+    writeSamples(path, 100, 4)
+    reader = DemonstrationReader(path)
+    assert len(reader) == 12
+    assert reader.inputs[8] == [100, 100.5, -100]
+    reader.close()
+
+def test_mismatched_datasets_are_refused(tmp_path):
+    path = os.path.join(str(tmp_path), "demo.bin")
+    other = os.path.join(str(tmp_path), "other.bin")
+    writeSamples(path, 0, 4)
+    with pytest.raises(ValueError):
+        DemonstrationWriter(path, 5)
+    writer = DemonstrationWriter(other, 5)
+    writer.add([0] * 5, 1)
+    writer.close()
+    with pytest.raises(ValueError):
+        DemonstrationReader([path, other])
@@ -0,0 +1,52 @@
+import random
+import threading
+from multiprocessing.connection import Client
+
+import pytest
+
+from distributed import AUTHKEY, Coordinator, runWorker
+from optimisation import NeuralNetwork, evaluatePopulation
+
+def randomBrains(count, seed):
+    random.seed(seed)
+    return [NeuralNetwork([5, 6, 4]) for _ in range(count)]
+
+# Takes jobs and drops the connection without answering, like a worker killed by its job
+def crashingWorker(address, crashes):
+    for _ in range(crashes):
+        conn = Client(address, authkey=AUTHKEY)
+        conn.send(('ready',))
+        if conn.recv()[0] == 'stop':
+            conn.close()
+            return
+        conn.close()
+
+def test_chunks_come_back_in_order():
+    brains = randomBrains(7, 1)
+    coordinator = Coordinator(('localhost', 0), chunkSize=3)
+    workers = [threading.Thread(target=runWorker, args=(coordinator.address,), daemon=True) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        assert coordinator.evaluate(brains, 1, 200) == evaluatePopulation(brains, 1, 200)
+    finally:
+        coordinator.close()
+
+def test_job_fails_after_too_many_lost_workers():
+    coordinator = Coordinator(('localhost', 0), chunkSize=10, maxRetries=2)
+    crasher = threading.Thread(target=crashingWorker, args=(coordinator.address, 3), daemon=True)
+    crasher.start()
+    try:
+        with pytest.raises(RuntimeError, match="lost 3 workers"):
+            coordinator.evaluate(randomBrains(4, 2), 1, 200)
+        assert not coordinator.jobs
+    finally:
+        coordinator.close()
+
+def test_evaluation_fails_without_workers():
+    coordinator = Coordinator(('localhost', 0), timeout=0.5)
+    try:
+        with pytest.raises(RuntimeError, match="no worker connected"):
+            coordinator.evaluate(randomBrains(4, 3), 1, 200)
+    finally:
+        coordinator.close()
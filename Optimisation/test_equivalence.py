@@ -0,0 +1,154 @@
+import math
+import random
+
+import pytest
+
+from optimisation import (BorderTree, Car, NeuralNetwork, Road, Sensor, SensorConfig, World, defaultCarClass, evaluatePopulation, polysIntersect,
+                          ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT)
+from augment import AugmentConfig
+from quantized import QuantizedNetwork, validate
+import kernels
+from kernels import KernelCar, crossCheck
+from training import createWorld
+
+# The rebuild-from-trig polygon the incremental createPolygon replaced
+def referencePolygon(car):
+    rad = math.hypot(car.width, car.height) / 2
+    alpha = math.atan2(car.width, car.height)
+    return [
+        {'x': car.x - math.sin(car.angle - alpha) * rad, 'y': car.y - math.cos(car.angle - alpha) * rad},
+        {'x': car.x - math.sin(car.angle + alpha) * rad, 'y': car.y - math.cos(car.angle + alpha) * rad},
+        {'x': car.x - math.sin(math.pi + car.angle - alpha) * rad, 'y': car.y - math.cos(math.pi + car.angle - alpha) * rad},
+        {'x': car.x - math.sin(math.pi + car.angle + alpha) * rad, 'y': car.y - math.cos(math.pi + car.angle + alpha) * rad},
+    ]
+
+def randomCar(rng, controlType="DUMMY"):
+    car = Car(rng.uniform(ROAD_X - 120, ROAD_X + 120), rng.uniform(-400, 200), CAR_WIDTH, CAR_HEIGHT, controlType)
+    car.angle = rng.uniform(-math.pi, math.pi)
+    car.polygon = car.createPolygon()
+    return car
+
+def randomBrains(count, seed):
+    random.seed(seed)
+    return [NeuralNetwork([5, 6, 4]) for _ in range(count)]
+
+def test_polygon_matches_trig_rebuild():
+    rng = random.Random(1)
+    car = Car(0, 0, CAR_WIDTH, CAR_HEIGHT, "DUMMY")
+    for _ in range(2000):
+        car.x = rng.uniform(-1000, 1000)
+        car.y = rng.uniform(-10000, 1000)
+        # Small turns as well as jumps, since the corners are only recomputed when the angle changes
+        car.angle += rng.choice([0, 0.03, -0.03, rng.uniform(-10, 10)])
+        polygon = car.createPolygon()
+        for point, expected in zip(polygon, referencePolygon(car)):
+            assert abs(point['x'] - expected['x']) < 1e-9
+            assert abs(point['y'] - expected['y']) < 1e-9
+
+def test_fitness_unchanged_by_incremental_polygon(monkeypatch):
+    brains = randomBrains(20, 1)
+    expected = evaluatePopulation(brains, 1, 300)
+    monkeypatch.setattr(Car, 'createPolygon', referencePolygon)
+    assert evaluatePopulation(brains, 1, 300) == expected
+
+def bruteDamage(car, borders, traffic):
+    return (any(polysIntersect(car.polygon, border) for border in borders) or
+            any(polysIntersect(car.polygon, other.polygon) for other in traffic))
+
+def test_damage_early_reject_matches_brute_force():
+    rng = random.Random(2)
+    road = Road(ROAD_X, ROAD_WIDTH)
+    hits = 0
+    for _ in range(3000):
+        car = randomCar(rng)
+        traffic = [randomCar(rng) for _ in range(rng.randrange(8))]
+        damaged = car.assessDamage(road.borders, traffic)
+        assert damaged == bruteDamage(car, road.borders, traffic)
+        hits += damaged
+    # Both outcomes have to occur for the comparison to mean anything
+    assert 0 < hits < 3000
+
+def test_border_tree_matches_all_borders():
+    rng = random.Random(3)
+    borders = []
+    for _ in range(60):
+        x, y = rng.uniform(-300, 500), rng.uniform(-600, 300)
+        borders.append([{'x': x, 'y': y}, {'x': x + rng.uniform(-80, 80), 'y': y + rng.uniform(-80, 80)}])
+    tree = BorderTree(borders)
+    for _ in range(2000):
+        car = randomCar(rng, "AI")
+        nearby = tree.near(car.x, car.y, World.reach(car))
+        assert car.assessDamage(nearby, []) == bruteDamage(car, borders, [])
+        car.sensor.castRays()
+        assert car.sensor.castReadings(nearby, []) == car.sensor.castReadings(borders, [])
+
+# One ray at a time against every segment, keeping the first nearest touch
+def referenceReading(ray, borders, traffic):
+    segments = [(border[0], border[1]) for border in borders]
+    for other in traffic:
+        poly = other.polygon
+        segments.extend((poly[j], poly[(j + 1) % len(poly)]) for j in range(len(poly)))
+    touches = [touch for touch in (Sensor.getIntersection(ray[0], ray[1], C, D) for C, D in segments) if touch]
+    if not touches:
+        return None
+    return min(touches, key=lambda touch: touch['offset'])
+
+def test_cast_readings_match_per_ray_intersection():
+    rng = random.Random(5)
+    road = Road(ROAD_X, ROAD_WIDTH)
+    seen = 0
+    for config in [SensorConfig(), SensorConfig(9, raySpread=math.pi), SensorConfig(1)]:
+        for _ in range(1000):
+            car = Car(rng.uniform(ROAD_X - 120, ROAD_X + 120), rng.uniform(-400, 200), CAR_WIDTH, CAR_HEIGHT, "AI", sensorConfig=config)
+            car.angle = rng.uniform(-math.pi, math.pi)
+            traffic = [randomCar(rng) for _ in range(rng.randrange(8))]
+            car.sensor.castRays()
+            readings = car.sensor.castReadings(road.borders, traffic)
+            assert readings == [referenceReading(ray, road.borders, traffic) for ray in car.sensor.rays]
+            seen += sum(reading is not None for reading in readings)
+    assert seen > 0
+
+def test_brain_must_match_ray_count():
+    car = Car(0, 0, CAR_WIDTH, CAR_HEIGHT, "AI", sensorConfig=SensorConfig(7))
+    car.brain = NeuralNetwork([7, 6, 4])
+    with pytest.raises(ValueError):
+        car.brain = NeuralNetwork([5, 6, 4])
+    with pytest.raises(ValueError):
+        car.brain = QuantizedNetwork(NeuralNetwork([5, 6, 4]))
+
+# Cached fitness assumes a brain scores the same wherever it sits in the population or a distributed chunk
+def test_augmented_fitness_independent_of_order():
+    brains = randomBrains(12, 6)
+    config = AugmentConfig(0.05, 0.05, 2)
+    fitnesses = evaluatePopulation(brains, 1, 300, config)
+    assert evaluatePopulation(brains[::-1], 1, 300, config)[::-1] == fitnesses
+    assert evaluatePopulation(brains[:5], 1, 300, config) == fitnesses[:5]
+
+# int8 weights move decision boundaries slightly, so a small share of decisions may flip; inputs right on a
+# boundary are rare while driving but not among uniform random inputs, hence the looser bound there
+def test_quantized_decisions_agree():
+    brains = randomBrains(20, 4)
+    rng = random.Random(4)
+    total = differing = 0
+    for brain in brains:
+        network = QuantizedNetwork(brain)
+        for _ in range(500):
+            inputs = [rng.choice([0, rng.random()]) for _ in range(5)]
+            total += 1
+            differing += list(NeuralNetwork.feedForward(inputs, brain)) != QuantizedNetwork.feedForward(inputs, network)
+    decisions, drivenDiffering = validate(brains, 1, 300)[:2]
+    assert differing <= total * 0.01
+    assert drivenDiffering <= decisions * 0.001
+
+def test_kernels_cross_check():
+    assert crossCheck(samples=500, population=5, steps=50, log=lambda *args: None) == 0
+
+# With numba installed every evaluation path builds kernel cars, and they score like plain ones
+def test_kernel_cars_are_used_with_numba(monkeypatch):
+    brains = randomBrains(8, 9)
+    plain = evaluatePopulation(brains, 1, 200)
+    assert defaultCarClass() is (Car if kernels.njit is None else KernelCar)
+    monkeypatch.setattr(kernels, 'njit', lambda function: function)
+    assert defaultCarClass() is KernelCar
+    assert all(type(car) is KernelCar for car in createWorld(3, 1).cars)
+    assert evaluatePopulation(brains, 1, 200) == plain
@@ -0,0 +1,61 @@
+import os
+import random
+
+import optimisation
+from optimisation import FitnessCache, NeuralNetwork, SensorConfig, scenarioKey
+
+def randomBrains(count, seed):
+    random.seed(seed)
+    return [NeuralNetwork([5, 6, 4]) for _ in range(count)]
+
+# Stand-in evaluator that records which brains it was asked to score
+class Counter:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, brains):
+        self.calls.append(len(brains))
+        return [float(len(NeuralNetwork.toBytes(brain)) + i) for i, brain in enumerate(brains)]
+
+def test_only_misses_are_evaluated():
+    brains = randomBrains(6, 1)
+    cache = FitnessCache()
+    evaluate = Counter()
+    first = cache.evaluate(brains, "s", evaluate)
+    mutated = NeuralNetwork.copy(brains[0])
+    NeuralNetwork.mutate(mutated, 0.5)
+    second = cache.evaluate(brains[:3] + [mutated], "s", evaluate)
+    assert evaluate.calls == [6, 1]
+    assert second[:3] == first[:3]
+    assert (cache.hits, cache.misses) == (3, 7)
+
+def test_least_recently_used_entry_is_evicted():
+    brains = randomBrains(3, 2)
+    cache = FitnessCache(capacity=2)
+    evaluate = Counter()
+    cache.evaluate(brains[:2], "s", evaluate)
+    cache.evaluate(brains[:1], "s", evaluate)
+    cache.evaluate(brains[2:], "s", evaluate)
+    cache.evaluate(brains[:2], "s", evaluate)
+    assert evaluate.calls == [2, 1, 1]
+
+def test_disk_tier_survives_reopen(tmp_path):
+    brains = randomBrains(4, 3)
+    path = os.path.join(str(tmp_path), "fitness")
+    cache = FitnessCache(path=path)
+    expected = cache.evaluate(brains, "s", Counter())
+    cache.close()
+    cache = FitnessCache(path=path)
+    evaluate = Counter()
+    assert cache.evaluate(brains, "s", evaluate) == expected
+    assert evaluate.calls == []
+    cache.close()
+
+def test_keys_change_with_version_and_sensor(monkeypatch):
+    blob = NeuralNetwork.toBytes(randomBrains(1, 4)[0])
+    scenario = scenarioKey(1)
+    assert scenarioKey(1, sensorConfig=SensorConfig(7)) != scenario
+    assert scenarioKey(1, sensorConfig=SensorConfig(5, rayLength=200)) != scenario
+    key = FitnessCache.key(blob, scenario)
+    monkeypatch.setattr(optimisation, 'FITNESS_VERSION', optimisation.FITNESS_VERSION + 1)
+    assert FitnessCache.key(blob, scenario) != key
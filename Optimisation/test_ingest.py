@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import ingest
+from ingest import SpawnSchedule, convert, loadSchedule, scheduleKey
+from optimisation import Car, CAR_WIDTH, CAR_HEIGHT
+from training import createWorld
+
+def writeLog(path, rows):
+    with open(path, 'w') as f:
+        f.write("time,lane,speed\n")
+        for row in rows:
+            f.write("%s,%s,%s\n" % row)
+
+# Sorted runs from every chunk are merged back into one time order; equal times keep their log order
+def test_convert_merges_chunks_in_time_order(tmp_path):
+    path = os.path.join(str(tmp_path), "log.csv")
+    writeLog(path, [(3, 0, 1), (1, 'a', 2), (2, 1, 3), (1, 'b', 4), ('', 0, 9), (0.5, 2, 5)])
+    schedule = convert(path, stepsPerSecond=10, chunkSize=2)
+    assert list(schedule.steps) == [0, 5, 5, 15, 25]
+    assert list(schedule.speeds) == [5, 2, 4, 3, 1]
+    assert list(schedule.lanes) == [2, 0, 1, 1, 0]
+    assert len(convert(path, limit=3)) == 3
+    assert list(SpawnSchedule.fromBytes(schedule.toBytes()).steps) == list(schedule.steps)
+
+def test_cached_schedule_skips_the_log(tmp_path, monkeypatch):
+    path = os.path.join(str(tmp_path), "log.csv")
+    cacheDir = os.path.join(str(tmp_path), "cache")
+    writeLog(path, [(0, 0, 1), (1, 1, 2)])
+    first = loadSchedule(path, cacheDir, stepsPerSecond=30)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("log read again")
+
+    monkeypatch.setattr(ingest, 'convert', fail)
+    assert list(loadSchedule(path, cacheDir, stepsPerSecond=30).steps) == list(first.steps)
+    key = scheduleKey(path, stepsPerSecond=30)
+    assert scheduleKey(path, stepsPerSecond=60) != key
+    monkeypatch.setattr(ingest, 'CACHE_FORMAT', ingest.CACHE_FORMAT + 1)
+    assert scheduleKey(path, stepsPerSecond=30) != key
+    with pytest.raises(AssertionError):
+        loadSchedule(path, cacheDir, stepsPerSecond=30)
+
+# Every car of a one-step schedule is due at once; the next pass waits until they have all entered
+def test_looping_short_schedule_keeps_queues_bounded():
+    schedule = SpawnSchedule()
+    for lane in (0, 0, 0, 1, 1, 2):
+        schedule.steps.append(0)
+        schedule.lanes.append(lane)
+        schedule.speeds.append(2)
+    assert schedule.duration() == 1
+    world = createWorld(3, 1, schedule=schedule)
+    for _ in range(400):
+        world.step()
+        assert sum(len(queue) for queue in world.spawner.waiting) <= len(schedule)
+    assert world.spawner.passStart > 0
+    assert len(world.traffic) > len(schedule)
+
+# Traffic far behind every live car is dropped, and so is traffic far ahead that no live car can catch
+def test_far_traffic_is_retired():
+    world = createWorld(3, 1, schedule=SpawnSchedule())
+    spawner = world.spawner
+    world.cars[0].damaged = True
+    world.cars[0].y = 5000
+    live = world.cars[1]
+    cars = []
+    for y, speed in ((live.y + 1200, 1), (live.y + 500, 1), (live.y - 1200, 1), (live.y - 1200, live.maxSpeed)):
+        car = Car(world.road.getLaneCenter(0), y, CAR_WIDTH, CAR_HEIGHT, "DUMMY", speed)
+        car.speed = speed
+        cars.append(car)
+        world.traffic.append(car)
+        world.trafficIndex.add(car)
+    spawner.retire(world)
+    assert world.traffic == cars[1:3]
+    assert world.trafficIndex.lanes[0] == sorted(cars[1:3], key=lambda car: car.y)
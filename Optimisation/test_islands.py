@@ -0,0 +1,51 @@
+import os
+import queue
+import threading
+
+import pytest
+
+import islands
+from islands import runIsland, runIslands
+from scenario import Scenario
+
+# Two islands on one ring, run as threads so their reports can be read back exactly
+def test_best_brain_migrates_around_the_ring(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = [Scenario.fromSeed(1, steps=100).toDict()]
+    ring = [islands.multiprocessing.Pipe(duplex=False) for _ in range(2)]
+    reports = queue.Queue()
+    threads = [threading.Thread(target=runIsland, args=(i, data, 6, 8, 0.2, 2, 2, i * 10, None, ring[(i + 1) % 2][1], ring[i][0], reports))
+               for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    bests = {}
+    while not reports.empty():
+        index, generation, value = reports.get()
+        if generation is not None:
+            bests.setdefault(generation, {})[index] = value
+    # After a migration both islands hold the better of the two best brains
+    for generation in (1, 3):
+        assert bests[generation][0] == bests[generation][1]
+    assert sorted(bests) == list(range(6))
+
+def test_run_returns_the_best_island(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    lines = []
+    best, fitness = runIslands([Scenario.fromSeed(1, steps=100)], 2, 3, 6, interval=2, log=lines.append)
+    assert len(lines) == 3
+    assert fitness >= max(float(line.split()[3]) for line in lines) - 0.05
+    assert best.levels
+
+def dyingIsland(index, *args):
+    if index == 1:
+        os._exit(3)
+    runIsland(index, *args)
+
+# The surviving island waits for migrants that never come; the run must fail instead of hanging
+def test_dead_island_fails_the_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(islands, 'runIsland', dyingIsland)
+    with pytest.raises(RuntimeError, match="island 1 exited with code 3"):
+        runIslands([Scenario.fromSeed(1, steps=100)], 2, 4, 6, interval=1, log=lambda line: None, pollInterval=0.2)
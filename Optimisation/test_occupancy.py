@@ -0,0 +1,54 @@
+import math
+import random
+
+from occupancy import traverse, useOccupancy
+from optimisation import Sensor, SensorConfig
+from training import createWorld
+
+def test_traverse_walks_adjacent_cells_to_the_end():
+    rng = random.Random(1)
+    size = 5
+    for _ in range(500):
+        x0, y0, x1, y1 = [rng.uniform(-40, 40) for _ in range(4)]
+        cells = list(traverse(x0, y0, x1, y1, size))
+        assert cells[0] == (math.floor(x0 / size), math.floor(y0 / size), 0.0)
+        assert cells[-1][:2] == (math.floor(x1 / size), math.floor(y1 / size))
+        for (ax, ay, at), (bx, by, bt) in zip(cells, cells[1:]):
+            assert abs(ax - bx) + abs(ay - by) == 1
+            assert at <= bt <= 1
+            # The entry point of each cell lies on its boundary
+            x = x0 + (x1 - x0) * bt
+            y = y0 + (y1 - y0) * bt
+            assert bx * size - 1e-9 <= x <= (bx + 1) * size + 1e-9
+            assert by * size - 1e-9 <= y <= (by + 1) * size + 1e-9
+
+def distanceToSegment(x, y, A, B):
+    dx = B['x'] - A['x']
+    dy = B['y'] - A['y']
+    length = dx * dx + dy * dy
+    t = 0 if length == 0 else max(0, min(1, ((x - A['x']) * dx + (y - A['y']) * dy) / length))
+    return math.hypot(A['x'] + dx * t - x, A['y'] + dy * t - y)
+
+# The stated bound: no missed or late hits, and every reported point within one cell diagonal of an obstacle
+def test_grid_readings_are_conservative():
+    random.seed(1)
+    cellSize = 5
+    world = createWorld(10, 1, trafficCount=40, sensorConfig=SensorConfig(9, raySpread=math.pi))
+    useOccupancy(world, cellSize)
+    hits = 0
+    for _ in range(150):
+        world.step()
+        segments = [(border[0], border[1]) for border in world.road.borders]
+        for other in world.traffic:
+            segments.extend((other.polygon[j], other.polygon[(j + 1) % 4]) for j in range(4))
+        for car in world.cars:
+            if car.damaged:
+                continue
+            exact = Sensor.castReadings(car.sensor, world.road.borders, world.traffic)
+            for reading, reference in zip(car.sensor.readings, exact):
+                if reference is not None:
+                    assert reading is not None and reading['offset'] <= reference['offset'] + 1e-9
+                    hits += 1
+                if reading is not None:
+                    assert min(distanceToSegment(reading['x'], reading['y'], A, B) for A, B in segments) <= cellSize * math.sqrt(2)
+    assert hits > 0
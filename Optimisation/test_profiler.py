@@ -0,0 +1,51 @@
+import json
+import os
+import random
+
+from optimisation import Car, NeuralNetwork, Road, World, generateTraffic, ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y
+from profiler import PhaseTimings, Profiler
+from traffic import LaneIndex
+
+def createWorld(profiler=None):
+    random.seed(1)
+    road = Road(ROAD_X, ROAD_WIDTH)
+    cars = []
+    for _ in range(10):
+        car = Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI")
+        car.brain = NeuralNetwork([5, 6, 4])
+        cars.append(car)
+    traffic = generateTraffic(road, 1)
+    return World(road, traffic, cars, profiler, trafficIndex=LaneIndex(road, traffic))
+
+# The phase-by-phase step must drive the world exactly like the plain one
+def test_profiled_step_matches_plain_step():
+    plain = createWorld()
+    profiled = createWorld(Profiler())
+    plain.run(200)
+    profiled.run(200)
+    assert [(car.x, car.y, car.damaged) for car in profiled.cars] == [(car.x, car.y, car.damaged) for car in plain.cars]
+    assert profiled.steps == plain.steps
+    summary = profiled.profiler.summary()
+    for name in ('traffic', 'index', 'move', 'polygon', 'damage', 'sensor', 'network', 'step'):
+        assert summary[name]['calls'] == profiled.steps
+
+def test_ring_buffer_keeps_latest_samples_in_order():
+    timings = PhaseTimings(4)
+    for i in range(6):
+        timings.add(float(i), float(i))
+    assert timings.samples() == [2.0, 3.0, 4.0, 5.0]
+    assert timings.calls == 6 and timings.total == 15.0
+
+def test_chrome_trace_holds_every_kept_sample(tmp_path):
+    profiler = Profiler(capacity=8)
+    for _ in range(10):
+        with profiler.phase('a'):
+            pass
+    with profiler.phase('b'):
+        pass
+    path = os.path.join(str(tmp_path), "trace.json")
+    profiler.dumpChromeTrace(path)
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    assert sorted(event['name'] for event in events) == ['a'] * 8 + ['b']
+    assert [event['ts'] for event in events] == sorted(event['ts'] for event in events)
@@ -0,0 +1,87 @@
+import os
+import random
+
+import pytest
+
+import recorder
+from optimisation import Car, NeuralNetwork, Road, World, generateTraffic, ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y
+from recorder import Recorder, RecordingReader
+
+def createWorld(population=3, seed=1):
+    random.seed(seed)
+    road = Road(ROAD_X, ROAD_WIDTH)
+    cars = []
+    for _ in range(population):
+        car = Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI")
+        car.brain = NeuralNetwork([5, 6, 4])
+        cars.append(car)
+    return World(road, generateTraffic(road, seed), cars)
+
+# Steps the world while recording and returns what each frame should hold
+def recordRun(path, world, steps, chunkSize=16, change=None):
+    expected = []
+    rec = Recorder(path, world, chunkSize=chunkSize)
+    for step in range(steps):
+        world.step()
+        if change is not None:
+            change(world, step)
+        rec.record()
+        expected.append(([car.y for car in world.cars], [car.y for car in world.traffic]))
+    rec.close()
+    return expected
+
+def test_frames_read_back(tmp_path):
+    path = os.path.join(str(tmp_path), "run.rec")
+    expected = recordRun(path, createWorld(), 50)
+    reader = RecordingReader(path)
+    assert reader.frameCount == 50 and len(reader.chunks) == 4
+    for index in (0, 15, 16, 49):
+        frame = reader.frame(index, ['carY', 'trafficY'])
+        carY, trafficY = expected[index]
+        assert list(frame['carY']) == pytest.approx(carY)
+        assert list(frame['trafficY']) == pytest.approx(trafficY)
+    reader.close()
+
+def test_traffic_count_may_change(tmp_path):
+    path = os.path.join(str(tmp_path), "run.rec")
+
+    def change(world, step):
+        if step % 5 == 0:
+            world.traffic.append(Car(world.road.getLaneCenter(0), -step * 10, CAR_WIDTH, CAR_HEIGHT, "DUMMY"))
+        if step % 7 == 0:
+            world.traffic.pop(0)
+
+    expected = recordRun(path, createWorld(), 40, change=change)
+    reader = RecordingReader(path)
+    for index, (_, trafficY) in enumerate(expected):
+        assert list(reader.frame(index, ['trafficY'])['trafficY']) == pytest.approx(trafficY)
+    reader.close()
+
+# A run that was killed has no footer and may end inside a chunk: every complete chunk is still read
+def test_interrupted_recording_keeps_complete_chunks(tmp_path):
+    path = os.path.join(str(tmp_path), "run.rec")
+    expected = recordRun(path, createWorld(), 50)
+    reader = RecordingReader(path)
+    lastChunk = reader.chunks[-1][0]
+    reader.close()
+    with open(path, 'r+b') as f:
+        f.truncate(lastChunk + 20)
+    reader = RecordingReader(path)
+    assert reader.frameCount == 48 and len(reader.chunks) == 3
+    assert list(reader.frame(47, ['carY'])['carY']) == pytest.approx(expected[47][0])
+    reader.close()
+
+def test_writer_failure_is_raised(tmp_path, monkeypatch):
+    def fail(data, level):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(recorder.zlib, 'compress', fail)
+    world = createWorld()
+    rec = Recorder(os.path.join(str(tmp_path), "run.rec"), world, chunkSize=1)
+    with pytest.raises(OSError, match="disk full"):
+        # More chunks than the queue holds: without the stored error this would block forever
+        for _ in range(100):
+            world.step()
+            rec.record()
+    with pytest.raises(OSError):
+        rec.close()
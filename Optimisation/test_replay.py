@@ -0,0 +1,55 @@
+import os
+import random
+
+import pygame
+import pytest
+
+from optimisation import Car, NeuralNetwork, Road, World, generateTraffic, ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y
+from recorder import Recorder, RecordingReader
+from replay import ReplayViewer, selectCars
+
+@pytest.fixture
+def reader(tmp_path):
+    random.seed(1)
+    road = Road(ROAD_X, ROAD_WIDTH)
+    cars = []
+    for _ in range(4):
+        car = Car(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI")
+        car.brain = NeuralNetwork([5, 6, 4])
+        cars.append(car)
+    world = World(road, generateTraffic(road, 1), cars)
+    path = os.path.join(str(tmp_path), "run.rec")
+    rec = Recorder(path, world, chunkSize=8)
+    for _ in range(30):
+        world.step()
+        rec.record()
+    rec.close()
+    reader = RecordingReader(path)
+    yield reader
+    reader.close()
+
+def test_viewer_shows_recorded_poses(reader):
+    viewer = ReplayViewer(reader, [2, 0])
+    viewer.seek(20)
+    viewer.draw(pygame.Surface((int(ROAD_X * 2), 300)))
+    frame = reader.frame(20)
+    assert [car.y for car in viewer.cars] == [frame['carY'][2], frame['carY'][0]]
+    assert viewer.trafficShown == len(frame['trafficY'])
+
+def test_seek_is_clamped(reader):
+    viewer = ReplayViewer(reader, [0])
+    viewer.seek(1000)
+    assert viewer.position == reader.frameCount - 1
+    viewer.seek(-5)
+    assert viewer.position == 0
+
+def test_selection_is_validated(reader):
+    assert selectCars(reader, "1,3") == [1, 3]
+    assert len(selectCars(reader, None, 2)) == 2
+    for cars in (",", "4", "-1", "a,b"):
+        with pytest.raises(ValueError):
+            selectCars(reader, cars)
+    with pytest.raises(ValueError):
+        selectCars(reader, None, 0)
+    with pytest.raises(ValueError):
+        ReplayViewer(reader, [])
@@ -0,0 +1,51 @@
+import os
+import random
+
+import pytest
+
+from optimisation import NeuralNetwork, evaluatePopulation
+from scenario import CACHE_FORMAT, Scenario, ScenarioCache, evaluateBatch, evaluateScenario
+
+def randomBrains(count, seed):
+    random.seed(seed)
+    return [NeuralNetwork([5, 6, 4]) for _ in range(count)]
+
+# A fixture built from a seed replays exactly the run evaluatePopulation scores for that seed
+def test_seed_scenario_matches_evaluate_population():
+    brains = randomBrains(6, 1)
+    compiled = ScenarioCache(None).compile(Scenario.fromSeed(1, steps=300))
+    assert evaluateScenario(brains, compiled) == evaluatePopulation(brains, 1, 300)
+
+def test_disk_cache_scores_like_a_fresh_compile(tmp_path):
+    directory = os.path.join(str(tmp_path), "cache")
+    scenario = Scenario.fromSeed(2, steps=300, trafficModel=True)
+    fresh = ScenarioCache(directory).compile(scenario)
+    assert os.listdir(directory) == ["%s.v%d.json" % (scenario.key(), CACHE_FORMAT)]
+    cached = ScenarioCache(directory).compile(scenario)
+    assert cached is not fresh
+    assert [[car.y for car in cars] for cars in cached.index.lanes] == [[car.y for car in cars] for cars in fresh.index.lanes]
+    brains = randomBrains(6, 2)
+    assert evaluateScenario(brains, cached) == evaluateScenario(brains, fresh)
+
+# Renaming a fixture keeps its key, so its compiled state and cached fitnesses are shared
+def test_key_ignores_the_name():
+    scenario = Scenario.fromSeed(3)
+    renamed = Scenario.fromDict(scenario.toDict())
+    renamed.name = "other"
+    assert renamed.key() == scenario.key()
+    renamed.steps += 1
+    assert renamed.key() != scenario.key()
+
+# Scenarios with different budgets are combined as distance per step
+def test_batch_combines_distance_per_step():
+    brains = randomBrains(5, 4)
+    cache = ScenarioCache(None)
+    compiled = [cache.compile(Scenario.fromSeed(1, steps=100)), cache.compile(Scenario.fromSeed(2, steps=400))]
+    short, long = [evaluateScenario(brains, scenario) for scenario in compiled]
+    stats = {}
+    mean = evaluateBatch(brains, compiled, 'mean', stats)
+    worst = evaluateBatch(brains, compiled, 'min')
+    for i in range(len(brains)):
+        assert mean[i] == pytest.approx((short[i] / 100 + long[i] / 400) / 2)
+        assert worst[i] == pytest.approx(min(short[i] / 100, long[i] / 400))
+    assert stats['steps'] <= 500 * len(brains)
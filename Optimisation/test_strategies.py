@@ -0,0 +1,40 @@
+import random
+
+from optimisation import NeuralNetwork
+from strategies import NEURON_COUNTS, OpenAIES, SepCMAES, centeredRanks, runStrategy
+
+def test_centered_ranks_share_ties():
+    assert centeredRanks([3, 1, 2]) == [0.5, -0.5, 0.0]
+    assert centeredRanks([5, 5, 5, 5]) == [0.0] * 4
+    assert centeredRanks([1, 2, 2, 9]) == [-0.5, 0.0, 0.0, 0.5]
+
+# Toy objective on the flat parameters: closeness to a fixed random point
+def distanceTo(target):
+    return lambda brains: [-sum((p - t) ** 2 for p, t in zip(NeuralNetwork.flatten(brain), target)) for brain in brains]
+
+def solve(strategy, generations):
+    rng = random.Random(1)
+    target = [rng.uniform(-1, 1) for _ in strategy.mean]
+    evaluate = distanceTo(target)
+    start = evaluate([NeuralNetwork.unflatten(list(NEURON_COUNTS), strategy.mean)])[0]
+    best = runStrategy(strategy, evaluate, generations, log=lambda line: None)
+    return start, evaluate([best])[0], evaluate([NeuralNetwork.unflatten(list(NEURON_COUNTS), strategy.mean)])[0]
+
+def test_openai_es_moves_towards_the_optimum():
+    size = len(NeuralNetwork.flatten(NeuralNetwork(list(NEURON_COUNTS))))
+    start, best, mean = solve(OpenAIES(NEURON_COUNTS, [0.0] * size, sigma=0.1, learningRate=0.05, seed=1), 40)
+    assert mean > start / 10
+    assert best > start / 10
+
+def test_sep_cma_moves_towards_the_optimum():
+    size = len(NeuralNetwork.flatten(NeuralNetwork(list(NEURON_COUNTS))))
+    start, best, mean = solve(SepCMAES(NEURON_COUNTS, [0.0] * size, seed=1), 150)
+    assert mean > start / 10
+    assert best > start / 10
+
+def test_run_stops_at_target():
+    generations = []
+    size = len(NeuralNetwork.flatten(NeuralNetwork(list(NEURON_COUNTS))))
+    strategy = OpenAIES(NEURON_COUNTS, [0.0] * size, seed=2)
+    runStrategy(strategy, lambda brains: [1.0] * len(brains), 10, target=1.0, log=generations.append)
+    assert len(generations) == 1
@@ -0,0 +1,93 @@
+import random
+
+from optimisation import Car, Road, generateTraffic, polysIntersect, ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT
+from traffic import LaneIndex, TrafficModel
+
+def dummy(road, lane, y, maxSpeed):
+    car = Car(road.getLaneCenter(lane), y, CAR_WIDTH, CAR_HEIGHT, "DUMMY", maxSpeed)
+    car.lane = lane
+    return car
+
+def test_free_road_reaches_desired_speed():
+    road = Road(ROAD_X, ROAD_WIDTH, 1)
+    car = dummy(road, 0, 0, 2)
+    model = TrafficModel(road)
+    for _ in range(300):
+        model.step([car])
+        assert car.speed <= car.maxSpeed
+    assert car.speed > 1.9
+
+# On a single lane a fast car settles behind a slow one instead of driving into it
+def test_follower_keeps_its_distance():
+    road = Road(ROAD_X, ROAD_WIDTH, 1)
+    leader = dummy(road, 0, -200, 1)
+    follower = dummy(road, 0, 0, 3)
+    leader.speed = 1
+    follower.speed = 3
+    model = TrafficModel(road)
+    for _ in range(2000):
+        model.step([follower, leader])
+        assert follower.y - leader.y > CAR_HEIGHT
+    assert abs(follower.speed - leader.speed) < 0.05
+
+# Either car may take the free lane: MOBIL also moves a slow leader aside for the car it holds up
+def test_fast_car_gets_past_through_free_lane():
+    road = Road(ROAD_X, ROAD_WIDTH, 2)
+    leader = dummy(road, 0, -100, 1)
+    follower = dummy(road, 0, 0, 3)
+    leader.speed = 1
+    follower.speed = 3
+    model = TrafficModel(road)
+    for _ in range(400):
+        model.step([follower, leader])
+    assert follower.lane != leader.lane
+    assert follower.y < leader.y
+
+def test_generated_traffic_does_not_collide():
+    road = Road(ROAD_X, ROAD_WIDTH)
+    traffic = generateTraffic(road, 1, 30, 80, (1.5, 2.5))
+    model = TrafficModel(road)
+    for _ in range(1500):
+        model.step(traffic)
+    for i in range(len(traffic)):
+        for j in range(i + 1, len(traffic)):
+            assert not polysIntersect(traffic[i].polygon, traffic[j].polygon)
+
+# After random moves and lane changes the repaired index answers like a scan over all cars
+def test_lane_index_matches_brute_force():
+    road = Road(ROAD_X, ROAD_WIDTH)
+    traffic = generateTraffic(road, 2, 40, 60)
+    index = LaneIndex(road, traffic)
+    rng = random.Random(3)
+    for _ in range(50):
+        for car in traffic:
+            car.y -= rng.uniform(0, 5)
+            if rng.random() < 0.05:
+                car.lane = rng.randrange(road.laneCount)
+        index.update()
+        y = rng.uniform(min(car.y for car in traffic), max(car.y for car in traffic))
+        for lane in range(road.laneCount):
+            cars = sorted((car for car in traffic if car.lane == lane), key=lambda car: car.y)
+            ahead = [car for car in cars if car.y < y]
+            behind = [car for car in cars if car.y > y]
+            assert index.lanes[lane] == cars
+            assert index.leader(lane, y) is (ahead[-1] if ahead else None)
+            assert index.follower(lane, y) is (behind[0] if behind else None)
+            assert index.range(lane, y - 100, y + 100) == [car for car in cars if y - 100 <= car.y <= y + 100]
+        near = set(map(id, index.near(y, 50)))
+        for car in traffic:
+            if any(abs(point['y'] - y) <= 50 for point in car.createPolygon()):
+                assert id(car) in near
+
+def test_discard_and_from_order():
+    road = Road(ROAD_X, ROAD_WIDTH)
+    traffic = generateTraffic(road, 4, 20, 60)
+    index = LaneIndex(road, traffic)
+    order = [[traffic.index(car) for car in cars] for cars in index.lanes]
+    rebuilt = LaneIndex.fromOrder(road, traffic, order)
+    assert rebuilt.lanes == index.lanes and rebuilt.ys == index.ys and rebuilt.margin == index.margin
+    gone = traffic[::3]
+    index.discard(gone)
+    assert sum(len(cars) for cars in index.lanes) == len(traffic) - len(gone)
+    assert all(car not in gone for cars in index.lanes for car in cars)
+    assert all(ys == [car.y for car in cars] for ys, cars in zip(index.ys, index.lanes))
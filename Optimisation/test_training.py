@@ -0,0 +1,39 @@
+import time
+
+from training import Simulation, Snapshot, createWorld
+
+# The renderer keeps drawing a snapshot while the simulation thread moves on
+def test_snapshot_does_not_follow_the_world():
+    world = createWorld(5, 1)
+    world.run(20)
+    snapshot = Snapshot(world)
+    polygon = [dict(point) for point in snapshot.focus.polygon]
+    readings = list(snapshot.focus.sensor.readings)
+    activations = [(list(inputs), list(outputs)) for inputs, outputs in snapshot.activations]
+    cars = [car.y for car in snapshot.cars]
+    world.run(20)
+    assert snapshot.steps == 20
+    assert snapshot.focus.polygon == polygon
+    assert snapshot.focus.sensor.readings == readings
+    assert snapshot.activations == activations
+    assert [car.y for car in snapshot.cars] == cars
+
+def waitFor(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+# Paced mode runs one batch of steps per requested frame and hands back a snapshot of it
+def test_paced_simulation_steps_per_frame():
+    simulation = Simulation(createWorld(5, 1), stepsPerFrame=3)
+    simulation.start()
+    try:
+        time.sleep(0.05)
+        assert simulation.world.steps == 0
+        for frame in range(1, 4):
+            simulation.requestFrame()
+            waitFor(lambda: simulation.snapshot.steps == frame * 3)
+    finally:
+        simulation.stop()
+    assert simulation.world.steps == 9 or simulation.world.steps == 12
@@ -0,0 +1,69 @@
+import random
+
+import pygame
+
+from optimisation import Hud, NeuralNetwork, Visualizer
+from profiler import Profiler
+
+# Stand-in for pygame.time.Clock so the HUD text does not depend on real frame timing
+class FixedClock:
+    def get_fps(self):
+        return 60.0
+
+def test_hud_lists_every_profiled_phase():
+    pygame.font.init()
+    profiler = Profiler()
+    for name in ('move', 'sensor', 'network'):
+        with profiler.phase(name):
+            pass
+    hud = Hud()
+    plain = hud.render(FixedClock(), 10, None)
+    profiled = hud.render(FixedClock(), 10, profiler)
+    assert profiled.get_height() > plain.get_height()
+
+# The HUD text is only re-rendered every refresh interval
+def test_hud_rerenders_on_refresh():
+    pygame.font.init()
+    screen = pygame.Surface((300, 200))
+    screen.fill((255, 255, 255))
+    hud = Hud(refresh=60)
+    hud.draw(screen, FixedClock(), 0, 5)
+    first = hud.surface
+    hud.draw(screen, FixedClock(), 100, 5)
+    assert hud.surface is first
+    assert screen.get_at((12, 12)) != pygame.Color(255, 255, 255)
+    hud.refresh = 0
+    hud.draw(screen, FixedClock(), 200, 5)
+    assert hud.surface is not first
+    assert hud.steps_per_second > 0
+
+def test_diagram_is_built_once_per_brain(monkeypatch):
+    random.seed(1)
+    brains = [NeuralNetwork([5, 6, 4]) for _ in range(3)]
+    visualizer = Visualizer(300, 300, cache_size=2)
+    built = []
+    build = visualizer.build_diagram
+    monkeypatch.setattr(visualizer, 'build_diagram', lambda network: built.append(network) or build(network))
+    screen = pygame.Surface((300, 300))
+    for brain in (brains[0], brains[0], brains[1], brains[0], brains[2], brains[0]):
+        visualizer.draw_network(screen, brain)
+    assert built == [brains[0], brains[1], brains[2], brains[0]]
+    assert len(visualizer.diagrams) == 2
+
+# Copied activations are drawn over the cached diagram instead of the brain's live values
+def test_given_activations_are_drawn():
+    random.seed(2)
+    brain = NeuralNetwork([5, 6, 4])
+    NeuralNetwork.feedForward([0.5] * 5, brain)
+    visualizer = Visualizer(300, 300)
+    live = pygame.Surface((300, 300))
+    visualizer.draw_network(live, brain)
+    layer, nodes = visualizer.diagrams[brain]
+    index, side, positions, _ = nodes[-1]
+    assert (index, side) == (0, 0)
+    activations = [([1] * len(level.inputs), [1] * len(level.outputs)) for level in brain.levels]
+    copied = pygame.Surface((300, 300))
+    visualizer.draw_network(copied, brain, activations=activations)
+    x, y = positions[0]
+    assert live.get_at((int(x), int(y))) == pygame.Color(*Visualizer.get_rgb(0.5))
+    assert copied.get_at((int(x), int(y))) == pygame.Color(*Visualizer.get_rgb(1))
@@ -0,0 +1,199 @@
+import bisect
+import math
+
+# Per-lane traffic index: cars of each lane sorted by y (front first), repaired incrementally every step
+class LaneIndex:
+    def __init__(self, road, traffic):
+        self.road = road
+        self.lanes = [[] for _ in range(road.laneCount)]
+        self.ys = [[] for _ in range(road.laneCount)]
+        self.margin = 0
+        for car in traffic:
+            self.add(car)
+
+    def laneOf(self, x):
+        return min(range(self.road.laneCount), key=lambda lane: abs(self.road.getLaneCenter(lane) - x))
+
+    def add(self, car):
+        if not hasattr(car, 'lane'):
+            car.lane = self.laneOf(car.x)
+        self.margin = max(self.margin, math.hypot(car.width, car.height) / 2)
+        k = bisect.bisect_right(self.ys[car.lane], car.y)
+        self.lanes[car.lane].insert(k, car)
+        self.ys[car.lane].insert(k, car.y)
+
+    # Index over traffic whose lane order is already known, as lists of positions in traffic
+    @staticmethod
+    def fromOrder(road, traffic, lanes):
+        index = LaneIndex(road, [])
+        index.lanes = [[traffic[i] for i in positions] for positions in lanes]
+        index.ys = [[car.y for car in cars] for cars in index.lanes]
+        index.margin = max([math.hypot(car.width, car.height) / 2 for car in traffic] + [0])
+        return index
+
+    # Same order over a copy of the traffic, given position by position
+    def copyFor(self, traffic, copies):
+        positions = {id(car): i for i, car in enumerate(traffic)}
+        index = LaneIndex(self.road, [])
+        index.lanes = [[copies[positions[id(car)]] for car in cars] for cars in self.lanes]
+        index.ys = [list(ys) for ys in self.ys]
+        index.margin = self.margin
+        return index
+
+    # Cars move monotonically, so each lane is still almost sorted and insertion sort is linear in practice
+    def update(self):
+        moved = []
+        for lane in range(len(self.lanes)):
+            cars = []
+            for car in self.lanes[lane]:
+                if car.lane == lane:
+                    cars.append(car)
+                else:
+                    moved.append(car)
+            for k in range(1, len(cars)):
+                car = cars[k]
+                j = k - 1
+                while j >= 0 and cars[j].y > car.y:
+                    cars[j + 1] = cars[j]
+                    j -= 1
+                cars[j + 1] = car
+            self.lanes[lane] = cars
+            self.ys[lane] = [car.y for car in cars]
+        for car in moved:
+            k = bisect.bisect_right(self.ys[car.lane], car.y)
+            self.lanes[car.lane].insert(k, car)
+            self.ys[car.lane].insert(k, car.y)
+
+    def discard(self, cars):
+        removed = set(map(id, cars))
+        for lane in range(len(self.lanes)):
+            self.lanes[lane] = [car for car in self.lanes[lane] if id(car) not in removed]
+            self.ys[lane] = [car.y for car in self.lanes[lane]]
+
+    def leader(self, lane, y):
+        k = bisect.bisect_left(self.ys[lane], y)
+        return self.lanes[lane][k - 1] if k > 0 else None
+
+    def follower(self, lane, y):
+        k = bisect.bisect_right(self.ys[lane], y)
+        return self.lanes[lane][k] if k < len(self.lanes[lane]) else None
+
+    def range(self, lane, yMin, yMax):
+        ys = self.ys[lane]
+        return self.lanes[lane][bisect.bisect_left(ys, yMin):bisect.bisect_right(ys, yMax)]
+
+    # Every car whose polygon can reach within `reach` of y, in any lane
+    def near(self, y, reach):
+        reach += self.margin
+        cars = []
+        for lane in range(len(self.lanes)):
+            cars.extend(self.range(lane, y - reach, y + reach))
+        return cars
+
+# Traffic behaviour: IDM car-following and MOBIL lane changes, computed for all traffic cars in one pass per step.
+# Units are pixels and simulation steps. Traffic reacts to traffic only; population cars never influence it,
+# so every AI car is still evaluated against the same traffic.
+class TrafficModel:
+    def __init__(self, road, timeHeadway=30, minGap=15, maxAcceleration=0.05, comfortDeceleration=0.1, delta=4,
+                 politeness=0.3, changeThreshold=0.02, safeDeceleration=0.2, lateralSpeed=1.0, cooldown=120):
+        self.road = road
+        self.timeHeadway = timeHeadway
+        self.minGap = minGap
+        self.maxAcceleration = maxAcceleration
+        self.comfortDeceleration = comfortDeceleration
+        self.delta = delta
+        self.politeness = politeness
+        self.changeThreshold = changeThreshold
+        self.safeDeceleration = safeDeceleration
+        self.lateralSpeed = lateralSpeed
+        self.cooldown = cooldown
+        self.brakeTerm = 2 * math.sqrt(maxAcceleration * comfortDeceleration)
+
+    def acceleration(self, speed, desiredSpeed, gap=None, leaderSpeed=0):
+        freeRoad = 1 - (speed / desiredSpeed) ** self.delta if desiredSpeed > 0 else -1
+        if gap is None:
+            return self.maxAcceleration * freeRoad
+        desiredGap = self.minGap + max(0, speed * self.timeHeadway + speed * (speed - leaderSpeed) / self.brakeTerm)
+        return self.maxAcceleration * (freeRoad - (desiredGap / max(gap, 0.1)) ** 2)
+
+    def step(self, traffic, index=None):
+        count = len(traffic)
+        if count == 0:
+            return
+        if index is None:
+            index = LaneIndex(self.road, traffic)
+        for car in traffic:
+            if not hasattr(car, 'laneCooldown'):
+                car.laneCooldown = 0
+
+        ys = [car.y for car in traffic]
+        speeds = [car.speed for car in traffic]
+        halfLengths = [car.height / 2 for car in traffic]
+
+        # Per-lane order, front (smallest y) first, straight from the lane index
+        positions = {id(car): i for i, car in enumerate(traffic)}
+        lanes = [[positions[id(car)] for car in cars] for cars in index.lanes]
+        laneYs = index.ys
+
+        def gapBetween(follower, leader):
+            return ys[follower] - ys[leader] - halfLengths[follower] - halfLengths[leader]
+
+        def accelerationBehind(i, leader):
+            if leader < 0:
+                return self.acceleration(speeds[i], traffic[i].maxSpeed)
+            return self.acceleration(speeds[i], traffic[i].maxSpeed, gapBetween(i, leader), speeds[leader])
+
+        leaders = [-1] * count
+        followers = [-1] * count
+        for lane in lanes:
+            for k in range(len(lane)):
+                if k > 0:
+                    leaders[lane[k]] = lane[k - 1]
+                if k + 1 < len(lane):
+                    followers[lane[k]] = lane[k + 1]
+        accelerations = [accelerationBehind(i, leaders[i]) for i in range(count)]
+
+        # MOBIL: change lane when the own gain plus the politeness-weighted gain of both followers beats the threshold
+        for i in range(count):
+            car = traffic[i]
+            if car.laneCooldown > 0:
+                car.laneCooldown -= 1
+                continue
+            best, bestLane = self.changeThreshold, None
+            for lane in (car.lane - 1, car.lane + 1):
+                if not 0 <= lane < self.road.laneCount:
+                    continue
+                k = bisect.bisect_left(laneYs[lane], ys[i])
+                newLeader = lanes[lane][k - 1] if k > 0 else -1
+                newFollower = lanes[lane][k] if k < len(lanes[lane]) else -1
+                if newLeader >= 0 and gapBetween(i, newLeader) < self.minGap:
+                    continue
+                if newFollower >= 0 and gapBetween(newFollower, i) < self.minGap:
+                    continue
+
+                ownGain = accelerationBehind(i, newLeader) - accelerations[i]
+                followerGain = 0
+                if newFollower >= 0:
+                    newFollowerAcceleration = accelerationBehind(newFollower, i)
+                    if newFollowerAcceleration < -self.safeDeceleration:
+                        continue
+                    followerGain += newFollowerAcceleration - accelerations[newFollower]
+                oldFollower = followers[i]
+                if oldFollower >= 0:
+                    followerGain += accelerationBehind(oldFollower, leaders[i]) - accelerations[oldFollower]
+
+                incentive = ownGain + self.politeness * followerGain
+                if incentive > best:
+                    best, bestLane = incentive, lane
+            if bestLane is not None:
+                car.lane = bestLane
+                car.laneCooldown = self.cooldown
+
+        for i in range(count):
+            car = traffic[i]
+            car.speed = min(max(speeds[i] + accelerations[i], 0), car.maxSpeed)
+            car.y -= car.speed
+            target = self.road.getLaneCenter(car.lane)
+            if car.x != target:
+                car.x += max(-self.lateralSpeed, min(self.lateralSpeed, target - car.x))
+            car.polygon = car.createPolygon()
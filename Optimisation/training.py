@@ -0,0 +1,180 @@
+import argparse
+import copy
+import math
+import threading
+import pygame
+
+from optimisation import (NeuralNetwork, Road, World, Visualizer, Hud, SensorConfig, defaultCarClass, generateTraffic,
+                          ROAD_X, ROAD_WIDTH, CAR_WIDTH, CAR_HEIGHT, START_Y, TRAFFIC_COUNT)
+from augment import AugmentConfig, useAugmentation
+from ingest import TrafficSpawner, loadSchedule
+from profiler import Profiler
+from traffic import LaneIndex, TrafficModel
+
+SCREEN_HEIGHT = 700
+NETWORK_WIDTH = 300
+
+def createWorld(population, seed, brainPath=None, mutationAmount=0.1, profiler=None, trafficCount=TRAFFIC_COUNT, trafficModel=False, schedule=None,
+                sensorConfig=None, carClass=None):
+    road = Road(ROAD_X, ROAD_WIDTH)
+    carClass = carClass or defaultCarClass()
+    cars = []
+    for i in range(population):
+        car = carClass(road.getLaneCenter(1), START_Y, CAR_WIDTH, CAR_HEIGHT, "AI", sensorConfig=sensorConfig)
+        if brainPath:
+            with open(brainPath, 'rb') as f:
+                car.brain = NeuralNetwork.fromBytes(f.read())
+            if i > 0:
+                NeuralNetwork.mutate(car.brain, mutationAmount)
+        cars.append(car)
+    if schedule is not None:
+        traffic = []
+        model = TrafficModel(road) if trafficModel else None
+        return World(road, traffic, cars, profiler, model, LaneIndex(road, traffic), TrafficSpawner(road, schedule, loop=True))
+    if trafficModel:
+        traffic = generateTraffic(road, seed, trafficCount, 80, (1.5, 2.5))
+        return World(road, traffic, cars, profiler, TrafficModel(road), LaneIndex(road, traffic))
+    traffic = generateTraffic(road, seed, trafficCount)
+    return World(road, traffic, cars, profiler, trafficIndex=LaneIndex(road, traffic))
+
+def focusCar(world):
+    alive = [car for car in world.cars if not car.damaged]
+    return min(alive or world.cars, key=lambda car: car.y)
+
+# Copies of the drawable state, so the renderer never reads cars the simulation thread is moving
+def ghost(car, withSensor=False):
+    snapshot = copy.copy(car)
+    snapshot.polygon = [dict(point) for point in car.polygon]
+    if hasattr(car, 'sensor'):
+        if withSensor:
+            snapshot.sensor = copy.copy(car.sensor)
+            snapshot.sensor.rays = [[dict(ray[0]), dict(ray[1])] for ray in car.sensor.rays]
+            snapshot.sensor.readings = [dict(reading) if reading else None for reading in car.sensor.readings]
+        else:
+            del snapshot.sensor
+    return snapshot
+
+class Snapshot:
+    def __init__(self, world):
+        focus = focusCar(world)
+        self.road = world.road
+        self.steps = world.steps
+        self.alive = world.alive()
+        self.traffic = [ghost(car) for car in world.traffic]
+        self.focus = ghost(focus, True)
+        # The brain itself is shared with the simulation thread, which overwrites its activations every step
+        self.activations = [(list(level.inputs), list(level.outputs)) for level in focus.brain.levels]
+        self.cars = [ghost(car) for car in world.cars if car is not focus] + [self.focus]
+
+# Simulation thread: N world steps per displayed frame, or as fast as possible when unlimited
+class Simulation:
+    def __init__(self, world, stepsPerFrame=1):
+        self.world = world
+        self.stepsPerFrame = stepsPerFrame
+        self.unlimited = False
+        self.running = True
+        self.frame = threading.Event()
+        self.snapshot = Snapshot(world)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            if not self.unlimited:
+                self.frame.wait()
+            for _ in range(self.stepsPerFrame):
+                self.world.step()
+            # Snapshots are only built when the renderer asked for one, not after every batch in unlimited mode
+            if self.frame.is_set():
+                self.frame.clear()
+                self.snapshot = Snapshot(self.world)
+
+    def requestFrame(self):
+        self.frame.set()
+
+    def stop(self):
+        self.running = False
+        self.frame.set()
+        self.thread.join()
+
+def drawWorld(screen, world, focus, visualizer, activations=None):
+    height = screen.get_height()
+    offsetY = -focus.y + height * 0.7
+    roadWidth = int(world.road.x * 2)
+
+    screen.fill((211, 211, 211), (0, 0, roadWidth, height))
+    world.road.draw(screen, offsetY)
+    for car in world.traffic:
+        car.draw(screen, (255, 0, 0), offsetY)
+    for car in world.cars:
+        if car is not focus:
+            car.draw(screen, (150, 150, 255), offsetY, False)
+    focus.draw(screen, (0, 0, 255), offsetY)
+
+    screen.fill((0, 0, 0), (roadWidth, 0, visualizer.width, height))
+    visualizer.draw_network(screen, focus.brain, roadWidth, 0, activations)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--brain', default=None)
+    parser.add_argument('--population', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', default='bestBrain.bin')
+    parser.add_argument('--steps-per-frame', type=int, default=1)
+    parser.add_argument('--traffic', type=int, default=TRAFFIC_COUNT)
+    parser.add_argument('--traffic-model', action='store_true')
+    parser.add_argument('--dataset', default=None)
+    parser.add_argument('--rays', type=int, default=5)
+    parser.add_argument('--ray-length', type=float, default=150)
+    parser.add_argument('--ray-spread', type=float, default=90)
+    AugmentConfig.addArguments(parser)
+    args = parser.parse_args()
+    sensorConfig = SensorConfig(args.rays, args.ray_length, math.radians(args.ray_spread))
+    schedule = loadSchedule(args.dataset) if args.dataset else None
+
+    pygame.init()
+    screen = pygame.display.set_mode((int(ROAD_X * 2) + NETWORK_WIDTH, SCREEN_HEIGHT))
+    clock = pygame.time.Clock()
+
+    profiler = Profiler(capacity=600)
+    world = createWorld(args.population, args.seed, args.brain, profiler=profiler, trafficCount=args.traffic, trafficModel=args.traffic_model, schedule=schedule,
+                        sensorConfig=sensorConfig)
+    useAugmentation(world, AugmentConfig.fromArgs(args), args.seed)
+    simulation = Simulation(world, args.steps_per_frame)
+    visualizer = Visualizer(NETWORK_WIDTH, SCREEN_HEIGHT)
+    hud = Hud()
+    simulation.start()
+
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                    simulation.stepsPerFrame *= 2
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    simulation.stepsPerFrame = max(1, simulation.stepsPerFrame // 2)
+                elif event.key == pygame.K_0:
+                    simulation.unlimited = not simulation.unlimited
+                    simulation.requestFrame()
+                elif event.key == pygame.K_s:
+                    with open(args.save, 'wb') as f:
+                        f.write(NeuralNetwork.toBytes(simulation.snapshot.focus.brain))
+
+        snapshot = simulation.snapshot
+        with profiler.phase('draw'):
+            drawWorld(screen, snapshot, snapshot.focus, visualizer, snapshot.activations)
+        hud.draw(screen, clock, snapshot.steps, snapshot.alive, profiler)
+        pygame.display.set_caption("Self-driving car - training (%s steps/frame)" % ("unlimited" if simulation.unlimited else simulation.stepsPerFrame))
+        pygame.display.flip()
+        simulation.requestFrame()
+        clock.tick(60)
+
+    simulation.stop()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -169,7 +169,10 @@ class Sensor:
     def cast_rays(self):
         self.rays = []
         for i in range(self.ray_count):
-            ray_angle = (self.ray_spread / 2 - i * self.ray_spread / (self.ray_count - 1)) + self.car.angle
+            if self.ray_count == 1:
+                ray_angle = self.car.angle
+            else:
+                ray_angle = (self.ray_spread / 2 - i * self.ray_spread / (self.ray_count - 1)) + self.car.angle
             start = {"x": self.car.x, "y": self.car.y}
             end = {
                 "x": self.car.x - math.sin(ray_angle) * self.ray_length,
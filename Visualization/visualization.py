@@ -1,4 +1,5 @@
 import math
+import time
 import pygame
 
 class Car:
@@ -211,110 +212,12 @@ class Sensor:
 
             pygame.draw.line(screen, (255, 255, 0), (self.rays[i][0]['x'], self.rays[i][0]['y']), (end['x'], end['y']), 2)
             pygame.draw.line(screen, (0, 0, 0), (self.rays[i][1]['x'], self.rays[i][1]['y']), (end['x'], end['y']), 2)
-class Visualizer:
-    #staticmethod
-    def draw_network(ctx, network):
-        margin = 50
-        left = margin
-        top = margin
-        width = ctx.canvas.width - margin * 2
-        height = ctx.canvas.height - margin * 2
-
-        level_height = height / len(network.levels)
-
-        for i in range(len(network.levels) - 1, -1, -1):
-            level_top = top + Visualizer.lerp(
-                height - level_height,
-                0,
-                0.5 if network.levels.length == 1 else i / (len(network.levels) - 1)
-            )
-
-            ctx.set_line_dash([7, 3])
-            Visualizer.draw_level(
-                ctx, network.levels[i], left, level_top, width, level_height,
-                ['🠉', '🠈', '🠊', '🠋'] if i == len(network.levels) - 1 else []
-            )
 
-    #staticmethod
-    def draw_level(ctx, level, left, top, width, height, output_labels):
-        right = left + width
-        bottom = top + height
-
-        inputs, outputs, weights, biases = level.inputs, level.outputs, level.weights, level.biases
-
-        for i in range(len(inputs)):
-            for j in range(len(outputs)):
-                ctx.beginPath()
-                ctx.move_to(
-                    Visualizer.get_node_x(inputs, i, left, right),
-                    bottom
-                )
-                ctx.line_to(
-                    Visualizer.get_node_x(outputs, j, left, right),
-                    top
-                )
-                ctx.line_width = 2
-                ctx.stroke_style = Visualizer.get_rgba(weights[i][j])
-                ctx.stroke()
-
-        node_radius = 18
-        for i in range(len(inputs)):
-            x = Visualizer.get_node_x(inputs, i, left, right)
-            ctx.beginPath()
-            ctx.arc(x, bottom, node_radius, 0, math.pi * 2)
-            ctx.fill_style = "black"
-            ctx.fill()
-            ctx.beginPath()
-            ctx.arc(x, bottom, node_radius * 0.6, 0, math.pi * 2)
-            ctx.fill_style = Visualizer.get_rgba(inputs[i])
-            ctx.fill()
-
-        for i in range(len(outputs)):
-            x = Visualizer.get_node_x(outputs, i, left, right)
-            ctx.beginPath()
-            ctx.arc(x, top, node_radius, 0, math.pi * 2)
-            ctx.fill_style = "black"
-            ctx.fill()
-            ctx.beginPath()
-            ctx.arc(x, top, node_radius * 0.6, 0, math.pi * 2)
-            ctx.fill_style = Visualizer.get_rgba(outputs[i])
-            ctx.fill()
-
-            ctx.beginPath()
-            ctx.line_width = 2
-            ctx.arc(x, top, node_radius * 0.8, 0, math.pi * 2)
-            ctx.stroke_style = Visualizer.get_rgba(biases[i])
-            ctx.set_line_dash([3, 3])
-            ctx.stroke()
-            ctx.set_line_dash([])
-
-            if output_labels[i]:
-                ctx.beginPath()
-                ctx.text_align = "center"
-                ctx.text_baseline = "middle"
-                ctx.fill_style = "black"
-                ctx.stroke_style = "white"
-                ctx.font = str(node_radius * 1.5) + "px Arial"
-                ctx.text((node_radius * 1.5) + "px Arial", x, top + node_radius * 0.1)
-                ctx.line_width = 0.5
-                ctx.stroke_text(output_labels[i], x, top + node_radius * 0.1)
-
-    #staticmethod
-    def get_node_x(nodes, index, left, right):
-        return Visualizer.lerp(
-            left,
-            right,
-            0.5 if len(nodes) == 1 else index / (len(nodes) - 1)
-        )
-
-    #staticmethod
-    def lerp(a, b, t):
-        return a + (b - a) * t
-    #staticmethod
+    @staticmethod
     def lerp(A, B, t):
         return A + (B - A) * t
 
-    #staticmethod
+    @staticmethod
     def getIntersection(A, B, C, D):
         tTop = (D['x'] - C['x']) * (A['y'] - C['y']) - (D['y'] - C['y']) * (A['x'] - C['x'])
         uTop = (C['y'] - A['y']) * (A['x'] - B['x']) - (C['x'] - A['x']) * (A['y'] - B['y'])
@@ -332,6 +235,192 @@ class Visualizer:
 
         return None
 
+class Visualizer:
+    NODE_RADIUS = 18
+
+    def __init__(self, width, height, margin=50, cache_size=8):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.cache_size = cache_size
+        self.diagrams = {}
+
+    # Per frame: blit the cached diagram of this brain, then fill in only the activation discs. Activations
+    # default to the brain's own, or are given per level as (inputs, outputs) copied from another thread.
+    def draw_network(self, screen, network, left=0, top=0, activations=None):
+        diagram = self.diagrams.get(network)
+        if diagram is None:
+            diagram = self.build_diagram(network)
+            if len(self.diagrams) >= self.cache_size:
+                self.diagrams.pop(next(iter(self.diagrams)))
+            self.diagrams[network] = diagram
+        layer, nodes = diagram
+        screen.blit(layer, (left, top))
+
+        if activations is None:
+            activations = [(level.inputs, level.outputs) for level in network.levels]
+        inner_radius = Visualizer.NODE_RADIUS * 0.6
+        for index, side, positions, labels in nodes:
+            values = activations[index][side]
+            for i in range(len(positions)):
+                x, y = positions[i]
+                pygame.draw.circle(screen, Visualizer.get_rgb(values[i]), (left + x, top + y), inner_radius)
+                if labels and i < len(labels):
+                    Visualizer.draw_arrow(screen, labels[i], (left + x, top + y), Visualizer.NODE_RADIUS * 0.5)
+
+    def level_boxes(self, network):
+        height = self.height - self.margin * 2
+        level_height = height / len(network.levels)
+        for i in range(len(network.levels) - 1, -1, -1):
+            level_top = self.margin + Visualizer.lerp(
+                height - level_height,
+                0,
+                0.5 if len(network.levels) == 1 else i / (len(network.levels) - 1)
+            )
+            yield i, level_top, level_height
+
+    # Weights and biases only change between generations, so edges, node discs and bias rings
+    # are drawn once per brain into an off-screen layer
+    def build_diagram(self, network):
+        layer = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+        left = self.margin
+        right = self.width - self.margin
+        nodes = []
+        for i, level_top, level_height in self.level_boxes(network):
+            level = network.levels[i]
+            bottom = level_top + level_height
+            input_positions = [(Visualizer.get_node_x(level.inputs, j, left, right), bottom) for j in range(len(level.inputs))]
+            output_positions = [(Visualizer.get_node_x(level.outputs, k, left, right), level_top) for k in range(len(level.outputs))]
+            self.draw_level(layer, level, input_positions, output_positions)
+
+            labels = ['up', 'left', 'right', 'down'] if i == len(network.levels) - 1 else None
+            nodes.append((i, 1, output_positions, labels))
+            if i == 0:
+                nodes.append((0, 0, input_positions, None))
+        return layer, nodes
+
+    def draw_level(self, layer, level, input_positions, output_positions):
+        for j in range(len(input_positions)):
+            for k in range(len(output_positions)):
+                Visualizer.draw_dashed_line(
+                    layer, Visualizer.get_rgba(level.weights[j][k]),
+                    input_positions[j], output_positions[k], [7, 3], 2
+                )
+
+        node_radius = Visualizer.NODE_RADIUS
+        for position in input_positions:
+            pygame.draw.circle(layer, (0, 0, 0), position, node_radius)
+
+        for k in range(len(output_positions)):
+            pygame.draw.circle(layer, (0, 0, 0), output_positions[k], node_radius)
+            Visualizer.draw_dashed_circle(layer, Visualizer.get_rgb(level.biases[k]), output_positions[k], node_radius * 0.8, [3, 3], 2)
+
+    @staticmethod
+    def get_node_x(nodes, index, left, right):
+        return Visualizer.lerp(
+            left,
+            right,
+            0.5 if len(nodes) == 1 else index / (len(nodes) - 1)
+        )
+
+    @staticmethod
+    def get_rgba(value):
+        alpha = min(abs(value), 1)
+        R = 0 if value < 0 else 255
+        G = R
+        B = 0 if value > 0 else 255
+        return (R, G, B, int(alpha * 255))
+
+    # The same colour already blended over the black node discs
+    @staticmethod
+    def get_rgb(value):
+        R, G, B, A = Visualizer.get_rgba(value)
+        return (R * A // 255, G * A // 255, B * A // 255)
+
+    @staticmethod
+    def draw_dashed_line(surface, color, start, end, dash, width):
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        if length == 0:
+            return
+        position = 0
+        while position < length:
+            t1 = position / length
+            t2 = min(position + dash[0], length) / length
+            pygame.draw.line(
+                surface, color,
+                (Visualizer.lerp(start[0], end[0], t1), Visualizer.lerp(start[1], end[1], t1)),
+                (Visualizer.lerp(start[0], end[0], t2), Visualizer.lerp(start[1], end[1], t2)),
+                width
+            )
+            position += dash[0] + dash[1]
+
+    # pygame's default font has no arrow glyphs, so the output labels are drawn as polygons
+    @staticmethod
+    def draw_arrow(surface, direction, center, size):
+        angle = {'up': 0, 'left': math.pi / 2, 'down': math.pi, 'right': -math.pi / 2}[direction]
+        shape = [(0, -1), (0.8, 0), (0.3, 0), (0.3, 1), (-0.3, 1), (-0.3, 0), (-0.8, 0)]
+        cos, sin = math.cos(angle), math.sin(angle)
+        points = [(center[0] + (px * cos + py * sin) * size, center[1] + (-px * sin + py * cos) * size) for px, py in shape]
+        pygame.draw.polygon(surface, (255, 255, 255), points)
+        pygame.draw.polygon(surface, (0, 0, 0), points, 1)
+
+    @staticmethod
+    def draw_dashed_circle(surface, color, center, radius, dash, width):
+        rect = pygame.Rect(0, 0, radius * 2, radius * 2)
+        rect.center = center
+        step = (dash[0] + dash[1]) / radius
+        angle = 0
+        while angle < math.pi * 2:
+            pygame.draw.arc(surface, color, rect, angle, angle + dash[0] / radius, width)
+            angle += step
+
+    @staticmethod
+    def lerp(a, b, t):
+        return a + (b - a) * t
+
+# Performance HUD: FPS, simulation rate, alive cars and per-phase profiler timings
+class Hud:
+    def __init__(self, refresh=0.5):
+        self.refresh = refresh
+        self.font = None
+        self.surface = None
+        self.last_time = 0
+        self.last_steps = 0
+        self.steps_per_second = 0
+
+    def draw(self, screen, clock, steps, alive, profiler=None, left=10, top=10):
+        now = time.perf_counter()
+        if self.surface is None or now - self.last_time >= self.refresh:
+            if self.last_time:
+                self.steps_per_second = (steps - self.last_steps) / (now - self.last_time)
+            self.last_time = now
+            self.last_steps = steps
+            self.surface = self.render(clock, alive, profiler)
+        screen.blit(self.surface, (left, top))
+
+    def render(self, clock, alive, profiler):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        lines = [
+            "FPS %.1f" % clock.get_fps(),
+            "steps/s %.0f" % self.steps_per_second,
+            "alive %d" % alive
+        ]
+        if profiler is not None:
+            for name, row in profiler.summary().items():
+                lines.append("%s %.2f / %.2f ms" % (name, row['percentiles'][50] * 1000, row['percentiles'][90] * 1000))
+
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        width = max(text.get_width() for text in rendered) + 8
+        height = sum(text.get_height() for text in rendered) + 8
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        y = 4
+        for text in rendered:
+            surface.blit(text, (4, y))
+            y += text.get_height()
+        return surface
+
 def polysIntersect(poly1, poly2):
     for i in range(len(poly1)):
         for j in range(len(poly2)):